@@ -9,11 +9,20 @@ const Q3_HOST = '127.0.0.1';    // Q3 dedicated server address
 const Q3_PORT = 27960;          // Q3 dedicated server UDP port
 
 const wss = new WebSocketServer({ port: WS_PORT });
+let nextClientId = 1;
+
+// Packet log line, parsed by tools/traffic_analyzer.py:
+// [WS->UDP] client 3 t=1718000000.123 52 bytes, first 20: <hex>
+function logPacket(dir, id, buf) {
+    const t = (Date.now() / 1000).toFixed(3);
+    console.log(`[${dir}] client ${id} t=${t} ${buf.length} bytes, first 20: ${buf.slice(0, 20).toString('hex')}`);
+}
 console.log(`WebSocket proxy listening on ws://0.0.0.0:${WS_PORT}`);
 console.log(`Forwarding to Q3 server at ${Q3_HOST}:${Q3_PORT} (UDP)`);
 
 wss.on('connection', (ws, req) => {
-    console.log(`New browser client connected from ${req.socket.remoteAddress}`);
+    const clientId = nextClientId++;
+    console.log(`New browser client connected from ${req.socket.remoteAddress} (client ${clientId})`);
 
     // Create a UDP socket for this browser client
     const udp = dgram.createSocket('udp4');
@@ -21,13 +30,13 @@ wss.on('connection', (ws, req) => {
     // Browser -> WebSocket -> UDP -> Q3 Server
     ws.on('message', (data) => {
         const buf = Buffer.from(data);
-        console.log(`[WS->UDP] ${buf.length} bytes, first 20: ${buf.slice(0, 20).toString('hex')}`);
+        logPacket('WS->UDP', clientId, buf);
         udp.send(buf, Q3_PORT, Q3_HOST);
     });
 
     // Q3 Server -> UDP -> WebSocket -> Browser
     udp.on('message', (msg) => {
-        console.log(`[UDP->WS] ${msg.length} bytes, first 20: ${msg.slice(0, 20).toString('hex')}`);
+        logPacket('UDP->WS', clientId, msg);
         if (ws.readyState === ws.OPEN) {
             ws.send(msg);
         }
@@ -35,7 +44,7 @@ wss.on('connection', (ws, req) => {
 
     // Cleanup on disconnect
     ws.on('close', () => {
-        console.log('Browser client disconnected');
+        console.log(`Browser client disconnected (client ${clientId})`);
         udp.close();
     });
 
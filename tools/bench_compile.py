@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Measure how q3map2 compile time and BSP size scale with the city grid.
+
+For each grid size this generates the city map (tools/generate_city_map.py,
+seeded as in bench_generators.py), runs the BSP, VIS and LIGHT passes the
+way tools/compile_driver.py does, and records per pass:
+  seconds    wall time
+  rss        peak resident memory of the q3map2 process (wait4 rusage)
+
+and per map: brushes and lights in the .map, buildings, BSP size, brushes
+and leafs in the BSP, and the number of vis clusters. Building and light
+counts both follow the grid size (every non-plaza block gets a building,
+every street intersection a light).
+
+After the table, every metric is fitted as a power law of the grid size
+(metric ~ c * grid^k) and the largest grid that fits --budget seconds of
+total compile time and --max-bsp-mb of BSP is projected from the fits.
+That is the biggest city CI can afford to build and the browser client to
+download.
+
+Results are appended to tests/benchmarks/compile_history.json.
+
+Usage:
+    python3 tools/bench_compile.py
+    python3 tools/bench_compile.py --grids 4 6 8 12 16 --budget 900
+    python3 tools/bench_compile.py --passes bsp vis --keep /tmp/scaling
+    python3 tools/bench_compile.py --light-args="-fast -samples 4" --no-save
+"""
+
+import argparse
+import math
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import generate_city_map
+from bench_generators import CityGrid, count_brushes, git_revision, load_history, save_history
+from bsp_file import LUMP_BRUSHES, LUMP_LEAFS, LUMP_VISIBILITY, read_bsp
+from compile_driver import DEFAULT_LIGHT_ARGS, LOG_FILE, PASSES, Q3MAP2, pass_command
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+HISTORY_FILE = os.path.join(PROJECT_DIR, "tests", "benchmarks", "compile_history.json")
+PLAZA_BLOCKS = (1, 2)  # generate_city_map leaves these rows/columns' inner blocks open
+MAX_PROJECTED_GRID = 128
+
+# Metrics fitted against the grid size, with their table labels
+FITTED = [
+    ("brushes", "brushes"),
+    ("bsp_s", "BSP s"),
+    ("vis_s", "VIS s"),
+    ("light_s", "LIGHT s"),
+    ("total_s", "total s"),
+    ("peak_rss", "peak RSS"),
+    ("bsp_bytes", "BSP size"),
+    ("clusters", "clusters"),
+]
+
+
+def generate(grid: int, out_path: str) -> dict:
+    with CityGrid(grid):
+        random.seed(42)
+        content = generate_city_map.generate_map()
+    with open(out_path, "w") as f:
+        f.write(content)
+    plaza = len([i for i in PLAZA_BLOCKS if i < grid])
+    return {
+        "grid": grid,
+        "brushes": count_brushes(content),
+        "lights": content.count('"classname" "light"'),
+        "buildings": grid * grid - plaza * plaza,
+    }
+
+
+def run_measured(cmd: list, timeout: float) -> tuple:
+    """Run cmd with output appended to LOG_FILE; returns (seconds, peak RSS bytes)."""
+    t0 = time.perf_counter()
+    with open(LOG_FILE, "a") as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    # wait4 gives this child's own rusage; Popen.wait would discard it
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() - t0 > timeout:
+            proc.kill()
+            os.wait4(proc.pid, 0)
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        time.sleep(0.02)
+    seconds = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return seconds, usage.ru_maxrss * 1024  # Linux reports kilobytes
+
+
+def bsp_stats(bsp_path: str) -> dict:
+    bsp = read_bsp(bsp_path)
+    vis = bsp.lumps[LUMP_VISIBILITY]
+    if len(vis) >= 8:
+        clusters = struct.unpack_from("<i", vis, 0)[0]
+    else:
+        # No VIS pass: count the clusters the leafs were assigned
+        leafs = np.frombuffer(bsp.lumps[LUMP_LEAFS], dtype="<i4").reshape(-1, 12)
+        clusters = len(np.unique(leafs[leafs[:, 0] >= 0, 0]))
+    return {
+        "bsp_bytes": os.path.getsize(bsp_path),
+        "bsp_brushes": len(bsp.lumps[LUMP_BRUSHES]) // 12,
+        "leafs": len(bsp.lumps[LUMP_LEAFS]) // 48,
+        "clusters": clusters,
+    }
+
+
+def bench(grid: int, passes: list, light_args: str, timeout: float, out_dir: str) -> dict:
+    map_path = os.path.join(out_dir, f"city_g{grid}.map")
+    result = generate(grid, map_path)
+    total = 0.0
+    peak = 0
+    for name in passes:
+        print(f"  grid {grid}: {name.upper()}...", flush=True)
+        seconds, rss = run_measured(pass_command(name, map_path, light_args), timeout)
+        result[f"{name}_s"] = round(seconds, 3)
+        result[f"{name}_rss"] = rss
+        total += seconds
+        peak = max(peak, rss)
+    result["total_s"] = round(total, 3)
+    result["peak_rss"] = peak
+    result.update(bsp_stats(os.path.splitext(map_path)[0] + ".bsp"))
+    return result
+
+
+def fit_power(xs, ys):
+    """Least-squares fit of y = c * x^k in log space; None with < 2 usable points."""
+    points = [(x, y) for x, y in zip(xs, ys) if x > 0 and y and y > 0]
+    if len(points) < 2 or len({x for x, _ in points}) < 2:
+        return None
+    lx = np.log([x for x, _ in points])
+    ly = np.log([y for _, y in points])
+    k, log_c = np.polyfit(lx, ly, 1)
+    return math.exp(log_c), k
+
+
+def largest_affordable(fits: dict, budget_s: float, max_bsp_bytes: float):
+    """Largest grid whose projected total time and BSP size stay within budget."""
+    time_fit, size_fit = fits.get("total_s"), fits.get("bsp_bytes")
+    if time_fit is None or size_fit is None:
+        return None
+    best = None
+    for grid in range(1, MAX_PROJECTED_GRID + 1):
+        seconds = time_fit[0] * grid ** time_fit[1]
+        size = size_fit[0] * grid ** size_fit[1]
+        if seconds > budget_s or size > max_bsp_bytes:
+            break
+        best = (grid, seconds, size)
+    return best
+
+
+def _fmt_metric(key: str, value) -> str:
+    if value is None:
+        return "-"
+    if key in ("peak_rss", "bsp_bytes"):
+        return f"{value / 1e6:.1f}MB"
+    if key.endswith("_s"):
+        return f"{value:.1f}"
+    return str(int(value))
+
+
+def print_table(results: list):
+    columns = [("grid", "grid"), ("buildings", "bldgs"), ("lights", "lights")]
+    columns += [(key, label) for key, label in FITTED if any(key in r for r in results)]
+    print(" ".join(f"{label:>9s}" for _, label in columns))
+    for r in results:
+        print(" ".join(f"{_fmt_metric(key, r.get(key)):>9s}" for key, _ in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark q3map2 compile scaling over city grid sizes")
+    parser.add_argument("--grids", type=int, nargs="+", default=[4, 6, 8, 12],
+                        help="City grid sizes to compile (default: 4 6 8 12)")
+    parser.add_argument("--passes", nargs="+", choices=PASSES, default=list(PASSES),
+                        help="q3map2 passes to run (default: bsp vis light)")
+    parser.add_argument("--light-args", default=DEFAULT_LIGHT_ARGS,
+                        help=f'Arguments for the LIGHT pass (default: "{DEFAULT_LIGHT_ARGS}")')
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds allowed per pass (default 3600)")
+    parser.add_argument("--budget", type=float, default=600,
+                        help="Total compile seconds CI can afford, for the projection (default 600)")
+    parser.add_argument("--max-bsp-mb", type=float, default=32,
+                        help="Largest BSP the browser client should download (default 32)")
+    parser.add_argument("--keep", metavar="DIR", help="Keep generated maps and BSPs in DIR")
+    parser.add_argument("--history", default=HISTORY_FILE, help="History JSON file")
+    parser.add_argument("--no-save", action="store_true", help="Do not append results to the history")
+    args = parser.parse_args()
+
+    if "bsp" not in args.passes:
+        parser.error("--passes must include bsp (VIS and LIGHT need its output)")
+    if not os.access(Q3MAP2, os.X_OK):
+        print(f"ERROR: q3map2 not found: {Q3MAP2}", file=sys.stderr)
+        sys.exit(1)
+    passes = [p for p in PASSES if p in args.passes]
+    stamp = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_revision(),
+        "passes": passes,
+        "light_args": args.light_args,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.keep or tmp
+        os.makedirs(out_dir, exist_ok=True)
+        for grid in sorted(set(args.grids)):
+            try:
+                result = bench(grid, passes, args.light_args, args.timeout, out_dir)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                print(f"ERROR: grid {grid}: {e}, see {LOG_FILE}", file=sys.stderr)
+                break
+            result.update(stamp)
+            results.append(result)
+    if not results:
+        sys.exit(1)
+
+    print()
+    print_table(results)
+
+    grids = [r["grid"] for r in results]
+    fits = {}
+    print("\nScaling (metric ~ c * grid^k):")
+    for key, label in FITTED:
+        fit = fit_power(grids, [r.get(key) for r in results])
+        if fit is None:
+            continue
+        fits[key] = fit
+        print(f"  {label:<9s} k = {fit[1]:.2f}")
+
+    best = largest_affordable(fits, args.budget, args.max_bsp_mb * 1e6)
+    if best is None:
+        print("\nNo projection: needs at least two grid sizes with a total time and BSP size")
+    else:
+        grid, seconds, size = best
+        print(f"\nLargest grid within {args.budget:.0f}s and {args.max_bsp_mb:g}MB: {grid}x{grid} "
+              f"(projected {seconds:.0f}s, {size / 1e6:.1f}MB)")
+        if grid > max(grids):
+            print(f"  extrapolated beyond the largest measured grid ({max(grids)}); confirm with --grids {grid}")
+
+    if not args.no_save:
+        save_history(args.history, load_history(args.history) + results)
+        print(f"\nAppended {len(results)} result(s) to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
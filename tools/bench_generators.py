@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Benchmark the map generators and keep a history to catch regressions.
+
+For each generator (and, for the city, each grid size) this measures:
+  generate   time in generate_map() outside brush/entity formatting
+  format     time inside brush_box() and entity(), the string-building hot path
+  write      time to write the .map text to disk
+  peak       peak traced memory during generate_map() (tracemalloc)
+  blocks     most allocated blocks live at once while brushes are being
+             built (sys.getallocatedblocks), per brush
+
+Timings are the best of --repeat runs without tracemalloc; memory is
+measured in a separate run because tracemalloc slows everything down.
+generate_city_map.py only exposes its grid size as module constants, so the
+benchmark rewrites GRID_SIZE and the derived MAP_MIN/MAP_MAX between runs.
+The parkour course has a fixed layout and is measured once.
+
+Results are appended to tests/benchmarks/generator_history.json and each run
+is compared with the median of the last 5 matching entries.
+
+Usage:
+    python3 tools/bench_generators.py
+    python3 tools/bench_generators.py --grids 4 8 16 32 --repeat 5
+    python3 tools/bench_generators.py --check        # exit 1 on a regression
+    python3 tools/bench_generators.py --no-save      # do not touch the history
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate_city_map
+import generate_parkour_map
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+HISTORY_FILE = os.path.join(PROJECT_DIR, "tests", "benchmarks", "generator_history.json")
+HISTORY_WINDOW = 5
+# Metrics compared against history (larger is worse for all of them)
+CHECKED_METRICS = ("total_s", "format_s", "peak_bytes", "blocks_per_brush")
+
+
+class FormatTimer:
+    """Swap a generator module's brush_box()/entity() for timed wrappers."""
+
+    NAMES = ("brush_box", "entity")
+
+    def __init__(self, module):
+        self.module = module
+        self.seconds = 0.0
+        self.originals = {}
+        self.blocks_base = sys.getallocatedblocks()
+        self.blocks_peak = 0
+
+    def _wrap(self, fn):
+        perf = time.perf_counter
+
+        def timed(*args, **kwargs):
+            t0 = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds += perf() - t0
+                live = sys.getallocatedblocks() - self.blocks_base
+                if live > self.blocks_peak:
+                    self.blocks_peak = live
+        return timed
+
+    def __enter__(self):
+        for name in self.NAMES:
+            self.originals[name] = getattr(self.module, name)
+            setattr(self.module, name, self._wrap(self.originals[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, fn in self.originals.items():
+            setattr(self.module, name, fn)
+
+
+class CityGrid:
+    """Temporarily set generate_city_map's grid size and derived constants."""
+
+    NAMES = ("GRID_SIZE", "TOTAL_SIZE", "MAP_MIN", "MAP_MAX")
+
+    def __init__(self, grid: int):
+        self.grid = grid
+        self.saved = {}
+
+    def __enter__(self):
+        m = generate_city_map
+        self.saved = {name: getattr(m, name) for name in self.NAMES}
+        total = self.grid * m.BLOCK_SIZE + (self.grid + 1) * m.STREET_WIDTH
+        m.GRID_SIZE = self.grid
+        m.TOTAL_SIZE = total
+        m.MAP_MIN = -total // 2
+        m.MAP_MAX = total // 2
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(generate_city_map, name, value)
+
+
+def count_brushes(content: str) -> int:
+    return content.count("\n\t{\n")
+
+
+def run_once(module, out_path: str) -> dict:
+    random.seed(42)  # the generators seed at import; keep every run identical
+    with FormatTimer(module) as timer:
+        t0 = time.perf_counter()
+        content = module.generate_map()
+        t_gen = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with open(out_path, "w") as f:
+        f.write(content)
+    t_write = time.perf_counter() - t0
+    return {
+        "format_s": timer.seconds,
+        "generate_s": t_gen - timer.seconds,
+        "write_s": t_write,
+        "total_s": t_gen + t_write,
+        "blocks": timer.blocks_peak,
+        "brushes": count_brushes(content),
+        "entities": content.count('"classname"'),
+        "bytes": len(content),
+    }
+
+
+def measure_peak(module) -> int:
+    random.seed(42)
+    tracemalloc.start()
+    try:
+        module.generate_map()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name: str, module, grid, repeat: int, out_dir: str) -> dict:
+    out_path = os.path.join(out_dir, f"{name}.map")
+    runs = [run_once(module, out_path) for _ in range(repeat)]
+    best = {key: min(r[key] for r in runs)
+            for key in ("format_s", "generate_s", "write_s", "total_s", "blocks")}
+    peak = measure_peak(module)
+    brushes = runs[0]["brushes"] or 1
+    return {
+        "generator": name,
+        "grid": grid,
+        "brushes": runs[0]["brushes"],
+        "entities": runs[0]["entities"],
+        "bytes": runs[0]["bytes"],
+        "generate_s": round(best["generate_s"], 6),
+        "format_s": round(best["format_s"], 6),
+        "write_s": round(best["write_s"], 6),
+        "total_s": round(best["total_s"], 6),
+        "peak_bytes": peak,
+        "peak_bytes_per_brush": round(peak / brushes, 1),
+        "blocks_per_brush": round(best["blocks"] / brushes, 2),
+    }
+
+
+def load_history(path: str) -> list:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_history(path: str, history: list) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def regressions(result: dict, history: list, tolerance: float) -> list:
+    """Metrics more than `tolerance` worse than the recent median."""
+    past = [h for h in history
+            if h.get("generator") == result["generator"] and h.get("grid") == result["grid"]
+            and h.get("python") == result["python"]][-HISTORY_WINDOW:]
+    if not past:
+        return []
+    found = []
+    for metric in CHECKED_METRICS:
+        values = [h[metric] for h in past if metric in h]
+        if not values:
+            continue
+        baseline = statistics.median(values)
+        if baseline > 0 and result[metric] > baseline * (1 + tolerance):
+            found.append(f"{metric} {result[metric]:g} vs median {baseline:g} "
+                         f"(+{(result[metric] / baseline - 1) * 100:.0f}%)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_city_map / generate_parkour_map")
+    parser.add_argument("--grids", type=int, nargs="+", default=[4, 8, 16],
+                        help="City grid sizes to run (default: 4 8 16)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, best kept (default 3)")
+    parser.add_argument("--history", default=HISTORY_FILE, help="History JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown/growth vs history before flagging (default 0.25)")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any regression is flagged")
+    parser.add_argument("--no-save", action="store_true", help="Do not append results to the history")
+    parser.add_argument("--no-parkour", action="store_true", help="Only benchmark the city generator")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    stamp = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_revision(),
+        "python": platform.python_version(),
+    }
+
+    cases = [("city", generate_city_map, g) for g in args.grids]
+    if not args.no_parkour:
+        cases.append(("parkour", generate_parkour_map, None))
+
+    print(f"{'generator':<9s} {'grid':>4s} {'brushes':>8s} {'generate':>9s} {'format':>9s} "
+          f"{'write':>8s} {'total':>9s} {'peak MB':>8s} {'B/brush':>8s} {'blk/brush':>9s}")
+    results, flagged = [], 0
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name, module, grid in cases:
+            if grid is not None:
+                with CityGrid(grid):
+                    result = bench(name, module, grid, args.repeat, out_dir)
+            else:
+                result = bench(name, module, grid, args.repeat, out_dir)
+            result.update(stamp)
+            grid_label = str(grid) if grid is not None else "-"
+            print(f"{name:<9s} {grid_label:>4s} {result['brushes']:8d} "
+                  f"{result['generate_s'] * 1000:7.1f}ms {result['format_s'] * 1000:7.1f}ms "
+                  f"{result['write_s'] * 1000:6.1f}ms {result['total_s'] * 1000:7.1f}ms "
+                  f"{result['peak_bytes'] / 1e6:8.2f} {result['peak_bytes_per_brush']:8.0f} "
+                  f"{result['blocks_per_brush']:9.2f}")
+            for message in regressions(result, history, args.tolerance):
+                print(f"  REGRESSION: {message}")
+                flagged += 1
+            results.append(result)
+
+    if not args.no_save:
+        save_history(args.history, history + results)
+        print(f"\nAppended {len(results)} result(s) to {args.history}")
+    if flagged:
+        print(f"{flagged} regression(s) flagged (tolerance {args.tolerance:.0%})")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Read and write Q3 IBSP (version 46) files at the lump level.
+
+A BSP is a 144-byte header (magic, version, 17 offset/length pairs)
+followed by the lump data. This module only splits a file into raw lump
+bytes and joins them back; tools that understand a lump's contents decode
+it themselves.
+
+Usage:
+    python3 tools/bsp_file.py maps/qfcity1.bsp     # print the lump directory
+
+Library use:
+    from bsp_file import read_bsp, write_bsp, LUMP_ENTITIES
+
+    bsp = read_bsp("maps/qfcity1.bsp")
+    text = bsp.entity_text()
+    bsp.lumps[LUMP_ENTITIES] = encode_entities(...)
+    write_bsp("maps/qfcity1.bsp", bsp)
+"""
+
+import argparse
+import os
+import struct
+
+BSP_MAGIC = b"IBSP"
+BSP_VERSION = 46
+
+LUMP_ENTITIES = 0
+LUMP_SHADERS = 1
+LUMP_PLANES = 2
+LUMP_NODES = 3
+LUMP_LEAFS = 4
+LUMP_LEAFSURFACES = 5
+LUMP_LEAFBRUSHES = 6
+LUMP_MODELS = 7
+LUMP_BRUSHES = 8
+LUMP_BRUSHSIDES = 9
+LUMP_DRAWVERTS = 10
+LUMP_DRAWINDEXES = 11
+LUMP_FOGS = 12
+LUMP_SURFACES = 13
+LUMP_LIGHTMAPS = 14
+LUMP_LIGHTGRID = 15
+LUMP_VISIBILITY = 16
+HEADER_LUMPS = 17
+
+LUMP_NAMES = [
+    "entities", "shaders", "planes", "nodes", "leafs", "leafsurfaces",
+    "leafbrushes", "models", "brushes", "brushsides", "drawverts",
+    "drawindexes", "fogs", "surfaces", "lightmaps", "lightgrid", "visibility",
+]
+
+HEADER_SIZE = 8 + HEADER_LUMPS * 8
+
+
+class BspFile:
+    """Raw lump bytes of one BSP, plus the on-disk order they were stored in.
+
+    `header_extra` holds whatever sat between the directory and the first
+    lump (q3map2 reserves 76 bytes there), so an unmodified file
+    round-trips byte for byte.
+    """
+
+    def __init__(self, lumps: list, order: list, version: int = BSP_VERSION,
+                 header_extra: bytes = b""):
+        self.lumps = lumps
+        self.order = order
+        self.version = version
+        self.header_extra = header_extra
+
+    def entity_text(self) -> str:
+        return self.lumps[LUMP_ENTITIES].rstrip(b"\0").decode("utf-8", errors="replace")
+
+    def size(self) -> int:
+        return (HEADER_SIZE + len(self.header_extra)
+                + sum(_aligned(len(data)) for data in self.lumps))
+
+
+def _aligned(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def read_bsp(path: str) -> BspFile:
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE or data[:4] != BSP_MAGIC:
+        raise ValueError(f"{path}: not an IBSP file")
+    version = struct.unpack_from("<i", data, 4)[0]
+    if version != BSP_VERSION:
+        raise ValueError(f"{path}: unsupported BSP version {version} (expected {BSP_VERSION})")
+    directory = [struct.unpack_from("<ii", data, 8 + i * 8) for i in range(HEADER_LUMPS)]
+    lumps = []
+    for i, (offset, length) in enumerate(directory):
+        if offset < 0 or length < 0 or offset + length > len(data):
+            raise ValueError(f"{path}: lump {LUMP_NAMES[i]} out of range")
+        lumps.append(data[offset:offset + length])
+    # Keep q3map2's on-disk lump order so a rewrite only moves what changed
+    order = sorted(range(HEADER_LUMPS), key=lambda i: (directory[i][0], directory[i][1], i))
+    first = min((off for off, length in directory if length), default=HEADER_SIZE)
+    header_extra = data[HEADER_SIZE:max(first, HEADER_SIZE)]
+    return BspFile(lumps, order, version, header_extra)
+
+
+def encode_bsp(bsp: BspFile) -> bytes:
+    """Serialize lumps in bsp.order, 4-byte aligned, with a fresh directory."""
+    directory = [(0, 0)] * HEADER_LUMPS
+    body = [bsp.header_extra]
+    offset = HEADER_SIZE + len(bsp.header_extra)
+    for i in bsp.order:
+        data = bsp.lumps[i]
+        directory[i] = (offset, len(data))
+        pad = _aligned(len(data)) - len(data)
+        body.append(data + b"\0" * pad)
+        offset += len(data) + pad
+    header = BSP_MAGIC + struct.pack("<i", bsp.version)
+    header += b"".join(struct.pack("<ii", off, length) for off, length in directory)
+    return header + b"".join(body)
+
+
+def write_bsp(path: str, bsp: BspFile) -> int:
+    """Write atomically (temp file + rename); returns bytes written."""
+    data = encode_bsp(bsp)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def parse_entities(text: str) -> list:
+    """Split an entity lump into a list of key/value dicts (file order)."""
+    entities = []
+    current = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line == "{":
+            current = {}
+        elif line == "}":
+            if current is not None:
+                entities.append(current)
+            current = None
+        elif line.startswith('"') and current is not None:
+            key, _, value = line[1:-1].partition('" "')
+            current[key] = value
+    return entities
+
+
+def encode_entities(entities: list) -> bytes:
+    """Entity lump bytes in q3map2's layout, NUL-terminated."""
+    parts = []
+    for keys in entities:
+        parts.append("{\n")
+        for k, v in keys.items():
+            parts.append(f'"{k}" "{v}"\n')
+        parts.append("}\n")
+    return "".join(parts).encode("utf-8") + b"\0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the lump directory of a Q3 BSP")
+    parser.add_argument("bsp_file", help="Path to .bsp file")
+    args = parser.parse_args()
+
+    bsp = read_bsp(args.bsp_file)
+    print(f"{args.bsp_file}: IBSP v{bsp.version}, {bsp.size()} bytes")
+    for i in bsp.order:
+        print(f"  {i:2d} {LUMP_NAMES[i]:<13s} {len(bsp.lumps[i]):10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""Measure where titan and pilot hulls actually fit in a generated map.
+
+The solid brushes are voxelized into an occupancy grid (--cell units per
+voxel, brush bounds, which is exact for the axial brushes our generators
+emit and conservative for sloped ones). From it:
+
+  headroom    free voxels straight up from each floor cell (3D)
+  levels      floor heights: free voxels resting on solid, with at least
+              --min-area of them
+  clearance   per level, the L-infinity distance in the XY plane from each
+              cell to the nearest cell without room for the hull height
+              (repeated separable min-filter erosion, NumPy only). Q3 hulls
+              are axis-aligned boxes, so a box of half-width r fits on a
+              cell exactly when its clearance covers r.
+  width       per level, the wall-to-wall width through each cell: the
+              shorter of its free x and y runs
+
+Titans are TITAN_HALF_WIDTH x TITAN_HEIGHT (spawn_optimizer.py), pilots
+the Q3 player box. Per level the report gives the area each hull fits
+and, for the ground level (every level with --all-levels):
+
+  titan pockets      titan-sized space not connected to the largest titan
+                     region (the street network): a titan fits, but cannot
+                     walk in, e.g. building interiors behind pilot doors
+  pilot-only floor   room for a pilot that no titan hull can cover:
+                     doorways, alleys, interiors, narrowest width first
+  titan bottlenecks  parts of the street network narrower than
+                     --street-width, narrowest first
+
+Everything is measured in whole voxels, so widths are multiples of --cell
+and hulls are fitted conservatively by up to half a voxel.
+
+The overlay PNG shows the ground level top-down, +Y up:
+  dark grey  solid or no floor        red      no room for a pilot
+  olive      pilot floor a titan      orange   pilot-only
+             hull reaches             green    titan fits (brighter = wider)
+  magenta    titan pocket             white    titan bottleneck
+
+Usage:
+    python3 tools/clearance_map.py maps/qfcity1.map
+    python3 tools/clearance_map.py maps/qfcity1.map --cell 32 --png /tmp/city_clear.png
+    python3 tools/clearance_map.py maps/qfcity1.map --all-levels
+
+Requires: numpy
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from light_preview import write_png
+from map_parser import load_map
+from spawn_optimizer import TITAN_HALF_WIDTH, TITAN_HEIGHT
+from validate_entities import PLAYER_MAXS, PLAYER_MINS, solid_brushes
+
+PILOT_HALF_WIDTH = float(PLAYER_MAXS[0])
+PILOT_HEIGHT = float(PLAYER_MAXS[2] - PLAYER_MINS[2])
+DESIGN_STREET_WIDTH = 384.0  # generate_city_map.STREET_WIDTH
+MAX_LISTED = 10
+
+COLOR_VOID = (48, 48, 48)
+COLOR_BLOCKED = (170, 40, 40)
+COLOR_SHARED = (90, 110, 50)
+COLOR_PILOT = (230, 150, 30)
+COLOR_POCKET = (200, 60, 200)
+COLOR_BOTTLENECK = (255, 255, 255)
+
+
+class Voxels:
+    """Occupancy of the solid brushes on a regular grid.
+
+    solid[k, i, j] covers world z in origin[2] + k*cell .. +cell, x and y
+    likewise; layers come first so each floor slice is contiguous.
+    """
+
+    def __init__(self, m, cell: float):
+        self.cell = cell
+        solid = solid_brushes(m)
+        lo, hi = m.brush_mins[solid], m.brush_maxs[solid]
+        ok = np.all(np.isfinite(lo) & np.isfinite(hi), axis=1)
+        lo, hi = lo[ok], hi[ok]
+        if not len(lo):
+            raise ValueError("no solid brushes")
+        self.origin = np.floor(lo.min(axis=0) / cell) * cell
+        shape = np.ceil((hi.max(axis=0) - self.origin) / cell).astype(int)
+        self.shape = tuple(shape.tolist())
+        self.solid = np.zeros((shape[2], shape[0], shape[1]), dtype=bool)
+        # A voxel is solid if a brush overlaps it with positive volume
+        first = np.floor((lo - self.origin) / cell + 1e-6).astype(int)
+        last = np.ceil((hi - self.origin) / cell - 1e-6).astype(int)
+        for (x0, y0, z0), (x1, y1, z1) in zip(first.tolist(), last.tolist()):
+            self.solid[z0:z1, x0:x1, y0:y1] = True
+
+    def room(self, k: int, height: float) -> np.ndarray:
+        """2D mask of columns with `height` units free from layer k up.
+
+        Space above the top of the grid counts as free (open sky).
+        """
+        cells = math.ceil(height / self.cell)
+        return ~self.solid[k:k + cells].any(axis=0)
+
+    def floor_levels(self, min_cells: int) -> list:
+        """(layer k, floor cells) for layers with at least min_cells floor cells (free above solid)."""
+        levels = []
+        for k in range(1, len(self.solid)):
+            count = int(np.count_nonzero(self.solid[k - 1] & ~self.solid[k]))
+            if count >= min_cells:
+                levels.append((k, count))
+        return levels
+
+    def z(self, k: int) -> float:
+        return float(self.origin[2] + k * self.cell)
+
+    def xy(self, i, j) -> tuple:
+        return self.origin[0] + (i + 0.5) * self.cell, self.origin[1] + (j + 0.5) * self.cell
+
+
+def _min_filter3(mask: np.ndarray, axis: int) -> np.ndarray:
+    """Cells whose neighbours on both sides along axis are also set (edges count as unset)."""
+    out = mask.copy()
+    lead = [slice(None)] * 2
+    trail = [slice(None)] * 2
+    lead[axis], trail[axis] = slice(1, None), slice(None, -1)
+    out[tuple(lead)] &= mask[tuple(trail)]
+    out[tuple(trail)] &= mask[tuple(lead)]
+    edge = [slice(None)] * 2
+    for end in (0, -1):
+        edge[axis] = end
+        out[tuple(edge)] = False
+    return out
+
+
+def chebyshev_clearance(mask: np.ndarray, cap: int) -> np.ndarray:
+    """Largest r (cells, up to cap) with the (2r+1)^2 square around a cell inside mask.
+
+    -1 outside the mask. Each erosion by a 3x3 square is two 1D min
+    filters, so the cost is cap * 4 array passes.
+    """
+    clear = np.where(mask, 0, -1).astype(np.int16)
+    current = mask
+    for r in range(1, cap + 1):
+        current = _min_filter3(_min_filter3(current, 0), 1)
+        if not current.any():
+            break
+        clear[current] = r
+    return clear
+
+
+def hull_radius(half_width: float, cell: float) -> int:
+    """Clearance (cells) a box of this half-width needs around a cell centre."""
+    return max(0, math.ceil(half_width / cell + 0.5) - 1)
+
+
+def components(mask: np.ndarray) -> tuple:
+    """4-connected labels (-1 outside mask) and the size of each label.
+
+    Runs along the second axis get provisional labels in one vectorized
+    pass; only runs touching across rows are merged, with a small
+    union-find over run ids.
+    """
+    flat = mask.ravel()
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    run_id = np.cumsum(starts.ravel()) - 1
+    n_runs = int(starts.sum())
+    parent = list(range(n_runs))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    ids = run_id.reshape(mask.shape)
+    touching = mask[:-1] & mask[1:]
+    pairs = np.unique(np.stack([ids[:-1][touching], ids[1:][touching]], axis=1), axis=0)
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([find(a) for a in range(n_runs)], dtype=np.int64)
+    _, compact = np.unique(roots, return_inverse=True)
+    labels = np.full(flat.shape, -1, dtype=np.int32)
+    labels[flat] = compact.ravel()[run_id[flat]]
+    sizes = np.bincount(labels[flat], minlength=int(compact.max()) + 1 if n_runs else 0)
+    return labels.reshape(mask.shape), sizes.astype(np.int64)
+
+
+def dilate(mask: np.ndarray, r: int) -> np.ndarray:
+    """Cells within L-infinity distance r of the mask."""
+    out = mask
+    for _ in range(r):
+        grown = out.copy()
+        grown[1:] |= out[:-1]
+        grown[:-1] |= out[1:]
+        out = grown.copy()
+        out[:, 1:] |= grown[:, :-1]
+        out[:, :-1] |= grown[:, 1:]
+    return out
+
+
+def _runs_along(mask: np.ndarray, axis: int) -> np.ndarray:
+    """Length of the unbroken run of mask cells through each cell along axis."""
+    m = np.moveaxis(mask, axis, -1)
+    n = m.shape[-1]
+    idx = np.broadcast_to(np.arange(n), m.shape)
+    # Index of the nearest blocked cell before and after each cell
+    before = np.maximum.accumulate(np.where(m, -1, idx), axis=-1)
+    after = np.minimum.accumulate(np.where(m, n, idx)[..., ::-1], axis=-1)[..., ::-1]
+    runs = np.where(m, after - before - 1, 0)
+    return np.moveaxis(runs, -1, axis)
+
+
+def corridor_width(mask: np.ndarray, cell: float) -> np.ndarray:
+    """Wall-to-wall width in units: the shorter of the x and y runs through each cell.
+
+    Along a street that is the street's width; in a plaza or crossing
+    both runs are long. Exact for the axis-aligned layouts we generate.
+    """
+    return np.minimum(_runs_along(mask, 0), _runs_along(mask, 1)) * cell
+
+
+def analyze_level(vox: Voxels, k: int, street_width: float, detail: bool) -> dict:
+    """Hull fit areas for floor layer k; with detail also pockets, pilot-only floor and bottlenecks."""
+    cell = vox.cell
+    standing = vox.solid[k - 1] & ~vox.solid[k]
+    titan_r = hull_radius(TITAN_HALF_WIDTH, cell)
+    pilot_r = hull_radius(PILOT_HALF_WIDTH, cell)
+    street_r = hull_radius(street_width / 2, cell)
+    titan_room = vox.room(k, TITAN_HEIGHT)
+    pilot_room = vox.room(k, PILOT_HEIGHT)
+    titan_clear = chebyshev_clearance(titan_room, street_r if detail else titan_r)
+    pilot_clear = chebyshev_clearance(pilot_room, pilot_r)
+
+    titan = standing & (titan_clear >= titan_r)
+    pilot = standing & (pilot_clear >= pilot_r)
+    labels, sizes = components(titan)
+    main = int(np.argmax(sizes)) if len(sizes) else -1
+    area = cell * cell
+    level = {
+        "k": k,
+        "z": vox.z(k),
+        "floor_area": standing.sum() * area,
+        "pilot_area": pilot.sum() * area,
+        "titan_area": titan.sum() * area,
+        "main_area": (sizes[main] if main >= 0 else 0) * area,
+    }
+    if not detail:
+        return level
+
+    titan_width = corridor_width(titan_room, cell)
+    pilot_width = corridor_width(pilot_room, cell)
+    # Floor no titan hull can cover: alleys, doorways, building interiors
+    pilot_only = pilot & ~dilate(titan, titan_r)
+    # Parts of the titan network narrower than a design street
+    narrow = (labels == main) & (titan_width < street_width)
+    pockets = _regions(vox, labels, sizes, titan_width, skip=main)
+    pockets.sort(key=lambda r: -r["cells"])
+    passages = _regions(vox, *components(pilot_only), pilot_width)
+    passages.sort(key=lambda r: (r["narrowest"], -r["cells"]))
+    bottlenecks = _regions(vox, *components(narrow), titan_width)
+    bottlenecks.sort(key=lambda r: (r["narrowest"], -r["cells"]))
+    level.update({
+        "standing": standing,
+        "titan": titan,
+        "pilot": pilot,
+        "pilot_only": pilot_only,
+        "main": labels == main,
+        "narrow": narrow,
+        "titan_clear": titan_clear,
+        "street_r": street_r,
+        "pockets": pockets,
+        "passages": passages,
+        "bottlenecks": bottlenecks,
+    })
+    return level
+
+
+def _regions(vox: Voxels, labels: np.ndarray, sizes: np.ndarray, width: np.ndarray, skip: int = -1) -> list:
+    """Bounds, size and narrowest width of every labelled region."""
+    inside = labels >= 0
+    lab = labels[inside]
+    i, j = np.nonzero(inside)
+    n = len(sizes)
+    lo_i = np.full(n, np.iinfo(np.int64).max)
+    lo_j = lo_i.copy()
+    hi_i = np.full(n, -1)
+    hi_j = hi_i.copy()
+    narrowest = np.full(n, np.inf)
+    np.minimum.at(lo_i, lab, i)
+    np.minimum.at(lo_j, lab, j)
+    np.maximum.at(hi_i, lab, i)
+    np.maximum.at(hi_j, lab, j)
+    np.minimum.at(narrowest, lab, width[inside])
+    half = vox.cell / 2
+    regions = []
+    for label in range(n):
+        if label == skip:
+            continue
+        x0, y0 = vox.xy(lo_i[label], lo_j[label])
+        x1, y1 = vox.xy(hi_i[label], hi_j[label])
+        regions.append({
+            "cells": int(sizes[label]),
+            "mins": (x0 - half, y0 - half),
+            "maxs": (x1 + half, y1 + half),
+            "narrowest": float(narrowest[label]),
+        })
+    return regions
+
+
+def overlay(level: dict, scale: int = 2) -> np.ndarray:
+    """Top-down RGB image of one analyzed level, +Y up."""
+    standing = level["standing"]
+    rgb = np.empty(standing.shape + (3,), dtype=np.uint8)
+    rgb[:] = COLOR_VOID
+    rgb[standing] = COLOR_BLOCKED
+    rgb[level["pilot"]] = COLOR_SHARED
+    rgb[level["pilot_only"]] = COLOR_PILOT
+    # Titan cells shade from dark green (just fits) to bright green (street width)
+    titan = level["titan"]
+    t = np.clip(level["titan_clear"] / max(level["street_r"], 1), 0, 1)
+    green = np.stack([30 + 40 * t, 110 + 145 * t, 40 + 60 * t], axis=-1).astype(np.uint8)
+    rgb[titan] = green[titan]
+    rgb[titan & ~level["main"]] = COLOR_POCKET
+    rgb[level["narrow"]] = COLOR_BOTTLENECK
+    # Arrays are indexed [x, y]; images are rows of y from the top
+    rgb = rgb.transpose(1, 0, 2)[::-1]
+    return np.repeat(np.repeat(rgb, scale, axis=0), scale, axis=1)
+
+
+def _fmt_region(r: dict) -> str:
+    (x0, y0), (x1, y1) = r["mins"], r["maxs"]
+    return (f"x [{x0:.0f}, {x1:.0f}] y [{y0:.0f}, {y1:.0f}]  {r['cells']:5d} cells  "
+            f"narrowest {r['narrowest']:.0f}")
+
+
+def print_level(level: dict):
+    sq = 1e6
+    print(f"  z={level['z']:<6.0f} floor {level['floor_area'] / sq:7.2f}M u^2  "
+          f"pilot {level['pilot_area'] / sq:7.2f}M  titan {level['titan_area'] / sq:7.2f}M  "
+          f"titan network {level['main_area'] / sq:7.2f}M")
+    if "pockets" not in level:
+        return
+    for title, key in (("titan pockets (fit, not connected to the network)", "pockets"),
+                       ("pilot-only floor, narrowest first", "passages"),
+                       ("titan bottlenecks (network narrower than a street)", "bottlenecks")):
+        regions = level[key]
+        print(f"    {title}: {len(regions)}")
+        for r in regions[:MAX_LISTED]:
+            print(f"      {_fmt_region(r)}")
+        if len(regions) > MAX_LISTED:
+            print(f"      ... {len(regions) - MAX_LISTED} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Titan/pilot clearance analysis of a .map")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--cell", type=float, default=16.0, help="Voxel size in units (default 16)")
+    parser.add_argument("--street-width", type=float, default=DESIGN_STREET_WIDTH,
+                        help=f"Design width of a titan street (default {DESIGN_STREET_WIDTH:.0f})")
+    parser.add_argument("--min-area", type=float, default=65536.0,
+                        help="Smallest floor area, units^2, that counts as a level (default 65536)")
+    parser.add_argument("--all-levels", action="store_true",
+                        help="List pockets, passages and bottlenecks for every level, not just the ground")
+    parser.add_argument("--png", help="Overlay of the ground level (default /tmp/<map>_clearance.png)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    m = load_map(args.map_file)
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    try:
+        vox = Voxels(m, args.cell)
+    except ValueError as e:
+        print(f"ERROR: {args.map_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    levels = vox.floor_levels(max(1, int(args.min_area / args.cell ** 2)))
+    if not levels:
+        print(f"ERROR: {args.map_file}: no floor level of {args.min_area:.0f} units^2", file=sys.stderr)
+        sys.exit(1)
+    ground_k = max(levels, key=lambda level: level[1])[0]
+    results = [analyze_level(vox, k, args.street_width, args.all_levels or k == ground_k)
+               for k, _ in levels]
+    t_analyze = time.perf_counter() - t0
+
+    ground = next(r for r in results if r["k"] == ground_k)
+    shape = " x ".join(str(n) for n in vox.shape)
+    print(f"{args.map_file}: {shape} voxels of {args.cell:.0f} units, {len(results)} level(s)")
+    print(f"  titan {2 * TITAN_HALF_WIDTH:.0f}x{TITAN_HEIGHT:.0f}, pilot {2 * PILOT_HALF_WIDTH:.0f}x"
+          f"{PILOT_HEIGHT:.0f}, street {args.street_width:.0f}; widths are multiples of the voxel size")
+    for level in results:
+        print_level(level)
+
+    png = args.png or os.path.join("/tmp", os.path.splitext(os.path.basename(args.map_file))[0]
+                                   + "_clearance.png")
+    write_png(png, overlay(ground))
+    print(f"  overlay (z={ground['z']:.0f}): {png}")
+    print(f"  [load {t_load:.3f}s, analyze {t_analyze:.3f}s]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Incremental q3map2 compile: rerun only the passes a .map change affects.
+
+The .map is compared against the copy of the last compiled version in
+maps/.compiled/ and the cheapest safe plan is picked:
+
+  full      no previous compile, structural brushes, brush entities,
+            func_group keys, misc_model/_decal/_skybox or worldspawn compile
+            keys changed
+  detail    only detail brushes changed: BSP, then VIS only if the portal
+            file differs from the previous compile's, then LIGHT
+  light     only light entities, worldspawn light keys or the LIGHT
+            arguments changed: LIGHT only. q3map2 -light rereads the light
+            entities from the .map, so the existing BSP+VIS output is reused.
+            Gameplay entities that changed too are patched into the entity
+            lump first.
+  entities  only gameplay point entities changed: rewrite the entity lump
+            (see tools/patch_bsp_entities.py), no q3map2 at all
+  none      nothing changed
+
+Pass durations are remembered per map in maps/.compiled/<name>.json and
+every decision is printed and appended to maps/.compiled/decisions.log with
+the time it saved.
+
+Usage:
+    python3 tools/compile_driver.py maps/qfcity1.map
+    python3 tools/compile_driver.py maps/qfcity1.map --dry-run   # only print the plan
+    python3 tools/compile_driver.py maps/qfcity1.map --full
+    python3 tools/compile_driver.py maps/qfcity1.map --light-args="-fast -samples 4"
+
+q3map2 output goes to /tmp/q3map2.log, as with tools/compile_map.sh.
+
+Requires: numpy
+"""
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from bsp_file import LUMP_VISIBILITY, read_bsp, write_bsp
+from map_diff import brush_hashes
+from map_parser import load_map
+from patch_bsp_entities import (
+    MERGED_BRUSH_CLASSES,
+    RUNTIME_WORLDSPAWN_KEYS,
+    light_targets,
+    rewrite_entity_lump,
+    snapshot_path,
+    split_entities,
+)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+Q3MAP2 = os.path.join(PROJECT_DIR, "external/netradiant/squashfs-root/usr/bin/q3map2.x86_64")
+BASEPATH = os.path.join(PROJECT_DIR, "external/ioq3/build-native/Release")
+LOG_FILE = "/tmp/q3map2.log"
+
+DEFAULT_LIGHT_ARGS = "-fast -samples 2 -bounce 2"
+PASS_ARGS = {
+    "bsp": ["-meta"],
+    "vis": ["-vis"],
+    "light": ["-light"],
+}
+PASSES = ("bsp", "vis", "light")
+
+# CONTENTS_DETAIL: detail brushes do not split the BSP into portals/clusters
+CONTENTS_DETAIL = 0x8000000
+# Worldspawn keys only the LIGHT pass reads
+LIGHT_WORLDSPAWN_KEYS = {
+    "_ambient", "ambient", "_color", "_minlight", "_minvertexlight",
+    "_mingridlight", "gridsize", "_floodlight", "_sun", "_keepLights",
+}
+
+
+def state_path(map_file: str) -> str:
+    return os.path.splitext(snapshot_path(map_file))[0] + ".json"
+
+
+def portal_snapshot_path(map_file: str) -> str:
+    return os.path.splitext(snapshot_path(map_file))[0] + ".prt"
+
+
+def load_state(map_file: str) -> dict:
+    try:
+        with open(state_path(map_file)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"durations": {}}
+
+
+def save_state(map_file: str, state: dict) -> None:
+    path = state_path(map_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _world_brushes(m):
+    """(structural, detail) brush indices merged into the world (worldspawn
+    and func_group), in file order."""
+    merged = np.array([m.classname(e) in MERGED_BRUSH_CLASSES for e in range(len(m.entities))],
+                      dtype=bool)
+    contents = np.bitwise_or.reduceat(m.plane_flags[:, 0], m.brush_plane_start[:-1]) \
+        if m.plane_count else np.zeros(m.brush_count, dtype=np.int32)
+    is_detail = (contents & CONTENTS_DETAIL) != 0
+    world = merged[m.brush_entity]
+    return np.nonzero(world & ~is_detail)[0], np.nonzero(world & is_detail)[0]
+
+
+def world_brush_signatures(m):
+    """(structural, detail) arrays of brush hashes (see map_diff.py) for
+    brushes merged into the world, in file order."""
+    if not m.brush_count:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64)
+    hashes = brush_hashes(m)
+    structural, detail = _world_brushes(m)
+    return hashes[structural], hashes[detail]
+
+
+def exact_brush_signatures(m):
+    """(structural, detail) lists of per-brush byte signatures for brushes
+    merged into the world, in file order.
+
+    Slower than world_brush_signatures but sees what the hashes round away:
+    plane order and sub-quantum point moves.
+    """
+    if not m.brush_count:
+        return [], []
+
+    def sig(b):
+        s = m.brush_planes(int(b))
+        return (
+            m.plane_points[s].tobytes(),
+            tuple(m.textures[t] for t in m.plane_texture[s]),
+            m.plane_texparams[s].tobytes(),
+            m.plane_flags[s].tobytes(),
+        )
+
+    structural, detail = _world_brushes(m)
+    return [sig(b) for b in structural], [sig(b) for b in detail]
+
+
+def plan_compile(old, new, light_args_changed: bool = False) -> dict:
+    """Pick the passes needed to turn old's compiled BSP into new's.
+
+    Returns {"plan": "full"|"detail"|"light"|"entities"|"none",
+    "reasons": [str], "entities": bool}; "entities" means gameplay entities
+    or runtime worldspawn keys changed and the entity lump needs rewriting.
+    """
+    a = split_entities(old)
+    b = split_entities(new)
+
+    full, reasons = [], []
+    brush_ents_a = [item for item in a["brush"] if item[0] != "worldspawn"
+                    and item[0].get("classname") not in MERGED_BRUSH_CLASSES]
+    brush_ents_b = [item for item in b["brush"] if item[0] != "worldspawn"
+                    and item[0].get("classname") not in MERGED_BRUSH_CLASSES]
+    if brush_ents_a != brush_ents_b:
+        full.append("brush entities changed")
+    # func_group keys (_lightmapscale, _castShadows, _phong, ...) are baked
+    # into the BSP's surfaces, so LIGHT alone cannot pick them up
+    groups_a = [item[0] for item in a["brush"] if item[0] != "worldspawn"
+                and item[0].get("classname") == "func_group"]
+    groups_b = [item[0] for item in b["brush"] if item[0] != "worldspawn"
+                and item[0].get("classname") == "func_group"]
+    if groups_a != groups_b:
+        full.append("func_group keys changed")
+    if a["structural"] != b["structural"]:
+        full.append("misc_model/_decal/_skybox entities changed")
+
+    ignored = RUNTIME_WORLDSPAWN_KEYS | LIGHT_WORLDSPAWN_KEYS
+    ws_a = {k: v for k, v in a["worldspawn"].items() if k not in ignored}
+    ws_b = {k: v for k, v in b["worldspawn"].items() if k not in ignored}
+    if ws_a != ws_b:
+        full.append("worldspawn compile keys changed")
+
+    detail_changed = False
+    if a["brush"] != b["brush"] and not full:
+        structural_a, detail_a = world_brush_signatures(old)
+        structural_b, detail_b = world_brush_signatures(new)
+        structural_same = np.array_equal(structural_a, structural_b)
+        detail_same = np.array_equal(detail_a, detail_b)
+        if structural_same and detail_same:
+            # The hashes round away plane order and tiny moves; compare bytes
+            structural_a, detail_a = exact_brush_signatures(old)
+            structural_b, detail_b = exact_brush_signatures(new)
+            structural_same = structural_a == structural_b
+            detail_same = detail_a == detail_b
+        if not structural_same:
+            full.append("structural brushes changed")
+        elif not detail_same:
+            detail_changed = True
+            reasons.append(f"detail brushes changed ({len(detail_a)} -> {len(detail_b)})")
+        else:
+            # The brush text differs in a way neither signature explains
+            full.append("brushes changed")
+
+    light_keys_a = {k: v for k, v in a["worldspawn"].items() if k in LIGHT_WORLDSPAWN_KEYS}
+    light_keys_b = {k: v for k, v in b["worldspawn"].items() if k in LIGHT_WORLDSPAWN_KEYS}
+    lights = False
+    if a["light"] != b["light"]:
+        lights = True
+        reasons.append(f"light entities changed ({len(a['light'])} -> {len(b['light'])})")
+    targets = light_targets(a) | light_targets(b)
+    if targets and ([k for k in a["game"] if k.get("targetname") in targets]
+                    != [k for k in b["game"] if k.get("targetname") in targets]):
+        lights = True
+        reasons.append("spotlight targets moved")
+    if light_keys_a != light_keys_b:
+        lights = True
+        reasons.append("worldspawn light keys changed")
+    if light_args_changed:
+        lights = True
+        reasons.append("LIGHT arguments changed")
+
+    runtime_a = {k: v for k, v in a["worldspawn"].items() if k in RUNTIME_WORLDSPAWN_KEYS}
+    runtime_b = {k: v for k, v in b["worldspawn"].items() if k in RUNTIME_WORLDSPAWN_KEYS}
+    entities = a["game"] != b["game"] or runtime_a != runtime_b
+    if entities:
+        reasons.append("gameplay entities changed")
+
+    if full:
+        return {"plan": "full", "reasons": full, "entities": entities}
+    if detail_changed:
+        return {"plan": "detail", "reasons": reasons, "entities": entities}
+    if lights:
+        return {"plan": "light", "reasons": reasons, "entities": entities}
+    if entities:
+        return {"plan": "entities", "reasons": reasons, "entities": entities}
+    return {"plan": "none", "reasons": ["no changes since last compile"], "entities": False}
+
+
+def pass_command(name: str, map_file: str, light_args: str) -> list:
+    cmd = [Q3MAP2, "-game", "quake3", "-fs_basepath", BASEPATH, "-fs_game", "demoq3"]
+    cmd += PASS_ARGS[name]
+    if name == "light":
+        cmd += shlex.split(light_args)
+    cmd.append(map_file)
+    return cmd
+
+
+def run_pass(name: str, map_file: str, light_args: str) -> float:
+    """Run one q3map2 pass, appending its output to LOG_FILE; returns seconds."""
+    cmd = pass_command(name, map_file, light_args)
+    print(f"  {name.upper()}...", flush=True)
+    t0 = time.perf_counter()
+    with open(LOG_FILE, "a") as log:
+        subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, check=True)
+    return time.perf_counter() - t0
+
+
+def format_saved(skipped: list, durations: dict) -> str:
+    if not skipped:
+        return "nothing skipped"
+    known = [durations[p] for p in skipped if p in durations]
+    names = ", ".join(p.upper() for p in skipped)
+    if len(known) < len(skipped):
+        return f"skipped {names}; saved unknown (no recorded duration)"
+    return f"skipped {names}; saved ~{sum(known):.1f}s"
+
+
+def log_decision(map_file: str, plan: str, reasons: list, saved: str) -> None:
+    line = f"{os.path.basename(map_file)}: {plan.upper()} ({'; '.join(reasons)}); {saved}"
+    print(line)
+    path = os.path.join(os.path.dirname(snapshot_path(map_file)), "decisions.log")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {line}\n")
+
+
+def compile_map(map_file: str, light_args: str = DEFAULT_LIGHT_ARGS,
+                full: bool = False, dry_run: bool = False) -> int:
+    """Compile map_file incrementally. Returns the process exit code."""
+    bsp_file = os.path.splitext(map_file)[0] + ".bsp"
+    prt_file = os.path.splitext(map_file)[0] + ".prt"
+    snap = snapshot_path(map_file)
+    state = load_state(map_file)
+    durations = state.setdefault("durations", {})
+
+    new = load_map(map_file)
+    old = None
+    if full:
+        decision = {"plan": "full", "reasons": ["--full requested"], "entities": False}
+    elif not os.path.exists(snap) or not os.path.exists(bsp_file):
+        decision = {"plan": "full", "reasons": ["no previous compile"], "entities": False}
+    else:
+        old = load_map(snap)
+        light_args_changed = state.get("light_args", light_args) != light_args
+        decision = plan_compile(old, new, light_args_changed)
+
+    plan = decision["plan"]
+    passes = {"full": ["bsp", "vis", "light"], "detail": ["bsp", "vis", "light"],
+              "light": ["light"], "entities": [], "none": []}[plan]
+    if dry_run:
+        print(f"{os.path.basename(map_file)}: would run {plan.upper()} "
+              f"[{' '.join(p.upper() for p in passes) or 'no passes'}] "
+              f"({'; '.join(decision['reasons'])})")
+        return 0
+    if passes and not os.access(Q3MAP2, os.X_OK):
+        print(f"ERROR: q3map2 not found: {Q3MAP2}", file=sys.stderr)
+        return 1
+
+    # Entity lump first: LIGHT keeps whatever gameplay entities the BSP has
+    if decision["entities"] and plan in ("light", "entities"):
+        code, message = rewrite_entity_lump(old, new, bsp_file)
+        print(f"  {message}")
+        if code == 2:
+            # BSP out of step with the snapshot: fall back to a full compile
+            plan, passes = "full", ["bsp", "vis", "light"]
+            decision["reasons"].append("BSP does not match snapshot")
+        elif code != 0:
+            return code
+
+    skipped = [p for p in PASSES if p not in passes]
+    if "vis" in passes and plan == "detail":
+        old_vis = read_bsp(bsp_file).lumps[LUMP_VISIBILITY]
+        old_portals = None
+        if os.path.exists(portal_snapshot_path(map_file)):
+            with open(portal_snapshot_path(map_file), "rb") as f:
+                old_portals = f.read()
+        durations["bsp"] = run_pass("bsp", map_file, light_args)
+        with open(prt_file, "rb") as f:
+            portals_same = old_portals is not None and f.read() == old_portals
+        if portals_same and old_vis:
+            # Same portals, same clusters: the old PVS is still exact
+            bsp = read_bsp(bsp_file)
+            bsp.lumps[LUMP_VISIBILITY] = old_vis
+            write_bsp(bsp_file, bsp)
+            print("  VIS reused (portals unchanged)")
+            skipped.append("vis")
+            decision["reasons"].append("portals unchanged")
+        else:
+            durations["vis"] = run_pass("vis", map_file, light_args)
+        durations["light"] = run_pass("light", map_file, light_args)
+    else:
+        for name in passes:
+            durations[name] = run_pass(name, map_file, light_args)
+
+    if "bsp" in passes and os.path.exists(prt_file):
+        os.makedirs(os.path.dirname(snap), exist_ok=True)
+        shutil.copyfile(prt_file, portal_snapshot_path(map_file))
+    log_decision(map_file, plan, decision["reasons"], format_saved(skipped, durations))
+
+    if plan != "none":
+        os.makedirs(os.path.dirname(snap), exist_ok=True)
+        shutil.copyfile(map_file, snap)
+        state["light_args"] = light_args
+        save_state(map_file, state)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun only the q3map2 passes a .map change needs")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--full", action="store_true", help="Run BSP, VIS and LIGHT regardless")
+    parser.add_argument("--light-args", default=DEFAULT_LIGHT_ARGS,
+                        help=f"Extra LIGHT pass arguments (default: {DEFAULT_LIGHT_ARGS!r})")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan, run nothing")
+    args = parser.parse_args()
+
+    try:
+        code = compile_map(args.map_file, args.light_args, args.full, args.dry_run)
+    except subprocess.CalledProcessError as e:
+        print(f"ERROR: q3map2 failed ({e.returncode}), see {LOG_FILE}", file=sys.stderr)
+        code = 1
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        code = 1
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
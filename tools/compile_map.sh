@@ -1,6 +1,11 @@
 #!/bin/bash
 # tools/compile_map.sh - Compile and deploy a .map file
 # Usage: tools/compile_map.sh maps/qfcity1.map
+#
+# With numpy available, tools/compile_driver.py reruns only the q3map2
+# passes the edit needs (light-only tweaks skip BSP/VIS, entity-only edits
+# skip q3map2 entirely) and logs each decision to maps/.compiled/decisions.log.
+# Set QF_FULL=1 to force all three passes.
 
 set -e
 
@@ -12,15 +17,38 @@ LOG_FILE="/tmp/q3map2.log"
 
 MAP_FILE="${1:?Usage: $0 <map-file>}"
 BSP_FILE="${MAP_FILE%.map}.bsp"
+SNAPSHOT_DIR="$(dirname "$MAP_FILE")/.compiled"
+
+> "$LOG_FILE"
+echo "=== Compiling $MAP_FILE ==="
+
+deploy() {
+    # Deploy to native build
+    echo "  Deploying to native..."
+    mkdir -p "$PROJECT_DIR/external/ioq3/build-native/Release/demoq3/maps/"
+    cp "$BSP_FILE" "$PROJECT_DIR/external/ioq3/build-native/Release/demoq3/maps/"
+
+    # Deploy to WASM build (if it exists)
+    if [ -d "$PROJECT_DIR/external/ioq3/build/Release/demoq3/maps/" ]; then
+        echo "  Deploying to WASM..."
+        cp "$BSP_FILE" "$PROJECT_DIR/external/ioq3/build/Release/demoq3/maps/"
+    fi
+}
+
+# Incremental compile: rerun only the passes this edit affects
+if python3 -c "import numpy" 2>/dev/null; then
+    python3 "$SCRIPT_DIR/compile_driver.py" "$MAP_FILE" ${QF_FULL:+--full}
+    deploy
+    echo "Done: $BSP_FILE"
+    echo "Build log: $LOG_FILE"
+    exit 0
+fi
 
 if [ ! -x "$Q3MAP2" ]; then
     echo "ERROR: q3map2 not found: $Q3MAP2"
     exit 1
 fi
 
-> "$LOG_FILE"
-echo "=== Compiling $MAP_FILE ==="
-
 # BSP pass
 echo "  BSP..."
 "$Q3MAP2" -game quake3 -fs_basepath "$BASEPATH" -fs_game demoq3 -meta "$MAP_FILE" >> "$LOG_FILE" 2>&1
@@ -33,16 +61,11 @@ echo "  VIS..."
 echo "  LIGHT..."
 "$Q3MAP2" -game quake3 -fs_basepath "$BASEPATH" -fs_game demoq3 -light -fast -samples 2 -bounce 2 "$MAP_FILE" >> "$LOG_FILE" 2>&1
 
-# Deploy to native build
-echo "  Deploying to native..."
-mkdir -p "$PROJECT_DIR/external/ioq3/build-native/Release/demoq3/maps/"
-cp "$BSP_FILE" "$PROJECT_DIR/external/ioq3/build-native/Release/demoq3/maps/"
+# Remember what this BSP was built from, for incremental compiles next time
+mkdir -p "$SNAPSHOT_DIR"
+cp "$MAP_FILE" "$SNAPSHOT_DIR/"
 
-# Deploy to WASM build (if it exists)
-if [ -d "$PROJECT_DIR/external/ioq3/build/Release/demoq3/maps/" ]; then
-    echo "  Deploying to WASM..."
-    cp "$BSP_FILE" "$PROJECT_DIR/external/ioq3/build/Release/demoq3/maps/"
-fi
+deploy
 
 echo "Done: $BSP_FILE"
 echo "Build log: $LOG_FILE"
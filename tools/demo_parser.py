@@ -0,0 +1,845 @@
+#!/usr/bin/env python3
+"""Streaming parser for ioquake3 client demos (.dm_68 / .dm_71).
+
+A demo is the client's view of the server message stream: a sequence of
+    int32 serverMessageSequence, int32 length, <length bytes of message>
+records, terminated by length -1. Every message body is a Huffman-coded
+bitstream (msg.c / huffman.c) carrying the gamestate, server commands and
+delta-compressed snapshots. This module reads the file one message at a time,
+rebuilds each snapshot's playerState_t and entity states against the frame it
+was delta-coded from, and turns the local player's movement into NumPy arrays
+so test runs can assert on trajectories instead of eyeballing a GIF.
+
+Field tables mirror the QuakeFall engine (external/ioq3/code/qcommon/msg.c),
+which widened eFlags to 24 bits in both entityState_t and playerState_t.
+
+Usage:
+    python3 tools/demo_parser.py tests/recordings/parkour_basic.dm_68
+    python3 tools/demo_parser.py demo.dm_68 --npz trajectory.npz
+    python3 tools/demo_parser.py demo.dm_68 --expect "max_rise > 40" --expect "wallrun_s > 0.2"
+    python3 tools/demo_parser.py demo.dm_68 --metrics     # list names usable in --expect
+
+In Python:
+    from demo_parser import load_trajectory
+    traj = load_trajectory("demo.dm_68")
+    traj["origin"]      # (N, 3) float32, one row per valid snapshot
+    traj["velocity"]    # (N, 3) float32
+    traj["pm_flags"]    # (N,) uint16
+
+Exit status with --expect: 0 when every expectation holds, 1 otherwise.
+
+Requires: numpy
+"""
+
+import argparse
+import hashlib
+import json
+import operator
+import os
+import re
+import struct
+import sys
+
+import numpy as np
+
+# --- Protocol constants (qcommon.h / q_shared.h) ---
+GENTITYNUM_BITS = 10
+MAX_GENTITIES = 1 << GENTITYNUM_BITS
+ENTITYNUM_NONE = MAX_GENTITIES - 1
+ENTITYNUM_WORLD = MAX_GENTITIES - 2
+FLOAT_INT_BITS = 13
+FLOAT_INT_BIAS = 1 << (FLOAT_INT_BITS - 1)
+PACKET_BACKUP = 32
+PACKET_MASK = PACKET_BACKUP - 1
+MAX_STATS = 16
+MAX_PERSISTANT = 16
+MAX_WEAPONS = 16
+MAX_POWERUPS = 16
+MAX_MSGLEN = 16384
+
+SVC_BAD, SVC_NOP, SVC_GAMESTATE, SVC_CONFIGSTRING, SVC_BASELINE = 0, 1, 2, 3, 4
+SVC_SERVERCOMMAND, SVC_DOWNLOAD, SVC_SNAPSHOT, SVC_EOF = 5, 6, 7, 8
+
+CS_SERVERINFO = 0
+
+HUFFMAN_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "quakefall", "demo_huffman.json")
+
+# pm_flags bits (bg_public.h). 4 and 128 are the QuakeFall parkour flags.
+PMF_FLAGS = {
+    "ducked": 1,
+    "jump_held": 2,
+    "wallrun": 4,
+    "backwards_jump": 8,
+    "backwards_run": 16,
+    "time_land": 32,
+    "time_knockback": 64,
+    "doublejump": 128,
+    "time_waterjump": 256,
+    "respawned": 512,
+}
+
+# Symbol frequencies the adaptive Huffman tree is primed with (msg.c msg_hData).
+# Messages are decoded with the resulting static tree.
+HUFF_FREQ = (
+    250315, 41193, 6292, 7106, 3730, 3750, 6110, 23283,
+    33317, 6950, 7838, 9714, 9257, 17259, 3949, 1778,
+    8288, 1604, 1590, 1663, 1100, 1213, 1238, 1134,
+    1749, 1059, 1246, 1149, 1273, 4486, 2805, 3472,
+    21819, 1159, 1670, 1066, 1043, 1012, 1053, 1070,
+    1726, 888, 1180, 850, 960, 780, 1752, 3296,
+    10630, 4514, 5881, 2685, 4650, 3837, 2093, 1867,
+    2584, 1949, 1972, 940, 1134, 1788, 1670, 1206,
+    5719, 6128, 7222, 6654, 3710, 3795, 1492, 1524,
+    2215, 1140, 1355, 971, 2180, 1248, 1328, 1195,
+    1770, 1078, 1264, 1266, 1168, 965, 1155, 1186,
+    1347, 1228, 1529, 1600, 2617, 2048, 2546, 3275,
+    2410, 3585, 2504, 2800, 2675, 6146, 3663, 2840,
+    14253, 3164, 2221, 1687, 3208, 2739, 3512, 4796,
+    4091, 3515, 5288, 4016, 7937, 6031, 5360, 3924,
+    4892, 3743, 4566, 4807, 5852, 6400, 6225, 8291,
+    23243, 7838, 7073, 8935, 5437, 4483, 3641, 5256,
+    5312, 5328, 5370, 3492, 2458, 1694, 1821, 2121,
+    1916, 1149, 1516, 1367, 1236, 1029, 1258, 1104,
+    1245, 1006, 1149, 1025, 1241, 952, 1287, 997,
+    1713, 1009, 1187, 879, 1099, 929, 1078, 951,
+    1656, 930, 1153, 1030, 1262, 1062, 1214, 1060,
+    1621, 930, 1106, 912, 1034, 892, 1158, 990,
+    1175, 850, 1121, 903, 1087, 920, 1144, 1056,
+    3462, 2240, 4397, 12136, 7758, 1345, 1307, 3278,
+    1950, 886, 1023, 1112, 1077, 1042, 1061, 1071,
+    1484, 1001, 1096, 915, 1052, 995, 1070, 876,
+    1111, 851, 1059, 805, 1112, 923, 1103, 817,
+    1899, 1872, 976, 841, 1127, 956, 1159, 950,
+    7791, 954, 1289, 933, 1127, 3207, 1020, 927,
+    1355, 768, 1040, 745, 952, 805, 1073, 740,
+    1013, 805, 1008, 796, 996, 1057, 11457, 13504,
+)
+
+# (name, bits) in wire order; bits 0 = float, negative = signed
+ENTITY_FIELDS = (
+    ("pos.trTime", 32), ("pos.trBase[0]", 0), ("pos.trBase[1]", 0),
+    ("pos.trDelta[0]", 0), ("pos.trDelta[1]", 0), ("pos.trBase[2]", 0),
+    ("apos.trBase[1]", 0), ("pos.trDelta[2]", 0), ("apos.trBase[0]", 0),
+    ("event", 10), ("angles2[1]", 0), ("eType", 8), ("torsoAnim", 8),
+    ("eventParm", 8), ("legsAnim", 8), ("groundEntityNum", GENTITYNUM_BITS),
+    ("pos.trType", 8), ("eFlags", 24), ("otherEntityNum", GENTITYNUM_BITS),
+    ("weapon", 8), ("clientNum", 8), ("angles[1]", 0), ("pos.trDuration", 32),
+    ("apos.trType", 8), ("origin[0]", 0), ("origin[1]", 0), ("origin[2]", 0),
+    ("solid", 24), ("powerups", MAX_POWERUPS), ("modelindex", 8),
+    ("otherEntityNum2", GENTITYNUM_BITS), ("loopSound", 8), ("generic1", 8),
+    ("origin2[2]", 0), ("origin2[0]", 0), ("origin2[1]", 0), ("modelindex2", 8),
+    ("angles[0]", 0), ("time", 32), ("apos.trTime", 32), ("apos.trDuration", 32),
+    ("apos.trBase[2]", 0), ("apos.trDelta[0]", 0), ("apos.trDelta[1]", 0),
+    ("apos.trDelta[2]", 0), ("time2", 32), ("angles[2]", 0), ("angles2[0]", 0),
+    ("angles2[2]", 0), ("constantLight", 32), ("frame", 16),
+)
+
+PLAYER_FIELDS = (
+    ("commandTime", 32), ("origin[0]", 0), ("origin[1]", 0), ("bobCycle", 8),
+    ("velocity[0]", 0), ("velocity[1]", 0), ("viewangles[1]", 0),
+    ("viewangles[0]", 0), ("weaponTime", -16), ("origin[2]", 0),
+    ("velocity[2]", 0), ("legsTimer", 8), ("pm_time", -16),
+    ("eventSequence", 16), ("torsoAnim", 8), ("movementDir", 4),
+    ("events[0]", 8), ("legsAnim", 8), ("events[1]", 8), ("pm_flags", 16),
+    ("groundEntityNum", GENTITYNUM_BITS), ("weaponstate", 4), ("eFlags", 24),
+    ("externalEvent", 10), ("gravity", 16), ("speed", 16),
+    ("delta_angles[1]", 16), ("externalEventParm", 8), ("viewheight", -8),
+    ("damageEvent", 8), ("damageYaw", 8), ("damagePitch", 8),
+    ("damageCount", 8), ("generic1", 8), ("pm_type", 8),
+    ("delta_angles[0]", 16), ("delta_angles[2]", 16), ("torsoTimer", 12),
+    ("eventParms[0]", 8), ("eventParms[1]", 8), ("clientNum", 8),
+    ("weapon", 5), ("viewangles[2]", 0), ("grapplePoint[0]", 0),
+    ("grapplePoint[1]", 0), ("grapplePoint[2]", 0),
+    ("jumppad_ent", GENTITYNUM_BITS), ("loopSound", 16),
+)
+
+ENTITY_INDEX = {name: i for i, (name, _) in enumerate(ENTITY_FIELDS)}
+PLAYER_INDEX = {name: i for i, (name, _) in enumerate(PLAYER_FIELDS)}
+
+
+class DemoError(Exception):
+    """Malformed or unsupported demo data."""
+
+
+# --- Huffman tree (huffman.c) ---
+
+def build_huffman_codes() -> list:
+    """Replay Huff_addRef() over HUFF_FREQ and return [(symbol, code, length)].
+
+    The engine builds its message tree by feeding every symbol through the
+    adaptive (FGK) coder msg_hData[i] times; the tie-breaking of that
+    process decides the final codes, so it is reproduced step for step.
+    Codes are stored first-bit-lowest, the order Huff_getBit() reads them.
+    The NYT leaf is included as symbol 256; it never appears in valid data.
+    """
+    nyt, internal = 256, 257
+    size = 2 * 256 + 1
+    parent = [-1] * size
+    left = [-1] * size
+    right = [-1] * size
+    nxt = [-1] * size
+    prv = [-1] * size
+    weight = [0] * size
+    symbol = [internal] * size
+    head = [None] * size
+    loc = [-1] * 257
+    freelist = []
+    state = {"tree": 0, "nodes": 1}
+
+    # node 0 is the NYT node, permanently at the head of the rank list
+    symbol[0] = nyt
+    loc[nyt] = 0
+    lhead = 0
+
+    def get_ppnode():
+        return freelist.pop() if freelist else [None]
+
+    def free_ppnode(cell):
+        cell[0] = None
+        freelist.append(cell)
+
+    def swap(n1, n2):
+        p1, p2 = parent[n1], parent[n2]
+        if p1 >= 0:
+            if left[p1] == n1:
+                left[p1] = n2
+            else:
+                right[p1] = n2
+        else:
+            state["tree"] = n2
+        if p2 >= 0:
+            if left[p2] == n2:
+                left[p2] = n1
+            else:
+                right[p2] = n1
+        else:
+            state["tree"] = n1
+        parent[n1] = p2
+        parent[n2] = p1
+
+    def swaplist(n1, n2):
+        t = nxt[n1]
+        nxt[n1] = nxt[n2]
+        nxt[n2] = t
+        t = prv[n1]
+        prv[n1] = prv[n2]
+        prv[n2] = t
+        if nxt[n1] == n1:
+            nxt[n1] = n2
+        if nxt[n2] == n2:
+            nxt[n2] = n1
+        if nxt[n1] >= 0:
+            prv[nxt[n1]] = n1
+        if nxt[n2] >= 0:
+            prv[nxt[n2]] = n2
+        if prv[n1] >= 0:
+            nxt[prv[n1]] = n1
+        if prv[n2] >= 0:
+            nxt[prv[n2]] = n2
+
+    def increment(node):
+        if node < 0:
+            return
+        w = weight[node]
+        if nxt[node] >= 0 and weight[nxt[node]] == w:
+            lnode = head[node][0]
+            if lnode != parent[node]:
+                swap(lnode, node)
+            swaplist(lnode, node)
+        if prv[node] >= 0 and weight[prv[node]] == w:
+            head[node][0] = prv[node]
+        else:
+            head[node][0] = None
+            free_ppnode(head[node])
+        weight[node] = w + 1
+        if nxt[node] >= 0 and weight[nxt[node]] == w + 1:
+            head[node] = head[nxt[node]]
+        else:
+            head[node] = get_ppnode()
+            head[node][0] = node
+        if parent[node] >= 0:
+            increment(parent[node])
+            if prv[node] == parent[node]:
+                swaplist(node, parent[node])
+                if head[node][0] == node:
+                    head[node][0] = parent[node]
+
+    def add_ref(ch):
+        if loc[ch] >= 0:
+            increment(loc[ch])
+            return
+        tnode, tnode2 = state["nodes"], state["nodes"] + 1
+        state["nodes"] += 2
+
+        symbol[tnode2] = internal
+        weight[tnode2] = 1
+        first = nxt[lhead]
+        nxt[tnode2] = first
+        if first >= 0:
+            prv[first] = tnode2
+            if weight[first] == 1:
+                head[tnode2] = head[first]
+            else:
+                head[tnode2] = get_ppnode()
+                head[tnode2][0] = tnode2
+        else:
+            head[tnode2] = get_ppnode()
+            head[tnode2][0] = tnode2
+        nxt[lhead] = tnode2
+        prv[tnode2] = lhead
+
+        symbol[tnode] = ch
+        weight[tnode] = 1
+        first = nxt[lhead]
+        nxt[tnode] = first
+        if first >= 0:
+            prv[first] = tnode
+            if weight[first] == 1:
+                head[tnode] = head[first]
+            else:
+                head[tnode] = get_ppnode()
+                head[tnode][0] = tnode2
+        else:
+            head[tnode] = get_ppnode()
+            head[tnode][0] = tnode
+        nxt[lhead] = tnode
+        prv[tnode] = lhead
+
+        p = parent[lhead]
+        if p >= 0:
+            if left[p] == lhead:
+                left[p] = tnode2
+            else:
+                right[p] = tnode2
+        else:
+            state["tree"] = tnode2
+        right[tnode2] = tnode
+        left[tnode2] = lhead
+        parent[tnode2] = p
+        parent[lhead] = tnode2
+        parent[tnode] = tnode2
+        loc[ch] = tnode
+        increment(parent[tnode2])
+
+    for ch, count in enumerate(HUFF_FREQ):
+        for _ in range(count):
+            add_ref(ch)
+
+    codes = []
+    stack = [(state["tree"], 0, 0)]
+    while stack:
+        node, bits, length = stack.pop()
+        if symbol[node] == internal:
+            stack.append((left[node], bits, length + 1))
+            stack.append((right[node], bits | (1 << length), length + 1))
+        else:
+            codes.append((symbol[node], bits, length))
+    return codes
+
+
+_HUFFMAN = None
+
+
+def huffman_table():
+    """(table, width) with table[next `width` bits] = (symbol, code length).
+
+    Replaying a million Huff_addRef() calls takes a few seconds, so the codes
+    are cached in HUFFMAN_CACHE, keyed by a digest of the frequency table.
+    """
+    global _HUFFMAN
+    if _HUFFMAN is not None:
+        return _HUFFMAN
+    digest = hashlib.sha1(repr(HUFF_FREQ).encode()).hexdigest()[:12]
+    codes = None
+    try:
+        with open(HUFFMAN_CACHE) as f:
+            cached = json.load(f)
+        if cached.get("digest") == digest:
+            codes = [tuple(c) for c in cached["codes"]]
+    except (OSError, ValueError):
+        pass
+    if codes is None:
+        codes = build_huffman_codes()
+        try:
+            os.makedirs(os.path.dirname(HUFFMAN_CACHE), exist_ok=True)
+            tmp = HUFFMAN_CACHE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"digest": digest, "codes": codes}, f)
+            os.replace(tmp, HUFFMAN_CACHE)
+        except OSError:
+            pass  # read-only home: rebuild next time
+    width = max(length for _, _, length in codes)
+    table = [None] * (1 << width)
+    for sym, bits, length in codes:
+        entry = (sym, length)
+        for high in range(1 << (width - length)):
+            table[bits | (high << length)] = entry
+    _HUFFMAN = (table, width)
+    return _HUFFMAN
+
+
+# --- Bit reader (MSG_ReadBits for non-OOB messages) ---
+
+_FLOAT = struct.Struct("<f")
+_UINT = struct.Struct("<I")
+
+
+def _bits_to_float(value: int) -> float:
+    return _FLOAT.unpack(_UINT.pack(value & 0xFFFFFFFF))[0]
+
+
+class MessageReader:
+    """Reads Huffman-coded values from one server message."""
+
+    def __init__(self, data: bytes):
+        self.data = int.from_bytes(data, "little")
+        self.size_bits = len(data) * 8
+        self.bit = 0
+        self.table, self.width = huffman_table()
+        self.mask = (1 << self.width) - 1
+
+    @property
+    def overflowed(self) -> bool:
+        return self.bit > self.size_bits
+
+    def read_bits(self, bits: int) -> int:
+        signed = bits < 0
+        if signed:
+            bits = -bits
+        value = 0
+        nbits = bits & 7
+        if nbits:
+            # sub-byte remainder is sent raw, low bits first
+            value = (self.data >> self.bit) & ((1 << nbits) - 1)
+            self.bit += nbits
+            bits -= nbits
+        table, mask, data = self.table, self.mask, self.data
+        shift = nbits
+        for _ in range(bits >> 3):
+            sym, length = table[(data >> self.bit) & mask]
+            if sym == 256:
+                raise DemoError(f"undecodable symbol at bit {self.bit}")
+            self.bit += length
+            value |= sym << shift
+            shift += 8
+        if self.bit > self.size_bits:
+            raise DemoError(f"read past end of message ({self.bit} > {self.size_bits} bits)")
+        if signed and shift < 32 and value & (1 << (shift - 1)):
+            value -= 1 << shift
+        elif shift == 32 and value & 0x80000000:
+            value -= 1 << 32  # MSG_ReadBits returns a C int
+        return value
+
+    def read_byte(self) -> int:
+        return self.read_bits(8)
+
+    def read_short(self) -> int:
+        return self.read_bits(-16)
+
+    def read_long(self) -> int:
+        return self.read_bits(-32)
+
+    def read_string(self, limit: int = 1024) -> str:
+        chars = []
+        for _ in range(limit - 1):
+            c = self.read_byte()
+            if c == 0:
+                break
+            # msg.c maps '%' and high-ASCII to '.'
+            chars.append("." if c > 127 or c == 37 else chr(c))
+        return "".join(chars)
+
+    def read_big_string(self) -> str:
+        return self.read_string(8192)
+
+    def read_data(self, length: int) -> bytes:
+        return bytes(self.read_byte() for _ in range(length))
+
+
+# --- Delta decoding (MSG_ReadDeltaEntity / MSG_ReadDeltaPlayerstate) ---
+
+ENTITY_ZERO = tuple(0.0 if bits == 0 else 0 for _, bits in ENTITY_FIELDS)
+PLAYER_ZERO = tuple(0.0 if bits == 0 else 0 for _, bits in PLAYER_FIELDS)
+
+
+class PlayerState:
+    __slots__ = ("fields", "stats", "persistant", "ammo", "powerups")
+
+    def __init__(self, fields=PLAYER_ZERO, stats=None, persistant=None, ammo=None, powerups=None):
+        self.fields = list(fields)
+        self.stats = list(stats or [0] * MAX_STATS)
+        self.persistant = list(persistant or [0] * MAX_PERSISTANT)
+        self.ammo = list(ammo or [0] * MAX_WEAPONS)
+        self.powerups = list(powerups or [0] * MAX_POWERUPS)
+
+    def copy(self) -> "PlayerState":
+        return PlayerState(self.fields, self.stats, self.persistant, self.ammo, self.powerups)
+
+    def __getitem__(self, name: str):
+        return self.fields[PLAYER_INDEX[name]]
+
+
+def read_delta_entity(msg: MessageReader, base, number: int):
+    """Return the new field tuple for entity `number`, or None if removed."""
+    if msg.read_bits(1):
+        return None
+    if not msg.read_bits(1):
+        return base
+    count = msg.read_byte()
+    if count > len(ENTITY_FIELDS):
+        raise DemoError(f"entity {number}: invalid field count {count}")
+    fields = list(base)
+    for i in range(count):
+        if not msg.read_bits(1):
+            continue
+        bits = ENTITY_FIELDS[i][1]
+        if bits == 0:
+            if not msg.read_bits(1):
+                fields[i] = 0.0
+            elif not msg.read_bits(1):
+                fields[i] = float(msg.read_bits(FLOAT_INT_BITS) - FLOAT_INT_BIAS)
+            else:
+                fields[i] = _bits_to_float(msg.read_bits(32))
+        elif not msg.read_bits(1):
+            fields[i] = 0
+        else:
+            fields[i] = msg.read_bits(bits)
+    return tuple(fields)
+
+
+def read_delta_playerstate(msg: MessageReader, base: PlayerState) -> PlayerState:
+    ps = base.copy()
+    count = msg.read_byte()
+    if count > len(PLAYER_FIELDS):
+        raise DemoError(f"playerstate: invalid field count {count}")
+    fields = ps.fields
+    for i in range(count):
+        if not msg.read_bits(1):
+            continue
+        bits = PLAYER_FIELDS[i][1]
+        if bits == 0:
+            if not msg.read_bits(1):
+                fields[i] = float(msg.read_bits(FLOAT_INT_BITS) - FLOAT_INT_BIAS)
+            else:
+                fields[i] = _bits_to_float(msg.read_bits(32))
+        else:
+            fields[i] = msg.read_bits(bits)
+    if msg.read_bits(1):
+        for array, count, reader in ((ps.stats, MAX_STATS, msg.read_short),
+                                     (ps.persistant, MAX_PERSISTANT, msg.read_short),
+                                     (ps.ammo, MAX_WEAPONS, msg.read_short),
+                                     (ps.powerups, MAX_POWERUPS, msg.read_long)):
+            if msg.read_bits(1):
+                mask = msg.read_bits(count)
+                for i in range(count):
+                    if mask & (1 << i):
+                        array[i] = reader()
+    return ps
+
+
+# --- Message stream ---
+
+class Snapshot:
+    __slots__ = ("message_num", "server_time", "delta_num", "flags", "areamask",
+                 "ps", "entities", "valid")
+
+    def __init__(self, message_num, server_time, delta_num, flags, areamask, ps, entities, valid):
+        self.message_num = message_num
+        self.server_time = server_time
+        self.delta_num = delta_num
+        self.flags = flags
+        self.areamask = areamask
+        self.ps = ps
+        self.entities = entities    # {number: field tuple}, in entity order
+        self.valid = valid
+
+
+def iter_messages(f):
+    """Yield (sequence, body) for each demo record until the end marker."""
+    header = struct.Struct("<ii")
+    while True:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return
+        sequence, length = header.unpack(raw)
+        if length == -1 or sequence == -1:
+            return
+        if length < 0 or length > MAX_MSGLEN:
+            raise DemoError(f"message {sequence}: bad length {length}")
+        body = f.read(length)
+        if len(body) < length:
+            return  # demo cut short (client killed before stoprecord)
+        yield sequence, body
+
+
+class DemoParser:
+    """Replays a demo and yields each snapshot the client would have accepted."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.configstrings = {}
+        self.baselines = {}
+        self.server_commands = []
+        self.client_num = -1
+        self.snapshots_seen = 0
+        self.snapshots_invalid = 0
+        self._ring = [None] * PACKET_BACKUP
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            for sequence, body in iter_messages(f):
+                yield from self._parse_message(sequence, body)
+
+    def _parse_message(self, sequence: int, body: bytes):
+        msg = MessageReader(body)
+        msg.read_long()  # reliableAcknowledge
+        while True:
+            cmd = msg.read_byte()
+            if cmd == SVC_EOF:
+                return
+            if cmd == SVC_NOP:
+                continue
+            if cmd == SVC_SERVERCOMMAND:
+                seq = msg.read_long()
+                self.server_commands.append((seq, msg.read_string()))
+            elif cmd == SVC_GAMESTATE:
+                self._parse_gamestate(msg)
+            elif cmd == SVC_SNAPSHOT:
+                snap = self._parse_snapshot(msg, sequence)
+                if snap.valid:
+                    yield snap
+            else:
+                raise DemoError(f"message {sequence}: unsupported command {cmd}")
+
+    def _parse_gamestate(self, msg: MessageReader):
+        self.configstrings.clear()
+        self.baselines.clear()
+        self._ring = [None] * PACKET_BACKUP
+        msg.read_long()  # serverCommandSequence
+        while True:
+            cmd = msg.read_byte()
+            if cmd == SVC_EOF:
+                break
+            if cmd == SVC_CONFIGSTRING:
+                index = msg.read_short()
+                self.configstrings[index] = msg.read_big_string()
+            elif cmd == SVC_BASELINE:
+                number = msg.read_bits(GENTITYNUM_BITS)
+                state = read_delta_entity(msg, ENTITY_ZERO, number)
+                if state is not None:
+                    self.baselines[number] = state
+            else:
+                raise DemoError(f"gamestate: unexpected command {cmd}")
+        self.client_num = msg.read_long()
+        msg.read_long()  # checksumFeed
+
+    def _parse_snapshot(self, msg: MessageReader, message_num: int) -> Snapshot:
+        server_time = msg.read_long()
+        delta = msg.read_byte()
+        delta_num = message_num - delta if delta else -1
+        flags = msg.read_byte()
+        areamask = msg.read_data(msg.read_byte())
+
+        old = None
+        valid = True
+        if delta_num >= 0:
+            old = self._ring[delta_num & PACKET_MASK]
+            if old is None or old.message_num != delta_num or not old.valid \
+                    or message_num - delta_num >= PACKET_BACKUP:
+                # the engine still parses against the stale slot to stay in
+                # sync with the bitstream, but throws the result away
+                valid = False
+
+        ps = read_delta_playerstate(msg, old.ps if old else PlayerState())
+        entities = self._parse_entities(msg, old.entities if old else {})
+
+        snap = Snapshot(message_num, server_time, delta_num, flags, areamask, ps, entities, valid)
+        self._ring[message_num & PACKET_MASK] = snap
+        self.snapshots_seen += 1
+        if not valid:
+            self.snapshots_invalid += 1
+        return snap
+
+    def _parse_entities(self, msg: MessageReader, old: dict) -> dict:
+        """CL_ParsePacketEntities: merge the sorted old list with the deltas."""
+        new = {}
+        old_items = iter(old.items())
+        oldnum, oldstate = next(old_items, (MAX_GENTITIES, None))
+        while True:
+            newnum = msg.read_bits(GENTITYNUM_BITS)
+            if newnum == ENTITYNUM_NONE:
+                break
+            while oldnum < newnum:
+                new[oldnum] = oldstate  # unchanged
+                oldnum, oldstate = next(old_items, (MAX_GENTITIES, None))
+            if oldnum == newnum:
+                state = read_delta_entity(msg, oldstate, newnum)
+                oldnum, oldstate = next(old_items, (MAX_GENTITIES, None))
+            else:
+                state = read_delta_entity(msg, self.baselines.get(newnum, ENTITY_ZERO), newnum)
+            if state is not None:
+                new[newnum] = state
+        while oldnum < MAX_GENTITIES:
+            new[oldnum] = oldstate
+            oldnum, oldstate = next(old_items, (MAX_GENTITIES, None))
+        return new
+
+    @property
+    def serverinfo(self) -> dict:
+        parts = self.configstrings.get(CS_SERVERINFO, "").split("\\")[1:]
+        return dict(zip(parts[0::2], parts[1::2]))
+
+
+# --- Trajectories ---
+
+def load_trajectory(path: str, entity: int = None) -> dict:
+    """Per-snapshot arrays for the recording client (and optionally one entity).
+
+    Snapshots repeated with the same serverTime (the demo restarting delta
+    chains) are kept once. Keys: server_time (ms), command_time (ms),
+    origin, velocity, viewangles, pm_flags, pm_type, ground_entity, eflags,
+    and entity_origin / entity_present when `entity` is given.
+    """
+    parser = DemoParser(path)
+    rows = []
+    ent_rows = []
+    last_time = None
+    i_origin = [PLAYER_INDEX[f"origin[{k}]"] for k in range(3)]
+    i_velocity = [PLAYER_INDEX[f"velocity[{k}]"] for k in range(3)]
+    i_angles = [PLAYER_INDEX[f"viewangles[{k}]"] for k in range(3)]
+    i_base = [ENTITY_INDEX[f"pos.trBase[{k}]"] for k in range(3)]
+    scalars = [PLAYER_INDEX[name] for name in
+               ("commandTime", "pm_flags", "pm_type", "groundEntityNum", "eFlags")]
+    for snap in parser:
+        if snap.server_time == last_time:
+            continue
+        last_time = snap.server_time
+        f = snap.ps.fields
+        rows.append((snap.server_time, *(f[i] for i in scalars),
+                     *(f[i] for i in i_origin), *(f[i] for i in i_velocity),
+                     *(f[i] for i in i_angles)))
+        if entity is not None:
+            state = snap.entities.get(entity)
+            ent_rows.append((1, *(state[i] for i in i_base)) if state else (0, 0.0, 0.0, 0.0))
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, 15)
+    traj = {
+        "server_time": data[:, 0].astype(np.int32),
+        "command_time": data[:, 1].astype(np.int32),
+        "pm_flags": data[:, 2].astype(np.uint16),
+        "pm_type": data[:, 3].astype(np.uint8),
+        "ground_entity": data[:, 4].astype(np.int16),
+        "eflags": data[:, 5].astype(np.uint32),
+        "origin": data[:, 6:9].astype(np.float32),
+        "velocity": data[:, 9:12].astype(np.float32),
+        "viewangles": data[:, 12:15].astype(np.float32),
+    }
+    if entity is not None:
+        ent = np.array(ent_rows, dtype=np.float64).reshape(-1, 4)
+        traj["entity_present"] = ent[:, 0].astype(bool)
+        traj["entity_origin"] = ent[:, 1:4].astype(np.float32)
+    traj["mapname"] = np.array(parser.serverinfo.get("mapname", ""))
+    traj["client_num"] = np.array(parser.client_num)
+    return traj
+
+
+def metrics(traj: dict) -> dict:
+    """Scalar summaries of a trajectory, usable in --expect / EXPECT lines.
+
+    Time spent with a condition is summed over snapshot intervals, attributing
+    each interval to the state at its start.
+    """
+    t = traj["server_time"].astype(np.int64)
+    n = len(t)
+    out = {"frames": n, "duration_s": (t[-1] - t[0]) / 1000.0 if n else 0.0}
+    if n == 0:
+        return out
+    dt = np.append(np.diff(t), 0)  # ms, summed exactly before scaling
+    origin = traj["origin"].astype(np.float64)
+    vel = traj["velocity"].astype(np.float64)
+    speed_xy = np.hypot(vel[:, 0], vel[:, 1])
+    steps = np.linalg.norm(np.diff(origin[:, :2], axis=0), axis=1)
+    rise = origin[:, 2] - origin[0, 2]
+    airborne = traj["ground_entity"] == ENTITYNUM_NONE
+
+    out.update({
+        "max_speed": float(speed_xy.max()),
+        "mean_speed": float(speed_xy.mean()),
+        "max_vz": float(vel[:, 2].max()),
+        "min_vz": float(vel[:, 2].min()),
+        "max_rise": float(rise.max()),
+        "min_rise": float(rise.min()),
+        "distance": float(steps.sum()),
+        "displacement": float(np.hypot(*(origin[-1, :2] - origin[0, :2]))),
+        "airborne_s": dt[airborne].sum() / 1000.0,
+        "landings": int(np.count_nonzero(airborne[:-1] & ~airborne[1:])),
+    })
+    flags = traj["pm_flags"].astype(np.int64)
+    for name, bit in PMF_FLAGS.items():
+        on = (flags & bit) != 0
+        out[f"{name}_s"] = dt[on].sum() / 1000.0
+        out[f"{name}_count"] = int(np.count_nonzero(on[1:] & ~on[:-1]) + on[0])
+    return out
+
+
+_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+        "==": operator.eq, "!=": operator.ne}
+EXPECT_RE = re.compile(r"^\s*([a-z_][a-z0-9_]*)\s*(<=|>=|==|!=|<|>)\s*(-?[0-9.]+)\s*$")
+
+
+def check_expectation(expr: str, values: dict):
+    """Evaluate 'metric op number'. Returns (ok, description)."""
+    m = EXPECT_RE.match(expr)
+    if not m:
+        raise ValueError(f"cannot parse expectation: {expr!r} (use 'metric op number')")
+    name, op, target = m.group(1), m.group(2), float(m.group(3))
+    if name not in values:
+        raise ValueError(f"unknown metric {name!r} (see --metrics)")
+    actual = values[name]
+    return _OPS[op](actual, target), f"{name} = {actual:g} (expected {op} {target:g})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse an ioquake3 demo into movement arrays")
+    parser.add_argument("demo", help="Demo file (.dm_68 / .dm_71)")
+    parser.add_argument("--npz", help="Write the trajectory arrays to this .npz file")
+    parser.add_argument("--entity", type=int, help="Also extract pos.trBase of this entity number")
+    parser.add_argument("--expect", action="append", default=[], metavar="EXPR",
+                        help="Assertion 'metric op number', e.g. 'max_rise > 40' (repeatable)")
+    parser.add_argument("--metrics", action="store_true", help="Print every metric")
+    args = parser.parse_args()
+
+    try:
+        traj = load_trajectory(args.demo, args.entity)
+    except (OSError, DemoError) as e:
+        print(f"ERROR: {args.demo}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    values = metrics(traj)
+    print(f"{args.demo}: map {traj['mapname']}, client {traj['client_num']}, "
+          f"{values['frames']} frames over {values['duration_s']:.1f}s")
+    if values["frames"]:
+        print(f"  max speed {values['max_speed']:.0f} ups, rise {values['min_rise']:+.0f}..{values['max_rise']:+.0f}, "
+              f"path {values['distance']:.0f} units, airborne {values['airborne_s']:.1f}s")
+    if args.metrics:
+        for name in sorted(values):
+            print(f"  {name:<22s} {values[name]:g}")
+    if args.npz:
+        np.savez_compressed(args.npz, **traj)
+        print(f"  wrote {args.npz}")
+
+    failed = 0
+    for expr in args.expect:
+        try:
+            ok, desc = check_expectation(expr, values)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+        print(f"  {'PASS' if ok else 'FAIL'}: {desc}")
+        failed += not ok
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Frame-diff regression checker for visual test recordings.
+
+For each recorded test, grabs the video frame at every NOTE timestamp in the
+test log and compares it against a stored golden frame. Frames are decoded
+by ffmpeg as downscaled grayscale rawvideo and read one at a time from a
+pipe, so a recording is never held in memory.
+
+Usage:
+    python3 tools/frame_diff.py                       # check every recording
+    python3 tools/frame_diff.py parkour_basic         # check one test
+    python3 tools/frame_diff.py --update parkour_basic  # (re)write goldens
+    python3 tools/frame_diff.py --metric mae --threshold 0.08
+
+Inputs (written by tools/visual_test.sh):
+    tests/recordings/<test>.mp4
+    tests/recordings/<test>.log   ([HH:MM:SS] RECORD: started / NOTE: ... lines)
+
+Goldens:
+    tests/recordings/golden/<test>/<NN>.npy   (uint8 grayscale, one per NOTE)
+
+Requires: ffmpeg, numpy
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+RECORDINGS_DIR = os.path.join(PROJECT_DIR, "tests", "recordings")
+GOLDEN_DIR = os.path.join(RECORDINGS_DIR, "golden")
+
+# Comparison resolution. 160x120 keeps HUD/geometry layout while washing out
+# x264 noise and software-GL dithering.
+FRAME_W = 160
+FRAME_H = 120
+DECODE_FPS = 4
+
+# Default regression thresholds per metric
+THRESHOLDS = {
+    "ssim": 0.80,   # flag if SSIM drops below
+    "mae": 0.10,    # flag if mean absolute error (0..1) rises above
+}
+
+LOG_LINE = re.compile(r"^\[(\d\d):(\d\d):(\d\d)\] (RECORD|NOTE): (.*)$")
+STARTED_LINE = re.compile(r"^Started: \d{4}-\d\d-\d\d (\d\d):(\d\d):(\d\d)$")
+
+
+def parse_test_log(path: str):
+    """Return (notes, has_record_marker) where notes is [(offset_s, text), ...].
+
+    Offsets are seconds from the RECORD marker. Older logs without it fall
+    back to the 'Started:' header, which precedes client spawn and so skews
+    offsets late; those logs are reported as such.
+    """
+    t0 = None
+    has_marker = False
+    raw_notes = []
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = LOG_LINE.match(line)
+            if m:
+                secs = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+                if m.group(4) == "RECORD":
+                    t0 = secs
+                    has_marker = True
+                else:
+                    raw_notes.append((secs, m.group(5)))
+                continue
+            m = STARTED_LINE.match(line)
+            if m and t0 is None:
+                t0 = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+
+    if t0 is None:
+        return [], False
+    notes = []
+    for secs, text in raw_notes:
+        offset = (secs - t0) % 86400  # tolerate a test running across midnight
+        notes.append((float(offset), text))
+    return notes, has_marker
+
+
+def iter_frames(video: str, fps: int = DECODE_FPS, width: int = FRAME_W, height: int = FRAME_H):
+    """Yield (timestamp_s, frame) pairs, frame being a (height, width) uint8 array.
+
+    ffmpeg resamples to a fixed fps and scales down before handing frames
+    over the pipe; only one frame buffer is alive at a time.
+    """
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", video,
+        "-vf", f"fps={fps},scale={width}:{height}:flags=area,format=gray",
+        "-f", "rawvideo", "-",
+    ]
+    frame_bytes = width * height
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=frame_bytes * 4)
+    try:
+        index = 0
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield index / fps, np.frombuffer(buf, dtype=np.uint8).reshape(height, width)
+            index += 1
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def frames_at(video: str, times: list) -> list:
+    """Pick the decoded frame nearest each requested time in a single pass.
+
+    Times past the end of the video get the last frame. Returns a list
+    aligned with `times`.
+    """
+    if not times:
+        return []
+    order = sorted(range(len(times)), key=lambda i: times[i])
+    picked = [None] * len(times)
+    half_step = 0.5 / DECODE_FPS
+    k = 0
+    last = None
+    for ts, frame in iter_frames(video):
+        last = frame
+        while k < len(order) and ts + half_step >= times[order[k]]:
+            picked[order[k]] = frame.copy()
+            k += 1
+        if k == len(order):
+            break
+    for i in order[k:]:
+        picked[i] = None if last is None else last.copy()
+    return picked
+
+
+def mae(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute error, normalized to 0..1."""
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean() / 255.0)
+
+
+def ssim(a: np.ndarray, b: np.ndarray, block: int = 8) -> float:
+    """Mean SSIM over non-overlapping block x block windows.
+
+    Block statistics come from a reshape, so the whole image is scored in a
+    handful of vectorized operations.
+    """
+    h = (a.shape[0] // block) * block
+    w = (a.shape[1] // block) * block
+    x = a[:h, :w].astype(np.float64).reshape(h // block, block, w // block, block)
+    y = b[:h, :w].astype(np.float64).reshape(h // block, block, w // block, block)
+
+    mu_x = x.mean(axis=(1, 3))
+    mu_y = y.mean(axis=(1, 3))
+    var_x = x.var(axis=(1, 3))
+    var_y = y.var(axis=(1, 3))
+    cov = ((x - mu_x[:, None, :, None]) * (y - mu_y[:, None, :, None])).mean(axis=(1, 3))
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    num = (2 * mu_x * mu_y + c1) * (2 * cov + c2)
+    den = (mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2)
+    return float((num / den).mean())
+
+
+def is_regression(metric: str, score: float, threshold: float) -> bool:
+    if metric == "ssim":
+        return score < threshold
+    return score > threshold
+
+
+def golden_path(test_name: str, index: int) -> str:
+    return os.path.join(GOLDEN_DIR, test_name, f"{index:02d}.npy")
+
+
+def check_test(test_name: str, metric: str, threshold: float, update: bool) -> int:
+    """Check (or update) one test. Returns the number of regressed frames, -1 on error."""
+    video = os.path.join(RECORDINGS_DIR, f"{test_name}.mp4")
+    log_file = os.path.join(RECORDINGS_DIR, f"{test_name}.log")
+    if not os.path.exists(video) or not os.path.exists(log_file):
+        print(f"  {test_name}: missing {test_name}.mp4 or {test_name}.log", file=sys.stderr)
+        return -1
+
+    notes, has_marker = parse_test_log(log_file)
+    if not notes:
+        print(f"  {test_name}: no NOTE lines in log, nothing to compare")
+        return 0
+    if not has_marker:
+        print(f"  {test_name}: WARNING no RECORD marker, offsets taken from 'Started:'")
+
+    frames = frames_at(video, [t for t, _ in notes])
+    score_fn = ssim if metric == "ssim" else mae
+    failed = 0
+    for i, ((offset, text), frame) in enumerate(zip(notes, frames)):
+        path = golden_path(test_name, i)
+        if frame is None:
+            print(f"  [{i:02d}] t={offset:5.1f}s  NO FRAME  {text}")
+            failed += 1
+            continue
+        if update:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, frame)
+            print(f"  [{i:02d}] t={offset:5.1f}s  golden written  {text}")
+            continue
+        if not os.path.exists(path):
+            print(f"  [{i:02d}] t={offset:5.1f}s  NO GOLDEN  {text}")
+            continue
+        golden = np.load(path)
+        if golden.shape != frame.shape:
+            print(f"  [{i:02d}] t={offset:5.1f}s  SIZE MISMATCH {golden.shape} vs {frame.shape}")
+            failed += 1
+            continue
+        score = score_fn(frame, golden)
+        bad = is_regression(metric, score, threshold)
+        failed += bad
+        flag = "REGRESSION" if bad else "ok"
+        print(f"  [{i:02d}] t={offset:5.1f}s  {metric}={score:.3f}  {flag:<10}  {text}")
+
+    if update:
+        # Drop goldens left over from NOTEs that no longer exist
+        index = len(notes)
+        while os.path.exists(golden_path(test_name, index)):
+            os.remove(golden_path(test_name, index))
+            index += 1
+    return failed
+
+
+def recorded_tests() -> list:
+    if not os.path.isdir(RECORDINGS_DIR):
+        return []
+    return sorted(name[:-4] for name in os.listdir(RECORDINGS_DIR) if name.endswith(".mp4"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare test recordings against golden frames")
+    parser.add_argument("tests", nargs="*", help="Test names (default: every tests/recordings/*.mp4)")
+    parser.add_argument("--metric", choices=sorted(THRESHOLDS), default="ssim",
+                        help="Comparison metric (default: ssim)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Regression threshold (default: ssim<0.80, mae>0.10)")
+    parser.add_argument("--update", action="store_true", help="Write current frames as goldens")
+    args = parser.parse_args()
+
+    threshold = args.threshold if args.threshold is not None else THRESHOLDS[args.metric]
+    tests = args.tests or recorded_tests()
+    if not tests:
+        print(f"No recordings in {RECORDINGS_DIR}/", file=sys.stderr)
+        sys.exit(1)
+
+    regressed = []
+    errors = []
+    for name in tests:
+        print(f"{name}:")
+        result = check_test(name, args.metric, threshold, args.update)
+        if result < 0:
+            errors.append(name)
+        elif result > 0:
+            regressed.append(name)
+
+    if args.update:
+        print(f"Goldens updated for {len(tests) - len(errors)} test(s)")
+    else:
+        print(f"{len(tests)} test(s) checked, {len(regressed)} regressed, {len(errors)} error(s)")
+    if regressed or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -449,9 +449,30 @@ def generate_map():
 
 
 if __name__ == "__main__":
+    import argparse
     import os
-
-    map_content = generate_map()
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate maps/qfcity1.map")
+    parser.add_argument("--validate", action="store_true",
+                        help="Check entity placement against the brushes after writing (needs numpy)")
+    parser.add_argument("--optimize-spawns", action="store_true",
+                        help="Re-place the deathmatch spawns with tools/spawn_optimizer.py (needs numpy)")
+    parser.add_argument("--profile", nargs="?", const="/tmp/generate_city_map.pstats", metavar="FILE",
+                        help="Run generate_map() under cProfile, dump pstats to FILE "
+                             "(default /tmp/generate_city_map.pstats) and print the top functions")
+    args = parser.parse_args()
+
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        map_content = profiler.runcall(generate_map)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(15)
+        print(f"Profile written to {args.profile}")
+    else:
+        map_content = generate_map()
 
     # Write to maps directory
     out_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "maps")
@@ -468,3 +489,20 @@ if __name__ == "__main__":
     print(f"  Brushes: {brush_count}")
     print(f"  Entities: {entity_count}")
     print(f"  File size: {len(map_content)} bytes")
+
+    if args.optimize_spawns:
+        from spawn_optimizer import optimize_file
+        if optimize_file(out_path, out=out_path):
+            sys.exit(1)
+
+    try:
+        from map_binary import write_for_map
+    except ImportError:
+        print("  Binary map: skipped (needs numpy)")
+    else:
+        print(f"  Binary map: {write_for_map(out_path)}")
+
+    if args.validate:
+        from validate_entities import check_file
+        if check_file(out_path):
+            sys.exit(1)
@@ -15,6 +15,13 @@ Sections connected by corridors:
 9. Tuning Arena — open room for isolated parameter testing
 
 Q3 coordinate system: 1 unit ~= 1 inch. Player is 56 units tall, 30 units wide.
+
+With --seed the fixed course is replaced by randomized variants: sections
+sampled by tools/parkour_variants.py, checked against an analytic movement
+model and written to maps/parkour_variants/ with a manifest.json:
+
+    python3 tools/generate_parkour_map.py --seed 1 --count 100 --difficulty 0.7
+    python3 tools/generate_parkour_map.py --seed 1 --set double_jump_velocity=220
 """
 
 import math
@@ -126,6 +133,34 @@ def corridor(x1, y1, x2, y2, z_floor=0, z_ceil=256, direction='y'):
     return brushes
 
 
+def skybox(min_x, min_y, max_x, max_y, z_min=-FLOOR_T - 64):
+    """Sky ceiling, four sky walls and a sky floor enclosing the given extents.
+
+    The walls reach down to z_min; the sky floor sits just below it.
+    """
+    sky_t = 64
+    brushes = []
+    # Ceiling
+    brushes.append(brush_box(min_x - sky_t, min_y - sky_t, SKYBOX_H,
+        max_x + sky_t, max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
+    # South
+    brushes.append(brush_box(min_x - sky_t, min_y - sky_t, z_min,
+        max_x + sky_t, min_y, SKYBOX_H + sky_t, TEX_SKY))
+    # North
+    brushes.append(brush_box(min_x - sky_t, max_y, z_min,
+        max_x + sky_t, max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
+    # West
+    brushes.append(brush_box(min_x - sky_t, min_y - sky_t, z_min,
+        min_x, max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
+    # East
+    brushes.append(brush_box(max_x, min_y - sky_t, z_min,
+        max_x + sky_t, max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
+    # Bottom (below all pits)
+    brushes.append(brush_box(min_x - sky_t, min_y - sky_t, z_min - sky_t,
+        max_x + sky_t, max_y + sky_t, z_min, TEX_SKY))
+    return brushes
+
+
 def generate_map():
     brushes = []
     entities = []
@@ -588,26 +623,7 @@ def generate_map():
     map_max_x = arena_w//2 + 256
     map_min_y = -256 - 256
     map_max_y = cy + 1024 + 256
-    sky_t = 64
-
-    # Ceiling
-    brushes.append(brush_box(map_min_x - sky_t, map_min_y - sky_t, SKYBOX_H,
-        map_max_x + sky_t, map_max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
-    # South
-    brushes.append(brush_box(map_min_x - sky_t, map_min_y - sky_t, -FLOOR_T - 64,
-        map_max_x + sky_t, map_min_y, SKYBOX_H + sky_t, TEX_SKY))
-    # North
-    brushes.append(brush_box(map_min_x - sky_t, map_max_y, -FLOOR_T - 64,
-        map_max_x + sky_t, map_max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
-    # West
-    brushes.append(brush_box(map_min_x - sky_t, map_min_y - sky_t, -FLOOR_T - 64,
-        map_min_x, map_max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
-    # East
-    brushes.append(brush_box(map_max_x, map_min_y - sky_t, -FLOOR_T - 64,
-        map_max_x + sky_t, map_max_y + sky_t, SKYBOX_H + sky_t, TEX_SKY))
-    # Bottom (below all pits)
-    brushes.append(brush_box(map_min_x - sky_t, map_min_y - sky_t, -FLOOR_T - 128,
-        map_max_x + sky_t, map_max_y + sky_t, -FLOOR_T - 64, TEX_SKY))
+    brushes.extend(skybox(map_min_x, map_min_y, map_max_x, map_max_y))
 
     # =========================================================
     # ASSEMBLE MAP FILE
@@ -621,8 +637,56 @@ def generate_map():
 
 
 if __name__ == "__main__":
+    import argparse
     import os
-    map_content = generate_map()
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate maps/parkour1.map")
+    parser.add_argument("--validate", action="store_true",
+                        help="Check entity placement against the brushes after writing (needs numpy)")
+    parser.add_argument("--profile", nargs="?", const="/tmp/generate_parkour_map.pstats", metavar="FILE",
+                        help="Run generate_map() under cProfile, dump pstats to FILE "
+                             "(default /tmp/generate_parkour_map.pstats) and print the top functions")
+    parser.add_argument("--seed", type=int,
+                        help="Write randomized course variants starting at this seed instead of parkour1")
+    parser.add_argument("--count", type=int, default=1, help="Variants to write, seeds SEED.. (default 1)")
+    parser.add_argument("--difficulty", type=float, default=0.5,
+                        help="Variant difficulty from 0 (easy) to 1 (hard) (default 0.5)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a movement model parameter for the variant checks, repeatable")
+    parser.add_argument("--out-dir", help="Variant output directory (default maps/parkour_variants)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        from parkour_variants import MOVEMENT, Movement, write_variants
+        if not 0 <= args.difficulty <= 1:
+            parser.error("--difficulty must be between 0 and 1")
+        if args.count < 1:
+            parser.error("--count must be at least 1")
+        params = dict(MOVEMENT)
+        for item in args.set:
+            name, _, value = item.partition("=")
+            if name not in MOVEMENT:
+                parser.error(f"--set: unknown parameter {name!r} (one of {', '.join(MOVEMENT)})")
+            try:
+                params[name] = float(value)
+            except ValueError:
+                parser.error(f"--set: {item!r} is not NAME=NUMBER")
+        out_dir = args.out_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               "maps", "parkour_variants")
+        sys.exit(write_variants(args.seed, args.count, args.difficulty, Movement(params), out_dir,
+                                args.validate))
+
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        map_content = profiler.runcall(generate_map)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(15)
+        print(f"Profile written to {args.profile}")
+    else:
+        map_content = generate_map()
     out_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
                             "maps", "parkour1.map")
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
@@ -630,3 +694,15 @@ if __name__ == "__main__":
         f.write(map_content)
     print(f"Generated {out_path}")
     print(f"Compile with: tools/compile_map.sh maps/parkour1.map")
+
+    try:
+        from map_binary import write_for_map
+    except ImportError:
+        print("  Binary map: skipped (needs numpy)")
+    else:
+        print(f"  Binary map: {write_for_map(out_path)}")
+
+    if args.validate:
+        from validate_entities import check_file
+        if check_file(out_path):
+            sys.exit(1)
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Estimate lightmap brightness on walkable floors before running q3map2 -light.
+
+Sample points are laid on a grid over the visible tops of axial brushes
+(caulk, sky and tool textures excluded; points covered by another brush
+dropped). Each `light` entity adds q3map2's point-light term
+
+    value = intensity * 7500 * cos(angle) / distance^2      (distance >= 16)
+
+tinted by _color, plus worldspawn _ambient/_minlight. Occlusion is coarse:
+a segment from sample to light that passes through a solid brush's bounding
+box is blocked, which is exact for the axial building walls our generators
+emit. Spotlight cones, bounce and surface lights are ignored, so treat the
+numbers as relative, not as the final lightmap.
+
+Prints under-lit zones (connected runs of grid cells below --threshold on
+the same floor height) and writes a top-down heatmap PNG of the lowest
+walkable level in each cell.
+
+Usage:
+    python3 tools/light_preview.py maps/qfcity1.map
+    python3 tools/light_preview.py maps/qfcity1.map --cell 32 --threshold 60 --png /tmp/city.png
+
+Requires: numpy
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from map_parser import BrushIndex, load_map
+from validate_entities import NONSOLID_TEXTURES, solid_brushes
+
+POINT_SCALE = 7500.0        # q3map2 pointScale
+MIN_DISTANCE = 16.0         # q3map2 clamps point-light distance here
+DEFAULT_INTENSITY = 300.0
+SAMPLE_LIFT = 1.0           # sample this far above the surface
+MIN_FLOOR_WIDTH = 32.0      # narrower tops (wall caps, trim) are not floors
+TILE_SIZE = 512.0           # occlusion work is batched per tile of samples
+BATCH_PAIRS = 1 << 18       # segment x box pairs per slab test, bounds peak memory
+UNLIT_TEXTURES = NONSOLID_TEXTURES | {"common/caulk", "common/nodraw", "common/clip",
+                                      "common/playerclip", "common/weapclip"}
+
+
+def parse_color(value: str) -> np.ndarray:
+    try:
+        rgb = np.array([float(v) for v in value.split()[:3]])
+    except ValueError:
+        return np.ones(3)
+    if len(rgb) != 3 or rgb.max() <= 0:
+        return np.ones(3)
+    return rgb / rgb.max()
+
+
+def light_sources(m):
+    """(origins (n, 3), intensities (n,), colors (n, 3)) of point lights."""
+    origins, intensities, colors = [], [], []
+    for e in m.point_entities():
+        keys = m.entities[e]
+        if keys.get("classname") != "light":
+            continue
+        try:
+            intensity = float(keys.get("light", keys.get("_light", DEFAULT_INTENSITY)))
+        except ValueError:
+            intensity = DEFAULT_INTENSITY
+        origins.append(m.entity_origins[e])
+        intensities.append(intensity)
+        colors.append(parse_color(keys.get("_color", "1 1 1")))
+    return (np.array(origins).reshape(-1, 3), np.array(intensities),
+            np.array(colors).reshape(-1, 3))
+
+
+def ambient_level(m) -> float:
+    world = next((k for k in m.entities if k.get("classname") == "worldspawn"), {})
+    level = 0.0
+    for key in ("_ambient", "ambient", "_minlight"):
+        try:
+            level = max(level, float(world.get(key, 0)))
+        except ValueError:
+            pass
+    return level
+
+
+def floor_samples(m, solid: np.ndarray, cell: float) -> np.ndarray:
+    """Grid points (n, 3) just above visible, upward-facing brush tops."""
+    up = m.plane_normals[:, 2] > 1 - 1e-6
+    lit = np.array([t not in UNLIT_TEXTURES and not t.startswith("skies/") for t in m.textures],
+                   dtype=bool)
+    plane_brush = np.repeat(np.arange(m.brush_count), np.diff(m.brush_plane_start))
+    top_planes = np.nonzero(up & lit[m.plane_texture])[0]
+    is_solid = np.zeros(m.brush_count, dtype=bool)
+    is_solid[solid] = True
+    brushes = np.unique(plane_brush[top_planes[is_solid[plane_brush[top_planes]]]])
+
+    chunks = []
+    for b in brushes:
+        lo, hi = m.brush_mins[b], m.brush_maxs[b]
+        if not (np.all(np.isfinite(lo)) and np.all(np.isfinite(hi))):
+            continue
+        if min(hi[0] - lo[0], hi[1] - lo[1]) < MIN_FLOOR_WIDTH:
+            continue
+        xs = np.arange(np.ceil(lo[0] / cell - 0.5), np.floor(hi[0] / cell - 0.5) + 1) * cell + cell / 2
+        ys = np.arange(np.ceil(lo[1] / cell - 0.5), np.floor(hi[1] / cell - 0.5) + 1) * cell + cell / 2
+        if not len(xs) or not len(ys):
+            continue
+        gx, gy = np.meshgrid(xs, ys, indexing="ij")
+        chunks.append(np.column_stack([gx.ravel(), gy.ravel(),
+                                       np.full(gx.size, hi[2] + SAMPLE_LIFT)]))
+    if not chunks:
+        return np.zeros((0, 3))
+    points = np.concatenate(chunks)
+
+    # Drop points buried under walls standing on the floor. Points are sorted
+    # by x so each brush only tests the slice inside its x extent.
+    points = points[np.argsort(points[:, 0], kind="stable")]
+    xs = points[:, 0]
+    keep = np.ones(len(points), dtype=bool)
+    for b in solid:
+        lo, hi = m.brush_mins[b], m.brush_maxs[b]
+        start, stop = np.searchsorted(xs, [lo[0], hi[0]], side="left")
+        if start == stop:
+            continue
+        p = points[start:stop]
+        cand = np.nonzero(np.all((p > lo) & (p < hi), axis=1))[0]
+        if len(cand):
+            inside = m.points_inside(int(b), p[cand], epsilon=0.01)
+            keep[start + cand[inside]] = False
+    return points[keep]
+
+
+def _segment_hits(points: np.ndarray, light: np.ndarray, mins: np.ndarray, maxs: np.ndarray,
+                  eps: float = 1e-4) -> np.ndarray:
+    """(n, m) bool: which point->light segments cross which boxes (slab test).
+
+    mins/maxs are (m, 3), or (n, m, 3) for a different box set per segment.
+    """
+    d = light[None, :] - points
+    d = np.where(np.abs(d) < 1e-9, 1e-9, d)
+    inv = 1.0 / d
+    t1 = (mins - points[:, None, :]) * inv[:, None, :]
+    t2 = (maxs - points[:, None, :]) * inv[:, None, :]
+    t_near = np.minimum(t1, t2).max(axis=2)
+    t_far = np.maximum(t1, t2).min(axis=2)
+    return (t_far > np.maximum(t_near, eps)) & (t_near < 1 - eps)
+
+
+def _segments_blocked(points: np.ndarray, light: np.ndarray, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+    """Which point->light segments cross any of the boxes, BATCH_PAIRS at a time."""
+    blocked = np.zeros(len(points), dtype=bool)
+    if not len(mins):
+        return blocked
+    step = max(1, BATCH_PAIRS // len(mins))
+    for i in range(0, len(points), step):
+        blocked[i:i + step] = _segment_hits(points[i:i + step], light, mins, maxs).any(axis=1)
+    return blocked
+
+
+class Occluders:
+    """Batched line-of-sight tests from one eye point to a fixed point set.
+
+    The points are grouped into TILE_SIZE squares. A segment from anywhere
+    in a tile to the eye stays within the tile's half extent of the segment
+    from the tile's center, so each tile is tested only against the solid
+    boxes that center segment hits once they are grown by that much. Boxes
+    are shrunk by `shrink` so points resting on a face are not
+    self-shadowed.
+    """
+
+    def __init__(self, mins: np.ndarray, maxs: np.ndarray, points: np.ndarray,
+                 shrink: float = 0.5, tile_size: float = TILE_SIZE):
+        mins = np.asarray(mins) + shrink
+        maxs = np.asarray(maxs) - shrink
+        finite = np.all(np.isfinite(mins) & np.isfinite(maxs), axis=1)
+        self.mins, self.maxs = mins[finite], maxs[finite]
+        self.index = BrushIndex(self.mins, self.maxs)
+        self.points = points
+        tiles = np.floor(points[:, :2] / tile_size).astype(np.int64)
+        tile_keys, tile_of = np.unique(tiles, axis=0, return_inverse=True)
+        tile_of = tile_of.ravel()
+        self.order = np.argsort(tile_of, kind="stable")
+        self.bounds = np.searchsorted(tile_of[self.order], np.arange(len(tile_keys) + 1))
+        starts = self.bounds[:-1]
+        if len(points):
+            tile_min = np.minimum.reduceat(points[self.order], starts)
+            tile_max = np.maximum.reduceat(points[self.order], starts)
+        else:
+            tile_min = tile_max = np.zeros((0, 3))
+        self.tile_center = (tile_min + tile_max) * 0.5
+        # One unit of slack keeps the cull conservative against rounding
+        self.tile_half = (tile_max - tile_min) * 0.5 + 1.0
+
+    def blocked(self, eye, mask=None) -> np.ndarray:
+        """bool (n,): segment point -> eye crosses a box. Only points where
+        `mask` is True are tested; the rest come back False."""
+        eye = np.asarray(eye, dtype=np.float64)
+        result = np.zeros(len(self.points), dtype=bool)
+        active = self.points if mask is None else self.points[mask]
+        if not len(active):
+            return result
+        boxes = self.index.query_box(np.minimum(active.min(axis=0), eye),
+                                     np.maximum(active.max(axis=0), eye))
+        if not len(boxes):
+            return result
+        box_min, box_max = self.mins[boxes], self.maxs[boxes]
+        tiles = np.arange(len(self.bounds) - 1)
+        if mask is not None:
+            tiles = tiles[np.logical_or.reduceat(mask[self.order], self.bounds[:-1])]
+        step = max(1, BATCH_PAIRS // len(boxes))
+        for i in range(0, len(tiles), step):
+            chunk = tiles[i:i + step]
+            half = self.tile_half[chunk][:, None, :]
+            near = _segment_hits(self.tile_center[chunk], eye, box_min - half, box_max + half, eps=0.0)
+            for t, hits in zip(chunk, near):
+                if not hits.any():
+                    continue
+                idx = self.order[self.bounds[t]:self.bounds[t + 1]]
+                if mask is not None:
+                    idx = idx[mask[idx]]
+                result[idx] = _segments_blocked(self.points[idx], eye, box_min[hits], box_max[hits])
+        return result
+
+
+def estimate(m, points: np.ndarray, solid: np.ndarray, occlusion: bool = True) -> np.ndarray:
+    """Estimated light value (n,) at each sample point (brightest channel)."""
+    origins, intensities, colors = light_sources(m)
+    total = np.full((len(points), 3), ambient_level(m))
+    if not len(points) or not len(origins):
+        return total.max(axis=1)
+
+    occluders = Occluders(m.brush_mins[solid], m.brush_maxs[solid], points) if occlusion else None
+    for light, intensity, color in zip(origins, intensities, colors):
+        delta = light[None, :] - points
+        dist = np.maximum(np.linalg.norm(delta, axis=1), MIN_DISTANCE)
+        cos = np.clip(delta[:, 2] / dist, 0.0, 1.0)
+        value = intensity * POINT_SCALE * cos / dist ** 2
+        lit = value > 0.5
+        if occluders is not None:
+            lit &= ~occluders.blocked(light, lit)
+        total[lit] += value[lit, None] * color[None, :]
+    return total.max(axis=1)
+
+
+def dark_zones(points: np.ndarray, values: np.ndarray, cell: float, threshold: float,
+               min_cells: int = 2, region: float = 1024.0) -> list:
+    """Connected groups of under-lit cells on the same floor height.
+
+    Zones do not grow across `region`-sized squares, so a dark street
+    network is reported block by block instead of as one zone.
+    """
+    dark = values < threshold
+    cells = {}
+    per_region = max(1, int(round(region / cell)))
+    for i in np.nonzero(dark)[0]:
+        x, y, z = points[i]
+        cells[(int(np.floor(x / cell)), int(np.floor(y / cell)), round(float(z)))] = i
+    zones, seen = [], set()
+    for start in cells:
+        if start in seen:
+            continue
+        seen.add(start)
+        stack, members = [start], []
+        while stack:
+            cx, cy, cz = stack.pop()
+            members.append(cells[(cx, cy, cz)])
+            for nx, ny in ((cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)):
+                key = (nx, ny, cz)
+                if nx // per_region != cx // per_region or ny // per_region != cy // per_region:
+                    continue
+                if key in cells and key not in seen:
+                    seen.add(key)
+                    stack.append(key)
+        if len(members) < min_cells:
+            continue
+        p = points[members]
+        zones.append({
+            "cells": len(members),
+            "area": len(members) * cell * cell,
+            "mins": p.min(axis=0) - [cell / 2, cell / 2, 0],
+            "maxs": p.max(axis=0) + [cell / 2, cell / 2, 0],
+            "z": float(p[0, 2] - SAMPLE_LIFT),
+            "mean": float(values[members].mean()),
+            "min": float(values[members].min()),
+        })
+    zones.sort(key=lambda z: -z["cells"])
+    return zones
+
+
+def _heat_color(t: np.ndarray) -> np.ndarray:
+    """0..1 -> black, blue, red, yellow, white."""
+    stops = np.array([[0, 0, 0], [30, 30, 160], [200, 40, 40], [240, 220, 40], [255, 255, 255]], dtype=float)
+    pos = np.clip(t, 0, 1) * (len(stops) - 1)
+    i = np.minimum(pos.astype(int), len(stops) - 2)
+    f = (pos - i)[..., None]
+    return (stops[i] * (1 - f) + stops[i + 1] * f).astype(np.uint8)
+
+
+def write_png(path: str, rgb: np.ndarray) -> None:
+    """Minimal RGB8 PNG writer (no image library needed)."""
+    h, w, _ = rgb.shape
+    raw = b"".join(b"\0" + rgb[row].tobytes() for row in range(h))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def heatmap(points: np.ndarray, values: np.ndarray, cell: float, threshold: float,
+            scale: int = 4) -> np.ndarray:
+    """Top-down RGB image, +Y up, of the lowest sample in each cell.
+
+    Color runs from black (0) to white (4x threshold); cells with no
+    walkable surface are dark grey.
+    """
+    ix = np.floor(points[:, 0] / cell).astype(int)
+    iy = np.floor(points[:, 1] / cell).astype(int)
+    ix -= ix.min()
+    iy -= iy.min()
+    w, h = ix.max() + 1, iy.max() + 1
+    # Highest z first, so the lowest sample per cell is written last and wins
+    order = np.argsort(-points[:, 2], kind="stable")
+    grid = np.full((h, w), np.nan)
+    grid[iy[order], ix[order]] = values[order]
+    rgb = _heat_color(np.nan_to_num(grid / (4 * threshold)))
+    rgb[np.isnan(grid)] = (48, 48, 48)
+    rgb = rgb[::-1]
+    return np.repeat(np.repeat(rgb, scale, axis=0), scale, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate floor lighting from light entities")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--cell", type=float, default=64.0, help="Sample spacing in units (default 64)")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="Under-lit below this estimated lightmap value, 0-255 (default 20)")
+    parser.add_argument("--min-zone", type=int, default=4, help="Smallest zone to report, in cells (default 4)")
+    parser.add_argument("--region", type=float, default=1024.0,
+                        help="Zones are split at this grid spacing in units (default 1024)")
+    parser.add_argument("--png", help="Heatmap output (default /tmp/<map>_light.png)")
+    parser.add_argument("--no-occlusion", action="store_true", help="Ignore shadowing by brushes")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    m = load_map(args.map_file)
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    solid = solid_brushes(m)
+    points = floor_samples(m, solid, args.cell)
+    if not len(points):
+        print(f"{args.map_file}: no walkable surfaces found", file=sys.stderr)
+        sys.exit(1)
+    values = estimate(m, points, solid, occlusion=not args.no_occlusion)
+    zones = dark_zones(points, values, args.cell, args.threshold, args.min_zone, args.region)
+    t_est = time.perf_counter() - t0
+
+    n_lights = len(light_sources(m)[0])
+    dark = values < args.threshold
+    print(f"{args.map_file}: {n_lights} lights, {len(points)} samples at {args.cell:.0f} units")
+    print(f"  light value: min {values.min():.0f}, median {np.median(values):.0f}, max {values.max():.0f}")
+    print(f"  under-lit (< {args.threshold:.0f}): {dark.sum()} samples "
+          f"({dark.mean() * 100:.1f}%) in {len(zones)} zone(s) of {args.min_zone}+ cells")
+    for z in zones[:20]:
+        lo, hi = z["mins"], z["maxs"]
+        print(f"    z={z['z']:<6.0f} x [{lo[0]:.0f}, {hi[0]:.0f}] y [{lo[1]:.0f}, {hi[1]:.0f}]  "
+              f"{z['area'] / 1e4:7.1f}k units^2  mean {z['mean']:5.1f}  min {z['min']:5.1f}")
+    if len(zones) > 20:
+        print(f"    ... {len(zones) - 20} more")
+
+    png = args.png or os.path.join("/tmp", os.path.splitext(os.path.basename(args.map_file))[0] + "_light.png")
+    write_png(png, heatmap(points, values, args.cell, args.threshold))
+    print(f"  heatmap: {png}")
+    print(f"  [load {t_load:.3f}s, estimate {t_est:.3f}s]")
+
+
+if __name__ == "__main__":
+    main()
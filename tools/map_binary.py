@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Binary companion format for .map files: load generated geometry without parsing.
+
+A binary map is an uncompressed .npz holding the MapData arrays from
+tools/map_parser.py: brush and plane arrays, texture IDs and the entity
+key/values, plus the precomputed plane normals and brush bounds. Every
+member is stored, not deflated, so each array sits contiguously in the
+file and load_binary() memory-maps it in place: opening a 100k-brush map
+costs a directory read, not a tokenizer pass over megabytes of text. Plain
+np.load() reads it too.
+
+Strings are kept as one UTF-8 blob per table (`texture_text`, `kv_text`,
+NUL-separated) so the file stays pure NumPy. The source .map's size and
+SHA-1 are recorded; load_map() in map_parser.py uses a current
+`<name>.map.npz` next to a .map instead of parsing it.
+
+format_map() turns a MapData back into .map text. Numbers are written
+with the generators' precision (%.3f points, %.8f texture parameters)
+wherever that reproduces the stored value exactly, and with the shortest
+exact decimal otherwise, so .map -> binary -> .map -> parse gives back
+identical arrays. patchDef/brushDef blocks are not held by MapData, so
+maps containing them are refused rather than silently truncated.
+
+Usage:
+    python3 tools/map_binary.py maps/qfcity1.map                 # write maps/qfcity1.map.npz
+    python3 tools/map_binary.py maps/qfcity1.map.npz -o out.map  # back to .map text
+    python3 tools/map_binary.py maps/qfcity1.map --check         # verify the round trip
+
+Library use:
+    from map_binary import save_binary, load_binary, format_map
+
+    save_binary("maps/qfcity1.map.npz", load_map("maps/qfcity1.map"))
+    m = load_binary("maps/qfcity1.map.npz")   # arrays are read-only memmaps
+
+Requires: numpy
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+import zipfile
+from io import StringIO
+
+import numpy as np
+
+from map_parser import MapData, load_map
+
+BINARY_SUFFIX = ".map.npz"
+FORMAT_VERSION = 1
+
+# MapData attributes stored as-is
+ARRAYS = (
+    "entity_brush_start", "entity_origins", "brush_entity", "brush_plane_start",
+    "brush_mins", "brush_maxs", "plane_points", "plane_normals", "plane_dists",
+    "plane_texture", "plane_texparams", "plane_flags", "plane_has_flags",
+)
+
+
+def binary_path(map_file: str) -> str:
+    return os.path.splitext(map_file)[0] + BINARY_SUFFIX
+
+
+def file_stamp(path: str) -> np.ndarray:
+    """(size, SHA-1) of a file as the uint8 array stored in a binary map."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return np.frombuffer(len(data).to_bytes(8, "little") + hashlib.sha1(data).digest(), dtype=np.uint8)
+
+
+def _pack_strings(strings) -> np.ndarray:
+    return np.frombuffer("\0".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(blob: np.ndarray, count: int) -> list:
+    if count == 0:
+        return []
+    return bytes(blob).decode("utf-8").split("\0")
+
+
+def save_binary(path: str, m: MapData, source: str = None) -> int:
+    """Write m as a binary map; returns bytes written.
+
+    `source` is the .map the data came from; its stamp lets load_map()
+    tell whether the binary is still current.
+    """
+    if m.skipped_patches or m.skipped_brushdefs:
+        raise ValueError(f"map has {m.skipped_patches} patches and {m.skipped_brushdefs} brushDef blocks, "
+                         "which the binary format does not hold")
+    arrays = {name: np.ascontiguousarray(getattr(m, name)) for name in ARRAYS}
+    arrays["format_version"] = np.array([FORMAT_VERSION], dtype=np.int32)
+    arrays["texture_text"] = _pack_strings(m.textures)
+    arrays["texture_count"] = np.array([len(m.textures)], dtype=np.int32)
+    pairs = [s for keys in m.entities for kv in keys.items() for s in kv]
+    arrays["kv_text"] = _pack_strings(pairs)
+    arrays["entity_key_start"] = np.cumsum([0] + [len(keys) for keys in m.entities], dtype=np.int32)
+    arrays["source_stamp"] = file_stamp(source) if source else np.zeros(0, dtype=np.uint8)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)  # savez stores members uncompressed, which is what makes them mappable
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _mapped_members(path: str) -> dict:
+    """Memory-map every .npy member of an uncompressed .npz in place."""
+    arrays = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as f:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed, cannot map it")
+            # Local header: 30 fixed bytes, then name and extra field of their own lengths
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {name} holds Python objects")
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran else "C")
+    return arrays
+
+
+def load_binary(path: str, mmap: bool = True) -> MapData:
+    """Load a binary map. With mmap the big arrays are read-only views of the file."""
+    if mmap:
+        arrays = _mapped_members(path)
+    else:
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {name: z[name] for name in z.files}
+    version = int(arrays["format_version"][0]) if "format_version" in arrays else 0
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: binary map format {version}, expected {FORMAT_VERSION}")
+
+    m = MapData()
+    for name in ARRAYS:
+        setattr(m, name, arrays[name])
+    m.textures = _unpack_strings(arrays["texture_text"], int(arrays["texture_count"][0]))
+    key_start = arrays["entity_key_start"]
+    strings = _unpack_strings(arrays["kv_text"], int(key_start[-1]))
+    m.entities = []
+    for e in range(len(key_start) - 1):
+        pairs = strings[2 * key_start[e]:2 * key_start[e + 1]]
+        m.entities.append(dict(zip(pairs[0::2], pairs[1::2])))
+    return m
+
+
+def is_current(path: str, map_file: str) -> bool:
+    """True when the binary map at `path` was written from map_file as it is now."""
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            stamp = z["source_stamp"]
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return False
+    return len(stamp) > 0 and np.array_equal(stamp, file_stamp(map_file))
+
+
+def _exact_at(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Per row: every value is the double nearest some multiple of 10^-decimals.
+
+    Exactly those values survive printing with `decimals` places and
+    parsing back, so rows where this holds can use the fixed format.
+    """
+    scale = 10.0 ** decimals
+    return np.all(np.round(values * scale) / scale == values, axis=1)
+
+
+def _shortest(value: float, places: int) -> str:
+    text = f"{value:.{places}f}"
+    if float(text) == value:
+        return text
+    return np.format_float_positional(value, unique=True, trim="-")
+
+
+def format_map(m: MapData) -> str:
+    """.map text for m, in the layout of our generators' output."""
+    # Plain in-memory copies: tolist() on a memmap is several times slower
+    points = np.array(m.plane_points, dtype=np.float64).reshape(-1, 9)
+    params = np.array(m.plane_texparams, dtype=np.float64)
+    exact = _exact_at(points, 3) & _exact_at(params, 8)
+    points, params = points.tolist(), params.tolist()
+    flags = np.array(m.plane_flags).tolist()
+    has_flags = np.array(m.plane_has_flags).tolist()
+    names = [m.textures[t] for t in np.array(m.plane_texture).tolist()]
+
+    fixed = "\t\t( %.3f %.3f %.3f ) ( %.3f %.3f %.3f ) ( %.3f %.3f %.3f ) %s %.8f %.8f %.8f %.8f %.8f"
+    plane_lines = []
+    for i, fast in enumerate(exact.tolist()):
+        if fast:
+            line = fixed % (*points[i], names[i], *params[i])
+        else:
+            p = [_shortest(v, 3) for v in points[i]]
+            line = (f"\t\t( {p[0]} {p[1]} {p[2]} ) ( {p[3]} {p[4]} {p[5]} ) ( {p[6]} {p[7]} {p[8]} ) "
+                    f"{names[i]} {' '.join(_shortest(v, 8) for v in params[i])}")
+        if has_flags[i]:
+            line += " %d %d %d" % tuple(flags[i])
+        plane_lines.append(line)
+
+    plane_start = np.asarray(m.brush_plane_start)
+    brush_start = np.asarray(m.entity_brush_start)
+    lines = []
+    for e, keys in enumerate(m.entities):
+        lines.append(f"// entity {e}")
+        lines.append("{")
+        for k, v in keys.items():
+            lines.append(f'\t"{k}" "{v}"')
+        for n, b in enumerate(range(brush_start[e], brush_start[e + 1])):
+            lines.append(f"\n\t// brush {n}")
+            lines.append("\t{")
+            lines.extend(plane_lines[plane_start[b]:plane_start[b + 1]])
+            lines.append("\t}")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def same_map(a: MapData, b: MapData) -> bool:
+    """Entity keys, brushes, planes and textures identical (derived arrays included)."""
+    if a.entities != b.entities or a.textures != b.textures:
+        return False
+    return all(np.array_equal(getattr(a, name), getattr(b, name), equal_nan=name in
+                              ("entity_origins", "brush_mins", "brush_maxs")) for name in ARRAYS)
+
+
+def write_for_map(map_file: str) -> str:
+    """Parse map_file and write its binary companion next to it; returns the path."""
+    path = binary_path(map_file)
+    save_binary(path, load_map(map_file, use_binary=False), source=map_file)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between .map text and binary maps")
+    parser.add_argument("input", help=f".map file, or {BINARY_SUFFIX} binary map")
+    parser.add_argument("-o", "--output",
+                        help=f"Output path (default: <name>{BINARY_SUFFIX} for a .map; required for a binary input)")
+    parser.add_argument("--check", action="store_true",
+                        help="Verify .map -> binary -> .map reproduces the parsed map exactly")
+    args = parser.parse_args()
+
+    try:
+        if args.input.endswith(BINARY_SUFFIX):
+            if not args.output:
+                parser.error("converting a binary map back needs -o OUTPUT.map")
+            t0 = time.perf_counter()
+            m = load_binary(args.input)
+            t_load = time.perf_counter() - t0
+            with open(args.output, "w") as f:
+                f.write(format_map(m))
+            print(f"{args.input}: {m.brush_count} brushes, {len(m.entities)} entities "
+                  f"(loaded in {t_load * 1000:.1f}ms) -> {args.output}")
+            return
+
+        t0 = time.perf_counter()
+        m = load_map(args.input, use_binary=False)
+        t_parse = time.perf_counter() - t0
+        out = args.output or binary_path(args.input)
+        size = save_binary(out, m, source=args.input)
+        t0 = time.perf_counter()
+        loaded = load_binary(out)
+        t_load = time.perf_counter() - t0
+        print(f"{args.input}: {m.brush_count} brushes, {m.plane_count} planes, {len(m.entities)} entities")
+        print(f"  parse {t_parse * 1000:.1f}ms, binary load {t_load * 1000:.1f}ms")
+        print(f"  wrote {out} ({size} bytes, .map is {os.path.getsize(args.input)} bytes)")
+        if args.check:
+            again = load_map(StringIO(format_map(loaded)))
+            if not (same_map(m, loaded) and same_map(m, again)):
+                print("ERROR: round trip through the binary map changed the map", file=sys.stderr)
+                sys.exit(1)
+            print("  round trip OK")
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""Semantic diff of two .map files: brushes and entities, not plane text.
+
+Every brush gets a 64-bit content hash of its normalized planes (unit
+normal and distance, rounded, in any plane order), textures, texture
+parameters, content flags and owning entity class. A second, translation-
+invariant "shape" hash (distances relative to the brush's min corner, no
+texture shift) pairs removed brushes with added ones that are the same
+brush somewhere else, so they are reported as moved. Entities are matched
+on their keys, with and without "origin".
+
+Hashing is vectorized and matching uses dict buckets, so the diff is linear
+in the number of brushes; on 100k-brush maps the two loads dominate.
+
+Usage:
+    python3 tools/map_diff.py old.map maps/qfcity1.map
+    python3 tools/map_diff.py --rev HEAD maps/qfcity1.map          # against git
+    python3 tools/map_diff.py old.map new.map --cell 1024 --verbose
+
+Exit code is 0 when the maps are equivalent, 1 when they differ (like diff).
+
+Library use:
+    from map_diff import brush_hashes, structural_digest
+
+    if structural_digest(load_map(a)) != structural_digest(load_map(b)):
+        ...  # geometry changed, recompile
+
+Requires: numpy
+"""
+
+import argparse
+import hashlib
+import io
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from map_parser import load_map
+
+# Rounding before hashing: normals to 1e-4, distances and texture
+# parameters to 1/100 unit, so float noise from a regenerate does not count
+NORMAL_SCALE = 1e4
+DIST_SCALE = 100.0
+TEXPARAM_SCALE = 100.0
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer on a uint64 array (wraps on overflow)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _quantize(values: np.ndarray, scale: float) -> np.ndarray:
+    return np.round(values * scale).astype(np.int64).view(np.uint64)
+
+
+def _hash_columns(columns: list) -> np.ndarray:
+    h = np.zeros(len(columns[0]), dtype=np.uint64)
+    for col in columns:
+        h = _mix(h ^ col)
+    return h
+
+
+def _string_hash(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+
+
+def _names_hash(names: list) -> np.ndarray:
+    return np.array([_string_hash(s) for s in names], dtype=np.uint64)
+
+
+def brush_hashes(m, shape: bool = False) -> np.ndarray:
+    """uint64 hash per brush (n_brush,).
+
+    Plane order inside a brush does not matter: plane hashes are combined
+    with a wrapping sum. With shape=True distances are taken relative to the
+    brush's min corner and texture shifts are left out, so a brush and a
+    translated copy hash the same.
+    """
+    if not m.brush_count:
+        return np.zeros(0, dtype=np.uint64)
+    plane_brush = np.repeat(np.arange(m.brush_count), np.diff(m.brush_plane_start))
+    dists = m.plane_dists
+    params = m.plane_texparams
+    if shape:
+        ref = np.nan_to_num(m.brush_mins, nan=0.0, posinf=0.0, neginf=0.0)
+        dists = dists - np.einsum("ij,ij->i", m.plane_normals, ref[plane_brush])
+        params = params[:, 2:]
+    tex = _names_hash(m.textures)[m.plane_texture] if m.plane_count else np.zeros(0, dtype=np.uint64)
+    columns = [_quantize(m.plane_normals[:, i], NORMAL_SCALE) for i in range(3)]
+    columns.append(_quantize(dists, DIST_SCALE))
+    columns.append(tex)
+    columns += [_quantize(params[:, i], TEXPARAM_SCALE) for i in range(params.shape[1])]
+    columns += [m.plane_flags[:, i].astype(np.int64).view(np.uint64) for i in range(3)]
+    with np.errstate(over="ignore"):
+        plane_h = _hash_columns(columns)
+        brush_h = np.add.reduceat(plane_h, m.brush_plane_start[:-1])
+        owner = _names_hash([m.classname(e) for e in range(len(m.entities))])[m.brush_entity]
+        counts = np.diff(m.brush_plane_start).astype(np.uint64)
+        return _hash_columns([brush_h, counts, owner])
+
+
+def entity_key(keys: dict, without_origin: bool = False) -> tuple:
+    return tuple(sorted((k, v) for k, v in keys.items() if not (without_origin and k == "origin")))
+
+
+def structural_digest(m) -> str:
+    """One hex digest over every brush hash, in file order.
+
+    Equal digests mean no brush changed; entities are not included.
+    """
+    return hashlib.blake2b(brush_hashes(m).tobytes(), digest_size=16).hexdigest()
+
+
+def _match(hashes_a, hashes_b, idx_a, idx_b):
+    """Pair indices with equal hashes (first come, first served).
+
+    Returns (pairs, unmatched_a, unmatched_b).
+    """
+    buckets = defaultdict(list)
+    for i in idx_a:
+        buckets[hashes_a[i]].append(i)
+    for bucket in buckets.values():
+        bucket.reverse()
+    pairs, unmatched_b = [], []
+    for j in idx_b:
+        bucket = buckets.get(hashes_b[j])
+        if bucket:
+            pairs.append((bucket.pop(), j))
+        else:
+            unmatched_b.append(j)
+    unmatched_a = sorted(i for bucket in buckets.values() for i in bucket)
+    return pairs, unmatched_a, unmatched_b
+
+
+def diff_maps(a, b) -> dict:
+    """Compare two parsed maps.
+
+    Returns {"brushes": {...}, "entities": {...}, "worldspawn": [...]}.
+    Brush entries hold indices: "unchanged" is a count, "moved" a list of
+    (index in a, index in b), "added" indices into b, "removed" into a.
+    Entity entries use the same layout plus "changed" (same class and
+    origin, different keys). "worldspawn" lists (key, old, new).
+    """
+    full_a, full_b = brush_hashes(a).tolist(), brush_hashes(b).tolist()
+    pairs, removed, added = _match(full_a, full_b, range(len(full_a)), range(len(full_b)))
+    shape_a, shape_b = brush_hashes(a, shape=True).tolist(), brush_hashes(b, shape=True).tolist()
+    moved, removed, added = _match(shape_a, shape_b, removed, added)
+    brushes = {"unchanged": len(pairs), "moved": moved, "added": added, "removed": removed}
+
+    ents_a = [e for e in range(len(a.entities)) if a.classname(e) != "worldspawn"]
+    ents_b = [e for e in range(len(b.entities)) if b.classname(e) != "worldspawn"]
+    keys_a = [entity_key(k) for k in a.entities]
+    keys_b = [entity_key(k) for k in b.entities]
+    same, removed_e, added_e = _match(keys_a, keys_b, ents_a, ents_b)
+    keys_a = [entity_key(k, without_origin=True) for k in a.entities]
+    keys_b = [entity_key(k, without_origin=True) for k in b.entities]
+    moved_e, removed_e, added_e = _match(keys_a, keys_b, removed_e, added_e)
+    keys_a = [(k.get("classname"), k.get("origin")) for k in a.entities]
+    keys_b = [(k.get("classname"), k.get("origin")) for k in b.entities]
+    changed_e, removed_e, added_e = _match(keys_a, keys_b, removed_e, added_e)
+    entities = {"unchanged": len(same), "moved": moved_e, "changed": changed_e,
+                "added": added_e, "removed": removed_e}
+
+    ws_a = next((k for k in a.entities if k.get("classname") == "worldspawn"), {})
+    ws_b = next((k for k in b.entities if k.get("classname") == "worldspawn"), {})
+    worldspawn = [(k, ws_a.get(k), ws_b.get(k)) for k in sorted(set(ws_a) | set(ws_b))
+                  if ws_a.get(k) != ws_b.get(k)]
+    return {"brushes": brushes, "entities": entities, "worldspawn": worldspawn}
+
+
+def is_equivalent(d: dict) -> bool:
+    br, en = d["brushes"], d["entities"]
+    return not (br["moved"] or br["added"] or br["removed"] or en["moved"] or en["changed"]
+                or en["added"] or en["removed"] or d["worldspawn"])
+
+
+def _brush_center(m, b: int):
+    c = (m.brush_mins[b] + m.brush_maxs[b]) * 0.5
+    return c if np.all(np.isfinite(c)) else None
+
+
+def _entity_center(m, e: int):
+    if len(m.entity_brushes(e)):
+        brushes = m.entity_brushes(e)
+        lo = m.brush_mins[brushes.start:brushes.stop]
+        hi = m.brush_maxs[brushes.start:brushes.stop]
+        c = (np.nanmin(lo, axis=0) + np.nanmax(hi, axis=0)) * 0.5
+    else:
+        c = m.entity_origins[e]
+    return c if np.all(np.isfinite(c)) else None
+
+
+def region_summary(a, b, d: dict, cell: float) -> dict:
+    """Change counts per (cell_x, cell_y) on a `cell`-unit XY grid.
+
+    Moved items count in the cell they moved to. Items without a usable
+    position land under None.
+    """
+    regions = defaultdict(lambda: defaultdict(int))
+
+    def add(center, what):
+        key = None if center is None else (int(np.floor(center[0] / cell)), int(np.floor(center[1] / cell)))
+        regions[key][what] += 1
+
+    for i in d["brushes"]["removed"]:
+        add(_brush_center(a, i), "brushes_removed")
+    for j in d["brushes"]["added"]:
+        add(_brush_center(b, j), "brushes_added")
+    for _, j in d["brushes"]["moved"]:
+        add(_brush_center(b, j), "brushes_moved")
+    for i in d["entities"]["removed"]:
+        add(_entity_center(a, i), "entities_removed")
+    for j in d["entities"]["added"]:
+        add(_entity_center(b, j), "entities_added")
+    for _, j in d["entities"]["moved"] + d["entities"]["changed"]:
+        add(_entity_center(b, j), "entities_changed")
+    return regions
+
+
+def git_source(rev: str, path: str):
+    """The file at `path` as of git revision `rev`, as an open text stream."""
+    out = subprocess.run(["git", "show", f"{rev}:./{path}"], capture_output=True, check=True)
+    return io.StringIO(out.stdout.decode("utf-8", errors="replace"))
+
+
+def _fmt_vec(v) -> str:
+    return "(" + " ".join(f"{x:.0f}" for x in v) + ")" if v is not None else "(?)"
+
+
+def print_report(a, b, d: dict, cell: float, verbose: bool = False, top: int = 20) -> None:
+    br, en = d["brushes"], d["entities"]
+    print(f"  brushes:  {a.brush_count} -> {b.brush_count}  unchanged {br['unchanged']}, "
+          f"moved {len(br['moved'])}, added {len(br['added'])}, removed {len(br['removed'])}")
+    print(f"  entities: {len(a.entities)} -> {len(b.entities)}  unchanged {en['unchanged']}, "
+          f"moved {len(en['moved'])}, changed {len(en['changed'])}, "
+          f"added {len(en['added'])}, removed {len(en['removed'])}")
+    for key, old, new in d["worldspawn"]:
+        print(f"  worldspawn \"{key}\": {old!r} -> {new!r}")
+
+    regions = region_summary(a, b, d, cell)
+    if regions:
+        print(f"\nChanges by region ({cell:.0f}-unit cells, busiest first):")
+        ordered = sorted(regions.items(), key=lambda kv: -sum(kv[1].values()))
+        for key, counts in ordered[:top]:
+            if key is None:
+                where = "  (no position)".ljust(36)
+            else:
+                x, y = key
+                where = f"  x [{x * cell:.0f}, {(x + 1) * cell:.0f}) y [{y * cell:.0f}, {(y + 1) * cell:.0f})"
+                where = where.ljust(36)
+            print(f"{where} brushes +{counts['brushes_added']} -{counts['brushes_removed']} "
+                  f"~{counts['brushes_moved']}  entities +{counts['entities_added']} "
+                  f"-{counts['entities_removed']} ~{counts['entities_changed']}")
+        if len(ordered) > top:
+            print(f"  ... {len(ordered) - top} more regions")
+
+    if not verbose:
+        return
+    print()
+    for i, j in br["moved"]:
+        delta = b.brush_mins[j] - a.brush_mins[i]
+        print(f"  ~ brush {i} -> {j} ({a.classname(int(a.brush_entity[i]))}) moved by {_fmt_vec(delta)}")
+    for i in br["removed"]:
+        print(f"  - brush {i} ({a.classname(int(a.brush_entity[i]))}) at {_fmt_vec(_brush_center(a, i))}")
+    for j in br["added"]:
+        print(f"  + brush {j} ({b.classname(int(b.brush_entity[j]))}) at {_fmt_vec(_brush_center(b, j))}")
+    for i, j in en["moved"]:
+        print(f"  ~ entity {i} -> {j} {b.classname(j)}: origin {a.entities[i].get('origin')} "
+              f"-> {b.entities[j].get('origin')}")
+    for i, j in en["changed"]:
+        ka, kb = a.entities[i], b.entities[j]
+        keys = sorted(k for k in set(ka) | set(kb) if ka.get(k) != kb.get(k))
+        print(f"  ~ entity {i} -> {j} {b.classname(j)}: " +
+              ", ".join(f"{k} {ka.get(k)!r} -> {kb.get(k)!r}" for k in keys))
+    for i in en["removed"]:
+        print(f"  - entity {i} {a.classname(i)} at {_fmt_vec(_entity_center(a, i))}")
+    for j in en["added"]:
+        print(f"  + entity {j} {b.classname(j)} at {_fmt_vec(_entity_center(b, j))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic diff of two .map files")
+    parser.add_argument("maps", nargs="+", help="old.map new.map, or just new.map with --rev")
+    parser.add_argument("--rev", help="Compare new.map against this git revision of itself")
+    parser.add_argument("--cell", type=float, default=512.0, help="Region cell size in units (default 512)")
+    parser.add_argument("--top", type=int, default=20, help="Regions to list (default 20)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="List every changed brush and entity")
+    args = parser.parse_args()
+
+    if args.rev:
+        if len(args.maps) != 1:
+            parser.error("--rev takes exactly one map")
+        new_file = args.maps[0]
+        old_label = f"{args.rev}:{new_file}"
+        try:
+            old_source = git_source(args.rev, new_file)
+        except subprocess.CalledProcessError as e:
+            print(f"ERROR: git show failed: {e.stderr.decode().strip()}", file=sys.stderr)
+            sys.exit(2)
+    else:
+        if len(args.maps) != 2:
+            parser.error("expected old.map new.map")
+        old_label, new_file = args.maps
+        old_source = old_label
+
+    t0 = time.perf_counter()
+    a = load_map(old_source)
+    b = load_map(new_file)
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    d = diff_maps(a, b)
+    t_diff = time.perf_counter() - t0
+
+    print(f"{old_label} -> {new_file}")
+    print_report(a, b, d, args.cell, args.verbose, args.top)
+    same = is_equivalent(d)
+    print(f"\n{'equivalent' if same else 'different'} [load {t_load:.3f}s, diff {t_diff:.3f}s]")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
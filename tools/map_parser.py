@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+"""Fast .map reader with array-backed brush storage and an AABB tree.
+
+Loads a Q3 .map (classic plane-triple format, as written by our generators
+and by Radiant with brush primitives off) into flat NumPy arrays instead of
+per-brush Python objects, so a 100k-brush map fits in a few arrays and
+loads in seconds.
+
+Usage:
+    python3 tools/map_parser.py maps/qfcity1.map
+    python3 tools/map_parser.py maps/qfcity1.map --region -512 -512 0 512 512 256
+
+Library use:
+    from map_parser import load_map, iter_brushes, BrushIndex
+
+    m = load_map("maps/qfcity1.map")
+    index = BrushIndex(m.brush_mins, m.brush_maxs)
+    hits = index.query_box((-512, -512, 0), (512, 512, 256))
+
+    for ent_idx, points, textures in iter_brushes("maps/huge.map"):
+        ...  # one brush at a time, file read incrementally
+
+Plane orientation follows q3map2 PlaneFromPoints: the normal is
+cross(p2 - p0, p1 - p0), pointing out of the brush.
+
+patchDef2 and brushDef (brush primitives) blocks are skipped and counted.
+
+Requires: numpy
+"""
+
+import argparse
+import itertools
+import os
+import time
+import warnings
+
+import numpy as np
+
+# A classic plane line after stripping parens:
+#   9 point coords, texture, shift x/y, rotate, scale x/y, [contents surface value]
+_PLANE_NUMS = 9
+_TEX_PARAMS = 5
+_FLAGS = 3
+
+
+class MapData:
+    """Parsed .map contents, stored as parallel arrays.
+
+    Entities (n_ent):
+        entities            list of key/value dicts, in file order
+        entity_brush_start  int32 (n_ent + 1,); brushes of entity e are
+                            entity_brush_start[e]:entity_brush_start[e+1]
+        entity_origins      float64 (n_ent, 3); NaN where there is no origin
+    Brushes (n_brush):
+        brush_entity        int32 owning entity index
+        brush_plane_start   int32 (n_brush + 1,) offsets into the plane arrays
+        brush_mins/maxs     float64 (n_brush, 3) axis-aligned bounds
+    Planes (n_plane):
+        plane_points        float64 (n_plane, 3, 3) the three defining points
+        plane_normals       float64 (n_plane, 3) outward unit normals
+        plane_dists         float64 (n_plane,) normal . p0
+        plane_texture       int32 index into `textures`
+        plane_texparams     float64 (n_plane, 5) shift x/y, rotate, scale x/y
+        plane_flags         int32 (n_plane, 3) contents, surface, value
+        plane_has_flags     bool (n_plane,) False where the flags were omitted
+    """
+
+    def __init__(self):
+        self.entities = []
+        self.entity_brush_start = np.zeros(1, dtype=np.int32)
+        self.entity_origins = np.zeros((0, 3))
+        self.brush_entity = np.zeros(0, dtype=np.int32)
+        self.brush_plane_start = np.zeros(1, dtype=np.int32)
+        self.brush_mins = np.zeros((0, 3))
+        self.brush_maxs = np.zeros((0, 3))
+        self.textures = []
+        self.plane_points = np.zeros((0, 3, 3))
+        self.plane_normals = np.zeros((0, 3))
+        self.plane_dists = np.zeros(0)
+        self.plane_texture = np.zeros(0, dtype=np.int32)
+        self.plane_texparams = np.zeros((0, _TEX_PARAMS))
+        self.plane_flags = np.zeros((0, _FLAGS), dtype=np.int32)
+        self.plane_has_flags = np.zeros(0, dtype=bool)
+        self.skipped_patches = 0
+        self.skipped_brushdefs = 0
+
+    @property
+    def brush_count(self) -> int:
+        return len(self.brush_entity)
+
+    @property
+    def plane_count(self) -> int:
+        return len(self.plane_dists)
+
+    def brush_planes(self, b: int) -> slice:
+        """Slice into the plane arrays for brush b."""
+        return slice(int(self.brush_plane_start[b]), int(self.brush_plane_start[b + 1]))
+
+    def entity_brushes(self, e: int) -> range:
+        return range(int(self.entity_brush_start[e]), int(self.entity_brush_start[e + 1]))
+
+    def classname(self, e: int) -> str:
+        return self.entities[e].get("classname", "")
+
+    def point_entities(self) -> list:
+        """Indices of entities that have an origin and no brushes."""
+        counts = np.diff(self.entity_brush_start)
+        has_origin = ~np.isnan(self.entity_origins[:, 0])
+        return [int(e) for e in np.nonzero(has_origin & (counts == 0))[0]]
+
+    def points_inside(self, b: int, points: np.ndarray, epsilon: float = 0.0) -> np.ndarray:
+        """Exact point-in-brush test against the brush planes.
+
+        points is (n, 3); returns a bool (n,) array. A point counts as inside
+        when it is more than `epsilon` behind every plane.
+        """
+        s = self.brush_planes(b)
+        d = points @ self.plane_normals[s].T - self.plane_dists[s]
+        return np.all(d < -epsilon, axis=1)
+
+
+def _read_lines(source):
+    if hasattr(source, "read"):
+        yield from source
+        return
+    with open(source, errors="replace") as f:
+        yield from f
+
+
+def _skip_block(lines) -> None:
+    """Consume a { ... } block (patchDef2 / brushDef body) from a line iterator."""
+    depth = 0
+    for raw in lines:
+        line = raw.strip()
+        if line == "{":
+            depth += 1
+        elif line == "}":
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _scan(source):
+    """Single-pass line scanner shared by load_map() and iter_brushes().
+
+    Yields ("entity", None), ("key", (k, v)), ("brush", [plane lines]),
+    ("patch", None), ("brushdef", None) and ("end", None) events.
+    """
+    lines = iter(_read_lines(source))
+    depth = 0
+    planes = None
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("//"):
+            continue
+        c = line[0]
+        if depth == 2:
+            if c == "(":
+                planes.append(line)
+            elif c == "}":
+                depth = 1
+                if planes:
+                    yield "brush", planes
+                planes = None
+            elif line == "patchDef2" or line == "patchDef3":
+                _skip_block(lines)
+                _skip_block_tail(lines)
+                depth = 1
+                planes = None
+                yield "patch", None
+            elif line == "brushDef" or line == "brushDef3":
+                _skip_block(lines)
+                _skip_block_tail(lines)
+                depth = 1
+                planes = None
+                yield "brushdef", None
+            else:
+                raise ValueError(f"unexpected line inside brush: {line[:60]!r}")
+        elif depth == 1:
+            if c == '"':
+                key, _, value = line[1:-1].partition('" "')
+                yield "key", (key, value)
+            elif c == "{":
+                depth = 2
+                planes = []
+            elif c == "}":
+                depth = 0
+                yield "end", None
+            else:
+                raise ValueError(f"unexpected line inside entity: {line[:60]!r}")
+        elif c == "{":
+            depth = 1
+            yield "entity", None
+        else:
+            raise ValueError(f"unexpected line at top level: {line[:60]!r}")
+    if depth != 0:
+        raise ValueError("unexpected end of file (unbalanced braces)")
+
+
+def _skip_block_tail(lines) -> None:
+    """After a patch/brushDef body, consume the closing brace of its brush."""
+    for raw in lines:
+        line = raw.strip()
+        if line == "}":
+            return
+        if line and not line.startswith("//"):
+            raise ValueError(f"expected '}}' after patch/brushDef, got {line[:60]!r}")
+
+
+def _split_plane(line: str):
+    """Split a classic plane line into (9 coords, texture, numeric tail) strings."""
+    parts = line.replace("(", " ").replace(")", " ").split()
+    return parts[:_PLANE_NUMS], parts[_PLANE_NUMS], parts[_PLANE_NUMS + 1:]
+
+
+def _plane_geometry(points: np.ndarray):
+    """Outward unit normals and distances for (n, 3, 3) plane point triples."""
+    p0 = points[:, 0]
+    normals = np.cross(points[:, 2] - p0, points[:, 1] - p0)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.0  # degenerate plane; leave a zero normal
+    normals /= lengths[:, None]
+    dists = np.einsum("ij,ij->i", normals, p0)
+    return normals, dists
+
+
+def _brush_vertices(normals: np.ndarray, dists: np.ndarray, epsilon: float = 0.01) -> np.ndarray:
+    """Corner points of one convex brush, by intersecting plane triples."""
+    idx = np.array(list(itertools.combinations(range(len(dists)), 3)))
+    a = normals[idx]                      # (t, 3, 3)
+    b = dists[idx]                        # (t, 3)
+    det = np.linalg.det(a)
+    ok = np.abs(det) > 1e-9
+    if not ok.any():
+        return np.zeros((0, 3))
+    pts = np.linalg.solve(a[ok], b[ok][..., None])[..., 0]
+    inside = np.all(pts @ normals.T - dists <= epsilon, axis=1)
+    return pts[inside]
+
+
+def _brush_bounds(normals, dists, plane_brush, n_brush, plane_start):
+    """Axis-aligned bounds for every brush.
+
+    All-axial brushes (everything our generators emit) get their bounds
+    straight from the plane distances in a few vectorized scatter ops; the
+    rest fall back to per-brush vertex enumeration.
+    """
+    mins = np.full((n_brush, 3), -np.inf)
+    maxs = np.full((n_brush, 3), np.inf)
+    if n_brush == 0:
+        return mins, maxs
+
+    axis = np.argmax(np.abs(normals), axis=1)
+    comp = normals[np.arange(len(normals)), axis]
+    axial = np.abs(comp) > 1 - 1e-6
+    pos = axial & (comp > 0)
+    neg = axial & (comp < 0)
+    np.minimum.at(maxs, (plane_brush[pos], axis[pos]), dists[pos])
+    np.maximum.at(mins, (plane_brush[neg], axis[neg]), -dists[neg])
+
+    nonaxial_brush = np.zeros(n_brush, dtype=bool)
+    nonaxial_brush[plane_brush[~axial]] = True
+    unbounded = ~np.all(np.isfinite(mins) & np.isfinite(maxs), axis=1)
+    for b in np.nonzero(nonaxial_brush | unbounded)[0]:
+        s = slice(plane_start[b], plane_start[b + 1])
+        verts = _brush_vertices(normals[s], dists[s])
+        if len(verts):
+            mins[b] = verts.min(axis=0)
+            maxs[b] = verts.max(axis=0)
+        else:
+            mins[b] = maxs[b] = np.nan
+    return mins, maxs
+
+
+def _parse_floats(text: str):
+    """Whitespace-separated floats via NumPy's C parser; None on any non-number."""
+    with warnings.catch_warnings():
+        # NumPy reports trailing garbage as a DeprecationWarning, not an error
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(text, sep=" ")
+        except (ValueError, DeprecationWarning):
+            return None
+
+
+def _convert_planes(lines: list):
+    """Bulk-convert classic plane lines to arrays.
+
+    Rather than converting numbers line by line, the coordinate parts and
+    the numeric tails are each joined into one string and handed to NumPy's
+    C text parser. Lines without the trailing flags fall back to a slow path.
+    """
+    n = len(lines)
+    heads = []
+    textures = []
+    nums = []
+    for line in lines:
+        head, _, tail = line.rpartition(")")
+        tex, _, rest = tail.strip().partition(" ")
+        heads.append(head)
+        textures.append(tex)
+        nums.append(rest)
+
+    coord_text = " ".join(heads).replace("(", " ").replace(")", " ")
+    coords = _parse_floats(coord_text) if n else np.zeros(0)
+    if coords is None or len(coords) != n * _PLANE_NUMS:
+        raise ValueError("malformed plane line: expected three ( x y z ) points")
+    points = coords.reshape(n, 3, 3)
+
+    names = {}
+    tex_ids = np.array([names.setdefault(t, len(names)) for t in textures], dtype=np.int32)
+
+    width = _TEX_PARAMS + _FLAGS
+    tail_vals = _parse_floats(" ".join(nums)) if n else np.zeros(0)
+    texparams = np.zeros((n, _TEX_PARAMS))
+    flags = np.zeros((n, _FLAGS), dtype=np.int32)
+    if tail_vals is not None and len(tail_vals) == n * width:
+        tail_vals = tail_vals.reshape(n, width)
+        texparams[:] = tail_vals[:, :_TEX_PARAMS]
+        flags[:] = tail_vals[:, _TEX_PARAMS:]
+        has_flags = np.ones(n, dtype=bool)
+    else:
+        # Mixed lines (older maps omit the flags): bulk-convert the complete
+        # ones, then fill in the short ones individually.
+        counts = np.array([len(rest.split()) for rest in nums])
+        has_flags = counts == width
+        full = np.nonzero(has_flags)[0]
+        if len(full):
+            vals = _parse_floats(" ".join([nums[i] for i in full])).reshape(-1, width)
+            texparams[full] = vals[:, :_TEX_PARAMS]
+            flags[full] = vals[:, _TEX_PARAMS:]
+        for i in np.nonzero(~has_flags)[0]:
+            vals = [float(v) for v in nums[i].split()[:width]]
+            texparams[i, :min(len(vals), _TEX_PARAMS)] = vals[:_TEX_PARAMS]
+            if len(vals) >= width:
+                flags[i] = vals[_TEX_PARAMS:width]
+                has_flags[i] = True
+    return points, list(names), tex_ids, texparams, flags, has_flags
+
+
+def load_map(source, use_binary: bool = True) -> MapData:
+    """Parse a .map file (path or open text file) into a MapData.
+
+    Given a path, a binary map (tools/map_binary.py) is used instead of
+    the text when possible: a .map.npz path is loaded directly, and a .map
+    whose <name>.map.npz companion was written from its current contents
+    is read from the companion.
+    """
+    if use_binary and isinstance(source, str):
+        import map_binary  # imports this module, so not at the top
+        if source.endswith(map_binary.BINARY_SUFFIX):
+            return map_binary.load_binary(source)
+        companion = map_binary.binary_path(source)
+        if os.path.exists(companion) and map_binary.is_current(companion, source):
+            return map_binary.load_binary(companion, mmap=False)
+
+    m = MapData()
+    entities = []
+    ent_brush_start = [0]
+    brush_entity = []
+    brush_plane_start = [0]
+    plane_lines = []
+    n_planes = 0
+
+    for kind, payload in _scan(source):
+        if kind == "brush":
+            plane_lines.extend(payload)
+            n_planes += len(payload)
+            brush_entity.append(len(entities) - 1)
+            brush_plane_start.append(n_planes)
+        elif kind == "key":
+            entities[-1][payload[0]] = payload[1]
+        elif kind == "entity":
+            entities.append({})
+        elif kind == "end":
+            ent_brush_start.append(len(brush_entity))
+        elif kind == "patch":
+            m.skipped_patches += 1
+        elif kind == "brushdef":
+            m.skipped_brushdefs += 1
+
+    m.entities = entities
+    m.entity_brush_start = np.array(ent_brush_start, dtype=np.int32)
+    m.brush_entity = np.array(brush_entity, dtype=np.int32)
+    m.brush_plane_start = np.array(brush_plane_start, dtype=np.int32)
+    (m.plane_points, m.textures, m.plane_texture, m.plane_texparams,
+     m.plane_flags, m.plane_has_flags) = _convert_planes(plane_lines)
+
+    m.plane_normals, m.plane_dists = _plane_geometry(m.plane_points)
+    plane_brush = np.repeat(np.arange(len(brush_entity), dtype=np.int32),
+                            np.diff(m.brush_plane_start))
+    m.brush_mins, m.brush_maxs = _brush_bounds(m.plane_normals, m.plane_dists, plane_brush,
+                                               len(brush_entity), m.brush_plane_start)
+
+    origins = np.full((len(entities), 3), np.nan)
+    for e, keys in enumerate(entities):
+        origin = keys.get("origin")
+        if origin:
+            try:
+                origins[e] = [float(v) for v in origin.split()[:3]]
+            except ValueError:
+                pass
+    m.entity_origins = origins
+    return m
+
+
+def iter_brushes(source):
+    """Stream brushes as (entity_index, points (n, 3, 3), [texture names]).
+
+    Reads the file incrementally and keeps only the current brush, for maps
+    too large to load whole or for one-shot passes.
+    """
+    ent = -1
+    for kind, payload in _scan(source):
+        if kind == "entity":
+            ent += 1
+        elif kind == "brush":
+            coords = []
+            textures = []
+            for line in payload:
+                nums, tex, _ = _split_plane(line)
+                coords.extend(nums)
+                textures.append(tex)
+            yield ent, np.array(coords, dtype=np.float64).reshape(-1, 3, 3), textures
+
+
+def iter_entities(source):
+    """Stream entities as (key/value dict, brush count), brushes not kept."""
+    keys = None
+    brushes = 0
+    for kind, payload in _scan(source):
+        if kind == "entity":
+            keys, brushes = {}, 0
+        elif kind == "key":
+            keys[payload[0]] = payload[1]
+        elif kind == "brush":
+            brushes += 1
+        elif kind == "end":
+            yield keys, brushes
+
+
+class BrushIndex:
+    """Static AABB tree (bounding volume hierarchy) over brush bounds.
+
+    Built top-down by median split on the longest axis of the node's
+    centroid spread. Nodes live in flat arrays; leaves hold up to
+    `leaf_size` brushes and are tested with one vectorized overlap check.
+    """
+
+    def __init__(self, mins: np.ndarray, maxs: np.ndarray, leaf_size: int = 16):
+        self.mins = np.asarray(mins, dtype=np.float64)
+        self.maxs = np.asarray(maxs, dtype=np.float64)
+        n = len(self.mins)
+        valid = np.nonzero(np.all(np.isfinite(self.mins) & np.isfinite(self.maxs), axis=1))[0]
+        self.order = valid.astype(np.int64)
+
+        node_min, node_max, node_left, node_start, node_count = [], [], [], [], []
+        centroids = (self.mins + self.maxs) * 0.5 if n else np.zeros((0, 3))
+
+        def new_node(start, count):
+            idx = self.order[start:start + count]
+            if count:
+                node_min.append(self.mins[idx].min(axis=0))
+                node_max.append(self.maxs[idx].max(axis=0))
+            else:
+                node_min.append(np.full(3, np.inf))
+                node_max.append(np.full(3, -np.inf))
+            node_left.append(-1)
+            node_start.append(start)
+            node_count.append(count)
+            return len(node_left) - 1
+
+        stack = [new_node(0, len(self.order))]
+        while stack:
+            node = stack.pop()
+            start, count = node_start[node], node_count[node]
+            if count <= leaf_size:
+                continue
+            idx = self.order[start:start + count]
+            c = centroids[idx]
+            axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+            half = count // 2
+            part = np.argpartition(c[:, axis], half)
+            self.order[start:start + count] = idx[part]
+            left = new_node(start, half)
+            new_node(start + half, count - half)
+            node_left[node] = left      # right child is always left + 1
+            node_count[node] = 0        # interior node
+            stack.append(left)
+            stack.append(left + 1)
+
+        self.node_min = np.array(node_min).reshape(-1, 3)
+        self.node_max = np.array(node_max).reshape(-1, 3)
+        self.node_left = np.array(node_left, dtype=np.int64)
+        self.node_start = np.array(node_start, dtype=np.int64)
+        self.node_count = np.array(node_count, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def query_box(self, lo, hi, inclusive: bool = False) -> np.ndarray:
+        """Indices of brushes whose bounds overlap the box [lo, hi].
+
+        With inclusive=False, boxes that only touch on a face do not count,
+        so a player standing exactly on a floor does not hit it.
+        """
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+        if inclusive:
+            def overlap(a_min, a_max):
+                return np.all((a_min <= hi) & (a_max >= lo), axis=-1)
+        else:
+            def overlap(a_min, a_max):
+                return np.all((a_min < hi) & (a_max > lo), axis=-1)
+
+        if not len(self.node_left):
+            return np.zeros(0, dtype=np.int64)
+        found = []
+        stack = [0]
+        node_min, node_max = self.node_min, self.node_max
+        while stack:
+            node = stack.pop()
+            if not overlap(node_min[node], node_max[node]):
+                continue
+            left = self.node_left[node]
+            if left < 0:
+                start = self.node_start[node]
+                idx = self.order[start:start + self.node_count[node]]
+                found.append(idx[overlap(self.mins[idx], self.maxs[idx])])
+            else:
+                stack.append(left)
+                stack.append(left + 1)
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    def query_point(self, point) -> np.ndarray:
+        """Indices of brushes whose bounds contain the point (faces included)."""
+        return self.query_box(point, point, inclusive=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse a .map and print a summary")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--region", type=float, nargs=6, metavar=("X1", "Y1", "Z1", "X2", "Y2", "Z2"),
+                        help="List brushes overlapping this box")
+    parser.add_argument("--stream", action="store_true",
+                        help="Count brushes with the streaming iterator instead of loading")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.stream:
+        count = sum(1 for _ in iter_brushes(args.map_file))
+        print(f"{args.map_file}: {count} brushes (streamed in {time.perf_counter() - t0:.3f}s)")
+        return
+
+    m = load_map(args.map_file)
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index = BrushIndex(m.brush_mins, m.brush_maxs)
+    t_index = time.perf_counter() - t0
+
+    classes = {}
+    for keys in m.entities:
+        cn = keys.get("classname", "?")
+        classes[cn] = classes.get(cn, 0) + 1
+
+    print(f"{args.map_file}")
+    print(f"  Entities: {len(m.entities)}")
+    print(f"  Brushes:  {m.brush_count}")
+    print(f"  Planes:   {m.plane_count}")
+    print(f"  Textures: {len(m.textures)}")
+    if m.skipped_patches or m.skipped_brushdefs:
+        print(f"  Skipped:  {m.skipped_patches} patches, {m.skipped_brushdefs} brushDef blocks")
+    if m.brush_count:
+        lo = np.nanmin(m.brush_mins, axis=0)
+        hi = np.nanmax(m.brush_maxs, axis=0)
+        print(f"  Bounds:   ({lo[0]:.0f} {lo[1]:.0f} {lo[2]:.0f}) - ({hi[0]:.0f} {hi[1]:.0f} {hi[2]:.0f})")
+    print(f"  Load:     {t_load:.3f}s   Index: {t_index:.3f}s ({len(index.node_left)} nodes)")
+    for cn in sorted(classes):
+        print(f"    {classes[cn]:6d}  {cn}")
+
+    if args.region:
+        hits = index.query_box(args.region[:3], args.region[3:])
+        print(f"  Region query: {len(hits)} brushes")
+        for b in hits:
+            lo, hi = m.brush_mins[b], m.brush_maxs[b]
+            print(f"    brush {b:6d}  ent {m.brush_entity[b]}  "
+                  f"({lo[0]:.0f} {lo[1]:.0f} {lo[2]:.0f}) - ({hi[0]:.0f} {hi[1]:.0f} {hi[2]:.0f})")
+
+
+if __name__ == "__main__":
+    main()
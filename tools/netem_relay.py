@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""UDP relay that adds latency, jitter, loss, duplication and bandwidth caps.
+
+Sits between a client and ioq3ded on the same machine. Every client address
+gets its own upstream socket, so the server sees one peer per client and
+statistics are kept per flow. Impairments are configured separately for
+each direction ("up" = client->server, "down" = server->client) with a
+netem-like spec:
+
+    delay 100ms jitter 20ms loss 2% duplicate 0.5% rate 512kbit queue 300ms
+    up delay 40ms down delay 60ms loss 1%
+    off
+
+delay/jitter    one-way latency; each packet gets delay +/- uniform jitter,
+                so jitter larger than the packet interval reorders packets
+loss/duplicate  independent per-packet probabilities
+rate            per-flow serialization rate (bit, kbit, mbit); packets queue
+                behind each other and are tail-dropped once the queue holds
+                more than `queue` worth of transmission time (default 500ms)
+
+A running relay is reconfigured through a localhost control port (relay
+port + 1 by default), which is how NETEM lines in tests/*.test drive it.
+
+Usage:
+    python3 tools/netem_relay.py run --listen 27965 delay 100ms loss 2%
+    python3 tools/netem_relay.py set down delay 150ms jitter 30ms
+    python3 tools/netem_relay.py set off
+    python3 tools/netem_relay.py stats          # per-flow statistics (JSON)
+    python3 tools/netem_relay.py stop
+
+    # client side
+    ioquake3 +connect 127.0.0.1:27965
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import socket
+import sys
+import time
+
+DEFAULT_LISTEN = 27965
+DEFAULT_SERVER = "127.0.0.1:27960"
+DEFAULT_QUEUE_MS = 500
+FLOW_IDLE_SECONDS = 60.0
+MAX_DATAGRAM = 65535
+DIRECTIONS = ("up", "down")
+
+
+class SpecError(ValueError):
+    pass
+
+
+def _parse_ms(token: str) -> float:
+    text, scale = token.lower(), 1.0
+    if text.endswith("ms"):
+        text = text[:-2]
+    elif text.endswith("s"):
+        text, scale = text[:-1], 1000.0
+    try:
+        return float(text) * scale
+    except ValueError:
+        raise SpecError(f"bad time {token!r} (use e.g. 100ms)") from None
+
+
+def _parse_pct(token: str) -> float:
+    try:
+        value = float(token.rstrip("%"))
+    except ValueError:
+        raise SpecError(f"bad percentage {token!r} (use e.g. 2%)") from None
+    if not 0 <= value <= 100:
+        raise SpecError(f"percentage out of range: {token}")
+    return value / 100.0
+
+
+def _parse_rate(token: str) -> float:
+    units = (("mbit", 1e6), ("kbit", 1e3), ("bit", 1.0))
+    token = token.lower()
+    for suffix, scale in units:
+        if token.endswith(suffix):
+            token, factor = token[:-len(suffix)], scale
+            break
+    else:
+        factor = 1e3  # bare numbers are kbit/s
+    try:
+        return float(token) * factor
+    except ValueError:
+        raise SpecError(f"bad rate {token!r} (use e.g. 512kbit)") from None
+
+
+class Impairment:
+    """Settings for one direction."""
+
+    FIELDS = ("delay_ms", "jitter_ms", "loss", "duplicate", "rate_bps", "queue_ms")
+
+    def __init__(self):
+        self.delay_ms = 0.0
+        self.jitter_ms = 0.0
+        self.loss = 0.0
+        self.duplicate = 0.0
+        self.rate_bps = 0.0
+        self.queue_ms = float(DEFAULT_QUEUE_MS)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "Impairment":
+        imp = cls()
+        for name in cls.FIELDS:
+            setattr(imp, name, values.get(name, getattr(imp, name)))
+        return imp
+
+    def describe(self) -> str:
+        parts = []
+        if self.delay_ms or self.jitter_ms:
+            parts.append(f"delay {self.delay_ms:g}ms")
+        if self.jitter_ms:
+            parts.append(f"jitter {self.jitter_ms:g}ms")
+        if self.loss:
+            parts.append(f"loss {self.loss * 100:g}%")
+        if self.duplicate:
+            parts.append(f"duplicate {self.duplicate * 100:g}%")
+        if self.rate_bps:
+            parts.append(f"rate {self.rate_bps / 1000:g}kbit queue {self.queue_ms:g}ms")
+        return " ".join(parts) or "none"
+
+
+def apply_spec(config: dict, tokens: list):
+    """Update {"up": Impairment, "down": Impairment} from a netem-like spec."""
+    targets = DIRECTIONS
+    i = 0
+    while i < len(tokens):
+        word = tokens[i].lower()
+        i += 1
+        if word in DIRECTIONS:
+            targets = (word,)
+            continue
+        if word == "both":
+            targets = DIRECTIONS
+            continue
+        if word in ("off", "clear", "none"):
+            for d in targets:
+                config[d] = Impairment()
+            continue
+        if i >= len(tokens):
+            raise SpecError(f"{word!r} needs a value")
+        value = tokens[i]
+        i += 1
+        if word == "delay":
+            field, parsed = "delay_ms", _parse_ms(value)
+        elif word == "jitter":
+            field, parsed = "jitter_ms", _parse_ms(value)
+        elif word == "loss":
+            field, parsed = "loss", _parse_pct(value)
+        elif word in ("duplicate", "dup"):
+            field, parsed = "duplicate", _parse_pct(value)
+        elif word == "rate":
+            field, parsed = "rate_bps", _parse_rate(value)
+        elif word == "queue":
+            field, parsed = "queue_ms", _parse_ms(value)
+        else:
+            raise SpecError(f"unknown setting {word!r}")
+        for d in targets:
+            setattr(config[d], field, parsed)
+
+
+class DirectionStats:
+    __slots__ = ("packets", "bytes", "sent", "bytes_sent", "lost", "duplicated",
+                 "queue_dropped", "delay_sum", "delay_max", "busy_until")
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.lost = 0
+        self.duplicated = 0
+        self.queue_dropped = 0
+        self.delay_sum = 0.0
+        self.delay_max = 0.0
+        self.busy_until = 0.0     # rate limiter: when the link is free again
+
+    def as_dict(self) -> dict:
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "lost": self.lost,
+            "duplicated": self.duplicated,
+            "queue_dropped": self.queue_dropped,
+            "mean_delay_ms": round(self.delay_sum / self.sent * 1000, 2) if self.sent else 0.0,
+            "max_delay_ms": round(self.delay_max * 1000, 2),
+        }
+
+
+class Flow:
+    def __init__(self, client: tuple, sock: socket.socket):
+        self.client = client
+        self.sock = sock
+        self.started = time.time()
+        self.last_seen = time.monotonic()
+        self.stats = {d: DirectionStats() for d in DIRECTIONS}
+
+    @property
+    def name(self) -> str:
+        return f"{self.client[0]}:{self.client[1]}"
+
+
+class Relay:
+    def __init__(self, listen: tuple, server: tuple, control_port: int, seed=None):
+        self.listen = listen
+        self.server = server
+        self.control_port = control_port
+        self.config = {d: Impairment() for d in DIRECTIONS}
+        self.flows = {}
+        self.closed_flows = []
+        self.rng = random.Random(seed)
+        self.loop = None
+        self.done = None
+
+    # --- packet path ---
+
+    def _impair(self, flow: Flow, direction: str, data: bytes, sock, addr):
+        imp = self.config[direction]
+        st = flow.stats[direction]
+        st.packets += 1
+        st.bytes += len(data)
+        rng = self.rng
+        if imp.loss and rng.random() < imp.loss:
+            st.lost += 1
+            return
+        copies = 2 if imp.duplicate and rng.random() < imp.duplicate else 1
+        if copies == 2:
+            st.duplicated += 1
+
+        now = self.loop.time()
+        for _ in range(copies):
+            depart = now
+            if imp.rate_bps:
+                start = max(now, st.busy_until)
+                if start - now > imp.queue_ms / 1000.0:
+                    st.queue_dropped += 1
+                    continue
+                st.busy_until = start + len(data) * 8 / imp.rate_bps
+                depart = st.busy_until
+            delay = imp.delay_ms
+            if imp.jitter_ms:
+                delay += rng.uniform(-imp.jitter_ms, imp.jitter_ms)
+            at = depart + max(0.0, delay) / 1000.0
+            latency = at - now
+            st.delay_sum += latency
+            st.delay_max = max(st.delay_max, latency)
+            st.sent += 1
+            st.bytes_sent += len(data)
+            if at <= now:
+                self._send(sock, data, addr)
+            else:
+                self.loop.call_at(at, self._send, sock, data, addr)
+
+    @staticmethod
+    def _send(sock, data: bytes, addr):
+        try:
+            sock.sendto(data, addr)
+        except OSError:
+            pass  # flow closed or peer gone; counts as loss on the wire
+
+    def _on_client_packet(self):
+        while True:
+            try:
+                data, addr = self.listen_sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            flow = self.flows.get(addr)
+            if flow is None:
+                flow = self._open_flow(addr)
+            flow.last_seen = time.monotonic()
+            self._impair(flow, "up", data, flow.sock, self.server)
+
+    def _on_server_packet(self, flow: Flow):
+        while True:
+            try:
+                data, _ = flow.sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            flow.last_seen = time.monotonic()
+            self._impair(flow, "down", data, self.listen_sock, flow.client)
+
+    def _open_flow(self, client: tuple) -> Flow:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.bind(("0.0.0.0", 0))
+        flow = Flow(client, sock)
+        self.flows[client] = flow
+        self.loop.add_reader(sock, self._on_server_packet, flow)
+        print(f"[netem] new flow {flow.name} via local port {sock.getsockname()[1]}", flush=True)
+        return flow
+
+    def _close_flow(self, flow: Flow):
+        self.loop.remove_reader(flow.sock)
+        flow.sock.close()
+        del self.flows[flow.client]
+        self.closed_flows.append(self._flow_summary(flow))
+
+    def _expire_flows(self):
+        cutoff = time.monotonic() - FLOW_IDLE_SECONDS
+        for flow in [f for f in self.flows.values() if f.last_seen < cutoff]:
+            self._close_flow(flow)
+        self.loop.call_later(FLOW_IDLE_SECONDS / 4, self._expire_flows)
+
+    # --- control / stats ---
+
+    def _flow_summary(self, flow: Flow) -> dict:
+        return {
+            "flow": flow.name,
+            "seconds": round(time.time() - flow.started, 1),
+            **{d: flow.stats[d].as_dict() for d in DIRECTIONS},
+        }
+
+    def stats(self) -> dict:
+        return {
+            "config": {d: self.config[d].as_dict() for d in DIRECTIONS},
+            "flows": self.closed_flows + [self._flow_summary(f) for f in self.flows.values()],
+        }
+
+    def describe(self) -> str:
+        return f"up: {self.config['up'].describe()}; down: {self.config['down'].describe()}"
+
+    def _on_control(self):
+        while True:
+            try:
+                data, addr = self.control_sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            words = data.decode("utf-8", "replace").split()
+            if not words:
+                continue
+            cmd, rest = words[0].lower(), words[1:]
+            if cmd == "set":
+                try:
+                    # all-or-nothing: a bad token leaves the old settings
+                    config = {d: Impairment.from_dict(self.config[d].as_dict()) for d in DIRECTIONS}
+                    apply_spec(config, rest)
+                    self.config = config
+                    reply = "ok " + self.describe()
+                    print(f"[netem] {self.describe()}", flush=True)
+                except SpecError as e:
+                    reply = f"error {e}"
+            elif cmd == "stats":
+                reply = json.dumps(self.stats())
+            elif cmd == "reset":
+                self.closed_flows = []
+                for flow in self.flows.values():
+                    busy = {d: flow.stats[d].busy_until for d in DIRECTIONS}
+                    flow.stats = {d: DirectionStats() for d in DIRECTIONS}
+                    for d in DIRECTIONS:
+                        flow.stats[d].busy_until = busy[d]
+                reply = "ok"
+            elif cmd == "quit":
+                reply = "ok"
+                self.done.set()
+            else:
+                reply = f"error unknown command {cmd!r}"
+            self.control_sock.sendto(reply.encode(), addr)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.done = asyncio.Event()
+        self.listen_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen_sock.setblocking(False)
+        self.listen_sock.bind(self.listen)
+        self.control_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.control_sock.setblocking(False)
+        self.control_sock.bind(("127.0.0.1", self.control_port))
+        self.loop.add_reader(self.listen_sock, self._on_client_packet)
+        self.loop.add_reader(self.control_sock, self._on_control)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.done.set)
+        self.loop.call_later(FLOW_IDLE_SECONDS / 4, self._expire_flows)
+        print(f"[netem] relaying {self.listen[0]}:{self.listen[1]} -> {self.server[0]}:{self.server[1]} "
+              f"(control 127.0.0.1:{self.control_port})", flush=True)
+        print(f"[netem] {self.describe()}", flush=True)
+        try:
+            await self.done.wait()
+        finally:
+            for flow in list(self.flows.values()):
+                self._close_flow(flow)
+            self.listen_sock.close()
+            self.control_sock.close()
+
+
+def print_stats(stats: dict):
+    print(f"config  up: {Impairment.from_dict(stats['config']['up']).describe()}")
+    print(f"      down: {Impairment.from_dict(stats['config']['down']).describe()}")
+    print(f"{'flow':<22s} {'dir':<4s} {'pkts':>7s} {'sent':>7s} {'lost':>6s} {'dup':>5s} "
+          f"{'qdrop':>6s} {'KB':>8s} {'mean ms':>8s} {'max ms':>7s}")
+    for flow in stats["flows"]:
+        for d in DIRECTIONS:
+            s = flow[d]
+            print(f"{flow['flow']:<22s} {d:<4s} {s['packets']:7d} {s['sent']:7d} {s['lost']:6d} "
+                  f"{s['duplicated']:5d} {s['queue_dropped']:6d} {s['bytes_sent'] / 1024:8.1f} "
+                  f"{s['mean_delay_ms']:8.1f} {s['max_delay_ms']:7.1f}")
+
+
+def control(port: int, message: str, timeout: float = 2.0):
+    """Send one control command to a running relay; return the reply or None."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(message.encode(), ("127.0.0.1", port))
+        data, _ = sock.recvfrom(MAX_DATAGRAM)
+        return data.decode("utf-8", "replace")
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def parse_address(text: str, default_port: int) -> tuple:
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, default_port
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP latency/loss/bandwidth relay for Q3 netcode tests")
+    parser.add_argument("command", choices=["run", "set", "stats", "stop"])
+    parser.add_argument("spec", nargs="*", help="Impairment spec, e.g. 'delay 100ms loss 2%%'")
+    parser.add_argument("--listen", type=int, default=DEFAULT_LISTEN,
+                        help=f"Port clients connect to (default: {DEFAULT_LISTEN})")
+    parser.add_argument("--bind", default="0.0.0.0", help="Listen address (default: 0.0.0.0)")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help=f"ioq3ded address (default: {DEFAULT_SERVER})")
+    parser.add_argument("--control", type=int, default=None,
+                        help="Control port on 127.0.0.1 (default: listen port + 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible loss/jitter")
+    parser.add_argument("--stats-file", help="run: write final statistics to this JSON file")
+    parser.add_argument("--json", action="store_true", help="stats: print raw JSON")
+    args = parser.parse_intermixed_args()
+    control_port = args.control or args.listen + 1
+
+    if args.command == "run":
+        relay = Relay((args.bind, args.listen), parse_address(args.server, 27960), control_port, args.seed)
+        try:
+            apply_spec(relay.config, args.spec)
+        except SpecError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+        try:
+            asyncio.run(relay.serve())
+        except OSError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+        stats = relay.stats()
+        if args.stats_file:
+            with open(args.stats_file, "w") as f:
+                json.dump(stats, f, indent=1)
+        print_stats(stats)
+        return
+
+    message = {"set": "set " + " ".join(args.spec), "stats": "stats", "stop": "quit"}[args.command]
+    reply = control(control_port, message)
+    if reply is None:
+        print(f"No relay answering on control port {control_port}", file=sys.stderr)
+        sys.exit(1)
+    if args.command == "stats" and not args.json:
+        print_stats(json.loads(reply))
+    else:
+        print(reply)
+    sys.exit(1 if reply.startswith("error") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""Shrink a compiled BSP before it ships to the browser client.
+
+q3map2 writes every surface's vertices and index list out separately, keeps
+shaders and inline models nobody references any more (for example after
+patch_bsp_entities.py removed a brush entity), and stores lightmap pages
+at full 8-bit precision. This post-compile pass works on the lumps
+directly and rewrites a valid IBSP:
+
+  models      inline models (*N) no entity references are dropped, with
+              their surfaces, brushes and brush sides; entity keys renumbered
+  drawverts   duplicate vertices inside a surface are welded and identical
+              vertex blocks are shared between surfaces
+  drawindexes identical index runs are shared (most quads index 0 1 2 0 2 3)
+  shaders     entries no surface, brush or brush side uses are dropped
+  fogs        entries no surface uses are dropped (q3map2 always gives a
+              real fog volume a surface for its visible side)
+  lightmaps   unreferenced and duplicate pages are dropped; --lightmap-bits
+              quantizes the pages so they deflate better inside a pk3
+
+Drawn geometry is checked surface by surface against the input, and the
+result is validated (every index, range and cross-lump reference in
+bounds) before anything is written.
+
+Usage:
+    python3 tools/optimize_bsp.py maps/qfcity1.bsp
+    python3 tools/optimize_bsp.py maps/qfcity1.bsp -o /tmp/qfcity1.bsp --lightmap-bits 6
+    python3 tools/optimize_bsp.py maps/*.bsp --dry-run
+
+Requires: numpy
+"""
+
+import argparse
+import sys
+import zlib
+
+import numpy as np
+
+from bsp_file import (
+    BspFile, LUMP_BRUSHES, LUMP_BRUSHSIDES, LUMP_DRAWINDEXES, LUMP_DRAWVERTS, LUMP_ENTITIES,
+    LUMP_FOGS, LUMP_LEAFBRUSHES, LUMP_LEAFS, LUMP_LEAFSURFACES, LUMP_LIGHTMAPS, LUMP_MODELS,
+    LUMP_NAMES, LUMP_SHADERS, LUMP_SURFACES, encode_bsp, encode_entities, parse_entities,
+    read_bsp, write_bsp,
+)
+
+DRAWVERT_SIZE = 44
+SHADER_SIZE = 72
+FOG_SIZE = 72
+LIGHTMAP_PAGE = 128 * 128 * 3
+
+# Record layouts as int32 columns (float fields are carried bit for bit)
+SURFACE_INTS = 26
+S_SHADER, S_FOG, S_TYPE, S_FIRST_VERT, S_NUM_VERTS, S_FIRST_INDEX, S_NUM_INDEXES, S_LIGHTMAP = range(8)
+MODEL_INTS = 10
+M_FIRST_SURFACE, M_NUM_SURFACES, M_FIRST_BRUSH, M_NUM_BRUSHES = 6, 7, 8, 9
+BRUSH_INTS = 3
+B_FIRST_SIDE, B_NUM_SIDES, B_SHADER = 0, 1, 2
+BRUSHSIDE_INTS = 2
+BS_PLANE, BS_SHADER = 0, 1
+LEAF_INTS = 12
+FOG_BRUSH = 16  # int32 column after the 64-byte shader name
+
+MST_PLANAR, MST_PATCH, MST_TRIANGLE_SOUP, MST_FLARE = 1, 2, 3, 4
+
+# Longest index run (in indexes) shared from inside a longer run
+MAX_SHARED_RUN = 64
+
+
+def _records(data: bytes, ints: int) -> np.ndarray:
+    if len(data) % (ints * 4):
+        raise ValueError(f"lump size {len(data)} is not a multiple of {ints * 4}")
+    return np.frombuffer(data, dtype="<i4").reshape(-1, ints).copy()
+
+
+def _bytes(records: np.ndarray) -> bytes:
+    return np.ascontiguousarray(records, dtype="<i4").tobytes()
+
+
+def _compact_map(keep: np.ndarray) -> np.ndarray:
+    """Old index -> new index for kept entries, -1 for dropped ones."""
+    remap = np.full(len(keep), -1, dtype=np.int64)
+    remap[keep] = np.arange(int(keep.sum()))
+    return remap
+
+
+class Lumps:
+    """Decoded view of the lumps this pass rewrites."""
+
+    def __init__(self, bsp: BspFile):
+        self.entities = parse_entities(bsp.entity_text())
+        self.shaders = bsp.lumps[LUMP_SHADERS]
+        self.models = _records(bsp.lumps[LUMP_MODELS], MODEL_INTS)
+        self.brushes = _records(bsp.lumps[LUMP_BRUSHES], BRUSH_INTS)
+        self.brushsides = _records(bsp.lumps[LUMP_BRUSHSIDES], BRUSHSIDE_INTS)
+        self.leafs = _records(bsp.lumps[LUMP_LEAFS], LEAF_INTS)
+        self.leafsurfaces = np.frombuffer(bsp.lumps[LUMP_LEAFSURFACES], dtype="<i4").copy()
+        self.leafbrushes = np.frombuffer(bsp.lumps[LUMP_LEAFBRUSHES], dtype="<i4").copy()
+        self.surfaces = _records(bsp.lumps[LUMP_SURFACES], SURFACE_INTS)
+        self.fogs = bsp.lumps[LUMP_FOGS]
+        self.verts = bsp.lumps[LUMP_DRAWVERTS]
+        self.indexes = np.frombuffer(bsp.lumps[LUMP_DRAWINDEXES], dtype="<i4").copy()
+        self.lightmaps = bsp.lumps[LUMP_LIGHTMAPS]
+        for name, data, size in (("shaders", self.shaders, SHADER_SIZE), ("fogs", self.fogs, FOG_SIZE),
+                                 ("drawverts", self.verts, DRAWVERT_SIZE)):
+            if len(data) % size:
+                raise ValueError(f"{name} lump size {len(data)} is not a multiple of {size}")
+
+    def store(self, bsp: BspFile):
+        bsp.lumps[LUMP_ENTITIES] = encode_entities(self.entities)
+        bsp.lumps[LUMP_SHADERS] = self.shaders
+        bsp.lumps[LUMP_MODELS] = _bytes(self.models)
+        bsp.lumps[LUMP_BRUSHES] = _bytes(self.brushes)
+        bsp.lumps[LUMP_BRUSHSIDES] = _bytes(self.brushsides)
+        bsp.lumps[LUMP_LEAFS] = _bytes(self.leafs)
+        bsp.lumps[LUMP_LEAFSURFACES] = _bytes(self.leafsurfaces)
+        bsp.lumps[LUMP_LEAFBRUSHES] = _bytes(self.leafbrushes)
+        bsp.lumps[LUMP_SURFACES] = _bytes(self.surfaces)
+        bsp.lumps[LUMP_FOGS] = self.fogs
+        bsp.lumps[LUMP_DRAWVERTS] = self.verts
+        bsp.lumps[LUMP_DRAWINDEXES] = _bytes(self.indexes)
+        bsp.lumps[LUMP_LIGHTMAPS] = self.lightmaps
+
+
+def _inline_model(keys: dict):
+    value = keys.get("model", "")
+    if value.startswith("*") and value[1:].isdigit():
+        return int(value[1:])
+    return None
+
+
+def drop_unused_models(lumps: Lumps) -> int:
+    """Remove inline models no entity points at; returns how many went."""
+    keep = np.zeros(len(lumps.models), dtype=bool)
+    keep[:1] = True  # model 0 is the world
+    for keys in lumps.entities:
+        n = _inline_model(keys)
+        if n is not None and n < len(keep):
+            keep[n] = True
+    if keep.all():
+        return 0
+
+    keep_surface = np.ones(len(lumps.surfaces), dtype=bool)
+    keep_brush = np.ones(len(lumps.brushes), dtype=bool)
+    # Kept models win where ranges overlap
+    for models, used in ((lumps.models[~keep], False), (lumps.models[keep], True)):
+        for model in models:
+            keep_surface[model[M_FIRST_SURFACE]:model[M_FIRST_SURFACE] + model[M_NUM_SURFACES]] = used
+            keep_brush[model[M_FIRST_BRUSH]:model[M_FIRST_BRUSH] + model[M_NUM_BRUSHES]] = used
+    surface_map = _compact_map(keep_surface)
+    brush_map = _compact_map(keep_brush)
+
+    models = lumps.models[keep]
+    for model in models:
+        # Ranges of kept models are untouched, so they stay contiguous
+        model[M_FIRST_SURFACE] = np.count_nonzero(keep_surface[:model[M_FIRST_SURFACE]])
+        model[M_FIRST_BRUSH] = np.count_nonzero(keep_brush[:model[M_FIRST_BRUSH]])
+    # Leaf lists only reference world surfaces and brushes, which are all kept
+    lumps.leafsurfaces = surface_map[lumps.leafsurfaces].astype("<i4")
+    lumps.leafbrushes = brush_map[lumps.leafbrushes].astype("<i4")
+    lumps.surfaces = lumps.surfaces[keep_surface]
+
+    brushes = lumps.brushes[keep_brush]
+    sides = []
+    first = 0
+    for brush in brushes:
+        sides.append(lumps.brushsides[brush[B_FIRST_SIDE]:brush[B_FIRST_SIDE] + brush[B_NUM_SIDES]])
+        brush[B_FIRST_SIDE] = first
+        first += brush[B_NUM_SIDES]
+    lumps.brushes = brushes
+    lumps.brushsides = np.concatenate(sides) if sides else lumps.brushsides[:0]
+
+    if lumps.fogs:
+        fogs = np.frombuffer(lumps.fogs, dtype="<i4").reshape(-1, FOG_SIZE // 4).copy()
+        fogs[:, FOG_BRUSH] = np.where(fogs[:, FOG_BRUSH] >= 0, brush_map[fogs[:, FOG_BRUSH]], -1)
+        lumps.fogs = _bytes(fogs)
+
+    model_map = _compact_map(keep)
+    for keys in lumps.entities:
+        n = _inline_model(keys)
+        if n is not None and n < len(model_map):
+            keys["model"] = f"*{model_map[n]}"
+    lumps.models = models
+    return int((~keep).sum())
+
+
+def _surface_geometry(verts: bytes, indexes: np.ndarray, surface: np.ndarray) -> bytes:
+    """The vertex data a surface actually draws, in draw order."""
+    first, count = surface[S_FIRST_VERT], surface[S_NUM_VERTS]
+    if not count:
+        return b""
+    block = np.frombuffer(verts, dtype=f"V{DRAWVERT_SIZE}", count=count, offset=first * DRAWVERT_SIZE)
+    if surface[S_TYPE] in (MST_PLANAR, MST_TRIANGLE_SOUP):
+        run = indexes[surface[S_FIRST_INDEX]:surface[S_FIRST_INDEX] + surface[S_NUM_INDEXES]]
+        return block[run].tobytes()
+    return block.tobytes()
+
+
+class _Packer:
+    """Append-only element buffer that shares identical blocks.
+
+    A block already placed is found by a dict lookup, otherwise it is
+    overlapped with the tail of the previous block as far as they agree
+    (q3map2 already shares index runs this way, so plain appending would
+    grow the lump). With `max_subrun` set, every run of up to that many
+    elements inside an appended block is remembered too, so a short index
+    run can reuse part of a longer one. All of this is bounded work per
+    block, so packing stays linear in the lump size.
+    """
+
+    def __init__(self, size: int, max_subrun: int = 0):
+        self.size = size
+        self.max_subrun = max_subrun
+        self.buffer = bytearray()
+        self.offsets = {}
+        self.last = b""
+
+    def place(self, item: bytes) -> int:
+        """Element offset of `item`, appending only what is missing."""
+        offset = self.offsets.get(item)
+        if offset is not None:
+            return offset
+        size = self.size
+        overlap = min(len(item), len(self.last)) - size
+        while overlap > 0 and not self.buffer.endswith(item[:overlap]):
+            overlap -= size
+        start = (len(self.buffer) - max(overlap, 0)) // size
+        self.buffer += item[max(overlap, 0):]
+        self.last = item
+        self.offsets[item] = start
+        count = len(item) // size
+        for i in range(count):
+            for j in range(i + 1, min(count, i + self.max_subrun) + 1):
+                self.offsets.setdefault(item[i * size:j * size], start + i)
+        return start
+
+
+def rebuild_geometry(lumps: Lumps):
+    """Weld vertices per surface and share identical vertex blocks and index runs.
+
+    The renderer reads each surface's vertices as the range firstVert ..
+    firstVert + numVerts and its indexes relative to firstVert, so a block
+    can be shared between surfaces but never split. Patches keep their
+    control grid layout; only whole identical grids are shared.
+    """
+    verts = _Packer(DRAWVERT_SIZE)
+    indexes = _Packer(4, max_subrun=MAX_SHARED_RUN)
+    drawn = [_surface_geometry(lumps.verts, lumps.indexes, s) for s in lumps.surfaces]
+    for surface in lumps.surfaces:
+        first, count = surface[S_FIRST_VERT], surface[S_NUM_VERTS]
+        block = np.frombuffer(lumps.verts, dtype=f"V{DRAWVERT_SIZE}", count=count,
+                              offset=first * DRAWVERT_SIZE)
+        run = lumps.indexes[surface[S_FIRST_INDEX]:surface[S_FIRST_INDEX] + surface[S_NUM_INDEXES]]
+        if count and surface[S_TYPE] in (MST_PLANAR, MST_TRIANGLE_SOUP) and len(run):
+            # Weld byte-identical vertices, keeping the original order
+            unique, first_seen, inverse = np.unique(block, return_index=True, return_inverse=True)
+            order = np.argsort(first_seen)
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            block = unique[order]
+            run = rank[inverse.ravel()[run]].astype("<i4")
+        surface[S_FIRST_VERT] = verts.place(block.tobytes()) if count else 0
+        surface[S_NUM_VERTS] = len(block)
+        surface[S_FIRST_INDEX] = indexes.place(run.tobytes()) if len(run) else 0
+        surface[S_NUM_INDEXES] = len(run)
+
+    verts = bytes(verts.buffer)
+    indexes = np.frombuffer(bytes(indexes.buffer), dtype="<i4").copy()
+    for i, surface in enumerate(lumps.surfaces):
+        if _surface_geometry(verts, indexes, surface) != drawn[i]:
+            raise ValueError(f"internal error: surface {i} draws different geometry after welding")
+    lumps.verts = verts
+    lumps.indexes = indexes
+
+
+def drop_unused_shaders(lumps: Lumps) -> int:
+    count = len(lumps.shaders) // SHADER_SIZE
+    used = np.concatenate([lumps.surfaces[:, S_SHADER], lumps.brushes[:, B_SHADER],
+                           lumps.brushsides[:, BS_SHADER]])
+    keep = np.zeros(count, dtype=bool)
+    keep[used[(used >= 0) & (used < count)]] = True
+    if keep.all():
+        return 0
+    remap = _compact_map(keep)
+    lumps.shaders = b"".join(lumps.shaders[i * SHADER_SIZE:(i + 1) * SHADER_SIZE]
+                             for i in np.flatnonzero(keep))
+    for records, column in ((lumps.surfaces, S_SHADER), (lumps.brushes, B_SHADER),
+                            (lumps.brushsides, BS_SHADER)):
+        valid = records[:, column] >= 0
+        records[valid, column] = remap[records[valid, column]]
+    return int((~keep).sum())
+
+
+def drop_unused_fogs(lumps: Lumps) -> int:
+    count = len(lumps.fogs) // FOG_SIZE
+    fog_nums = lumps.surfaces[:, S_FOG]
+    keep = np.zeros(count, dtype=bool)
+    keep[fog_nums[(fog_nums >= 0) & (fog_nums < count)]] = True
+    if keep.all():
+        return 0
+    remap = _compact_map(keep)
+    lumps.fogs = b"".join(lumps.fogs[i * FOG_SIZE:(i + 1) * FOG_SIZE] for i in np.flatnonzero(keep))
+    valid = fog_nums >= 0
+    lumps.surfaces[valid, S_FOG] = remap[fog_nums[valid]]
+    return int((~keep).sum())
+
+
+def quantize_lightmaps(data: bytes, bits: int) -> bytes:
+    """Round every channel to `bits` of precision, spread back over 0..255.
+
+    The lump stays the same size; the lost low bits are what makes it
+    deflate smaller in a pk3 and over the wire.
+    """
+    levels = (1 << bits) - 1
+    pixels = np.frombuffer(data, dtype=np.uint8).astype(np.float32)
+    steps = np.rint(pixels * levels / 255.0)
+    return np.rint(steps * 255.0 / levels).astype(np.uint8).tobytes()
+
+
+def optimize_lightmaps(lumps: Lumps, bits: int = 8) -> tuple:
+    """Drop unreferenced and duplicate pages; returns (dropped, merged).
+
+    External lightmaps (q3map2 -external) leave the lump empty and
+    negative lightmapNum values are vertex/none sentinels, so both pass
+    through untouched. Quantizing first lets near-identical pages merge.
+    """
+    if not lumps.lightmaps:
+        return 0, 0
+    if len(lumps.lightmaps) % LIGHTMAP_PAGE:
+        raise ValueError(f"lightmaps lump size {len(lumps.lightmaps)} is not a multiple of {LIGHTMAP_PAGE}")
+    data = quantize_lightmaps(lumps.lightmaps, bits) if bits < 8 else lumps.lightmaps
+    count = len(data) // LIGHTMAP_PAGE
+    nums = lumps.surfaces[:, S_LIGHTMAP]
+    remap = np.full(count, -1, dtype=np.int64)
+    pages = {}
+    for n in sorted(set(nums[(nums >= 0) & (nums < count)].tolist())):
+        page = data[n * LIGHTMAP_PAGE:(n + 1) * LIGHTMAP_PAGE]
+        remap[n] = pages.setdefault(page, len(pages))
+    referenced = int((remap >= 0).sum())
+    lumps.lightmaps = b"".join(pages)
+    valid = (nums >= 0) & (nums < count)
+    lumps.surfaces[valid, S_LIGHTMAP] = remap[nums[valid]]
+    return count - referenced, referenced - len(pages)
+
+
+def validate(bsp: BspFile) -> list:
+    """Cross-lump consistency problems that would crash or confuse the engine."""
+    problems = []
+    lumps = Lumps(bsp)
+    num_shaders = len(lumps.shaders) // SHADER_SIZE
+    num_fogs = len(lumps.fogs) // FOG_SIZE
+    num_verts = len(lumps.verts) // DRAWVERT_SIZE
+    num_lightmaps = len(lumps.lightmaps) // LIGHTMAP_PAGE
+    num_surfaces = len(lumps.surfaces)
+    num_brushes = len(lumps.brushes)
+
+    def check_range(what, first, count, size):
+        if first < 0 or count < 0 or first + count > size:
+            problems.append(f"{what}: range {first}+{count} outside 0..{size}")
+            return False
+        return True
+
+    for i, s in enumerate(lumps.surfaces):
+        what = f"surface {i}"
+        if not 0 <= s[S_SHADER] < num_shaders:
+            problems.append(f"{what}: shader {s[S_SHADER]} of {num_shaders}")
+        if not -1 <= s[S_FOG] < num_fogs:
+            problems.append(f"{what}: fog {s[S_FOG]} of {num_fogs}")
+        if s[S_LIGHTMAP] >= num_lightmaps and lumps.lightmaps:
+            problems.append(f"{what}: lightmap {s[S_LIGHTMAP]} of {num_lightmaps}")
+        check_range(f"{what} verts", s[S_FIRST_VERT], s[S_NUM_VERTS], num_verts)
+        if check_range(f"{what} indexes", s[S_FIRST_INDEX], s[S_NUM_INDEXES], len(lumps.indexes)):
+            run = lumps.indexes[s[S_FIRST_INDEX]:s[S_FIRST_INDEX] + s[S_NUM_INDEXES]]
+            if len(run) and (run.min() < 0 or run.max() >= s[S_NUM_VERTS]):
+                problems.append(f"{what}: index outside its {s[S_NUM_VERTS]} vertices")
+    for i, m in enumerate(lumps.models):
+        check_range(f"model {i} surfaces", m[M_FIRST_SURFACE], m[M_NUM_SURFACES], num_surfaces)
+        check_range(f"model {i} brushes", m[M_FIRST_BRUSH], m[M_NUM_BRUSHES], num_brushes)
+    for i, b in enumerate(lumps.brushes):
+        check_range(f"brush {i} sides", b[B_FIRST_SIDE], b[B_NUM_SIDES], len(lumps.brushsides))
+        if not -1 <= b[B_SHADER] < num_shaders:
+            problems.append(f"brush {i}: shader {b[B_SHADER]} of {num_shaders}")
+    side_shaders = lumps.brushsides[:, BS_SHADER]
+    if len(side_shaders) and (side_shaders.min() < -1 or side_shaders.max() >= num_shaders):
+        problems.append("brush side shader out of range")
+    for i, leaf in enumerate(lumps.leafs):
+        check_range(f"leaf {i} surfaces", leaf[8], leaf[9], len(lumps.leafsurfaces))
+        check_range(f"leaf {i} brushes", leaf[10], leaf[11], len(lumps.leafbrushes))
+    for name, refs, size in (("leafsurface", lumps.leafsurfaces, num_surfaces),
+                             ("leafbrush", lumps.leafbrushes, num_brushes)):
+        if len(refs) and (refs.min() < 0 or refs.max() >= size):
+            problems.append(f"{name} reference out of range")
+    for keys in lumps.entities:
+        n = _inline_model(keys)
+        if n is not None and n >= len(lumps.models):
+            problems.append(f"entity {keys.get('classname', '?')} references *{n} of {len(lumps.models)}")
+    return problems
+
+
+def optimize(bsp: BspFile, lightmap_bits: int = 8) -> tuple:
+    """Return (optimized BspFile, dict of what each pass removed)."""
+    lumps = Lumps(bsp)
+    stats = {
+        "models": drop_unused_models(lumps),
+        "shaders": 0,
+        "fogs": 0,
+    }
+    verts_before = len(lumps.verts) // DRAWVERT_SIZE
+    indexes_before = len(lumps.indexes)
+    rebuild_geometry(lumps)
+    stats["drawverts"] = verts_before - len(lumps.verts) // DRAWVERT_SIZE
+    stats["drawindexes"] = indexes_before - len(lumps.indexes)
+    stats["shaders"] = drop_unused_shaders(lumps)
+    stats["fogs"] = drop_unused_fogs(lumps)
+    stats["lightmaps"], stats["merged lightmaps"] = optimize_lightmaps(lumps, lightmap_bits)
+
+    out = BspFile(list(bsp.lumps), list(bsp.order), bsp.version, bsp.header_extra)
+    lumps.store(out)
+    problems = validate(out)
+    if problems:
+        raise ValueError("optimized BSP failed validation: " + "; ".join(problems[:5]))
+    return out, stats
+
+
+def _deflated(data: bytes) -> int:
+    return len(zlib.compress(data, 9))
+
+
+def print_report(path: str, before: BspFile, after: BspFile, stats: dict):
+    removed = ", ".join(f"{n} {what}" for what, n in stats.items() if n)
+    print(f"{path}: removed {removed or 'nothing'}")
+    print(f"  {'lump':<13s} {'before':>10s} {'after':>10s} {'saved':>9s}")
+    for i in before.order:
+        old, new = len(before.lumps[i]), len(after.lumps[i])
+        if old != new:
+            print(f"  {LUMP_NAMES[i]:<13s} {old:10d} {new:10d} {old - new:9d}")
+    old, new = before.size(), after.size()
+    print(f"  {'total':<13s} {old:10d} {new:10d} {old - new:9d} ({100.0 * (old - new) / old:.1f}%)")
+    old_z, new_z = _deflated(encode_bsp(before)), _deflated(encode_bsp(after))
+    print(f"  {'deflated':<13s} {old_z:10d} {new_z:10d} {old_z - new_z:9d} "
+          f"({100.0 * (old_z - new_z) / old_z:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate and strip unused data from compiled BSPs")
+    parser.add_argument("bsp", nargs="+", help="Compiled .bsp file(s)")
+    parser.add_argument("-o", "--output", help="Output path (default: rewrite in place; one input only)")
+    parser.add_argument("--lightmap-bits", type=int, default=8, choices=range(4, 9), metavar="4-8",
+                        help="Quantize lightmap channels to this many bits (default: 8, lossless)")
+    parser.add_argument("--dry-run", action="store_true", help="Report savings, write nothing")
+    args = parser.parse_args()
+    if args.output and len(args.bsp) > 1:
+        parser.error("--output takes a single input BSP")
+
+    code = 0
+    for path in args.bsp:
+        try:
+            before = read_bsp(path)
+            after, stats = optimize(before, args.lightmap_bits)
+            print_report(path, before, after, stats)
+            if not args.dry_run:
+                out_path = args.output or path
+                write_bsp(out_path, after)
+                print(f"  wrote {out_path}")
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {path}: {e}", file=sys.stderr)
+            code = 1
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""Build a minimal pk3 per map from what its compiled BSP actually references.
+
+Dependencies are collected the way the renderer and game resolve them:
+  - shaders of the BSP's draw surfaces and fogs; shader lump entries used
+    only by brush sides (caulk, clip, other nodraw tool shaders) are
+    never loaded by the renderer and are left out
+  - entity keys: model/model2 (.md3 and other model files), noise and
+    music sounds, and the world models of the items the generators place
+  - every md3 is opened for its per-surface shader names
+  - each shader is looked up in the scripts/*.shader files; a scripted
+    shader contributes its map/clampMap/animMap/videoMap images and
+    skyParms env boxes, an unscripted one is an implicit texture
+    (name.tga, falling back to .jpg/.png like R_FindImageFile)
+
+Assets are looked up in a virtual filesystem built from the --path entries
+in order: each entry's loose files, then its pk3s in name order, so pk3s
+override loose files and later entries override earlier ones (Q3 search
+order). The pk3 holds the BSP, one scripts/<map>.shader with just the
+shaders used, and each referenced file once. Entries are sorted, dated
+1980-01-01 and compressed at a fixed level, so unchanged inputs give a
+byte-identical pk3. Already-compressed formats (jpg, png, ogg) are stored.
+
+Player models, HUD graphics and weapon view models are loaded by the game
+code for every map and belong in the core pak, not here.
+
+Usage:
+    python3 tools/pack_pk3.py maps/qfcity1.bsp
+    python3 tools/pack_pk3.py maps/*.bsp --out-dir build/pk3 --index deps.json
+    python3 tools/pack_pk3.py maps/parkour1.bsp --path ~/q3/baseq3 --path gamedata --strict
+
+Default search path: external/ioq3/build-native/Release/demoq3, gamedata.
+Exit code is 1 if any BSP could not be read, or with --strict if an asset
+is missing.
+"""
+
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import zipfile
+
+from bsp_file import LUMP_FOGS, LUMP_SHADERS, LUMP_SURFACES, parse_entities, read_bsp
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+DEFAULT_PATHS = [
+    os.path.join(PROJECT_DIR, "external", "ioq3", "build-native", "Release", "demoq3"),
+    os.path.join(PROJECT_DIR, "gamedata"),
+]
+
+IMAGE_EXTENSIONS = (".tga", ".jpg", ".jpeg", ".png", ".pcx", ".bmp")
+SOUND_EXTENSIONS = (".wav", ".ogg", ".opus")
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".ogg", ".opus", ".pk3", ".roq"}
+SKY_SIDES = ("rt", "bk", "lf", "ft", "up", "dn")
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+# Item world models (bg_misc.c bg_itemlist) for the classnames our
+# generators place. The game registers these when the item spawns.
+ITEM_MODELS = {
+    "item_armor_body": ["models/powerups/armor/armor_red.md3"],
+    "item_armor_combat": ["models/powerups/armor/armor_yel.md3"],
+    "item_health_large": ["models/powerups/health/large_cross.md3",
+                          "models/powerups/health/large_sphere.md3"],
+    "item_health": ["models/powerups/health/medium_cross.md3",
+                    "models/powerups/health/medium_sphere.md3"],
+    "weapon_shotgun": ["models/weapons2/shotgun/shotgun.md3"],
+    "weapon_grenadelauncher": ["models/weapons2/grenadel/grenadel.md3"],
+    "weapon_rocketlauncher": ["models/weapons2/rocketl/rocketl.md3"],
+    "weapon_lightning": ["models/weapons2/lightning/lightning.md3"],
+    "weapon_railgun": ["models/weapons2/railgun/railgun.md3"],
+    "weapon_plasmagun": ["models/weapons2/plasma/plasma.md3"],
+    "ammo_shells": ["models/powerups/ammo/shotgunam.md3"],
+    "ammo_grenades": ["models/powerups/ammo/grenadeam.md3"],
+    "ammo_cells": ["models/powerups/ammo/plasmaam.md3"],
+    "ammo_lightning": ["models/powerups/ammo/lightningam.md3"],
+    "ammo_rockets": ["models/powerups/ammo/rocketam.md3"],
+    "ammo_slugs": ["models/powerups/ammo/railgunam.md3"],
+}
+
+
+# --- Virtual filesystem ---
+
+class AssetFS:
+    """Case-insensitive view over loose directories and pk3 archives."""
+
+    def __init__(self, paths: list):
+        self.files = {}        # lower path -> (source, name in source, size)
+        self.sources = []      # (label, bytes) of every pk3 / loose tree
+        self._zips = {}
+        for path in paths:
+            self._add_path(path)
+
+    def _add_path(self, path: str):
+        if os.path.isfile(path) and path.lower().endswith(".pk3"):
+            self._add_pk3(path)
+            return
+        if not os.path.isdir(path):
+            return
+        loose = 0
+        pk3s = []
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, path).replace(os.sep, "/")
+                if name.lower().endswith(".pk3") and "/" not in rel:
+                    pk3s.append(full)
+                    continue
+                size = os.path.getsize(full)
+                self.files[rel.lower()] = (path, rel, size)
+                loose += size
+        if loose:
+            self.sources.append((path, loose))
+        for pk3 in sorted(pk3s, key=str.lower):
+            self._add_pk3(pk3)
+
+    def _add_pk3(self, path: str):
+        try:
+            archive = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"WARNING: skipping {path}: {e}", file=sys.stderr)
+            return
+        self._zips[path] = archive
+        for info in archive.infolist():
+            if not info.is_dir():
+                self.files[info.filename.lower()] = (path, info.filename, info.file_size)
+        self.sources.append((path, os.path.getsize(path)))
+
+    def find(self, name: str):
+        """Canonical stored name for `name`, or None."""
+        entry = self.files.get(name.lower().lstrip("/"))
+        return entry[1] if entry else None
+
+    def find_any(self, name: str, extensions: tuple):
+        """Try `name` as given, then with each alternative extension."""
+        found = self.find(name)
+        if found:
+            return found
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in extensions:
+            base = name
+        for alt in extensions:
+            found = self.find(base + alt)
+            if found:
+                return found
+        return None
+
+    def read(self, name: str) -> bytes:
+        source, stored, _ = self.files[name.lower()]
+        if source in self._zips:
+            return self._zips[source].read(stored)
+        with open(os.path.join(source, stored), "rb") as f:
+            return f.read()
+
+    def source_of(self, name: str) -> str:
+        return self.files[name.lower()][0]
+
+    def glob(self, prefix: str, suffix: str) -> list:
+        return sorted(self.files[k][1] for k in self.files
+                      if k.startswith(prefix) and k.endswith(suffix) and "/" not in k[len(prefix):])
+
+    def close(self):
+        for archive in self._zips.values():
+            archive.close()
+
+
+# --- Shader scripts ---
+
+_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_TOKENS = re.compile(r"[{}]|[^\s{}]+")
+
+
+class ShaderDef:
+    __slots__ = ("name", "script", "text", "images", "optional_images")
+
+    def __init__(self, name, script, text, images, optional_images):
+        self.name = name
+        self.script = script
+        self.text = text
+        self.images = images                    # must exist
+        self.optional_images = optional_images  # sky sides: engine tolerates gaps
+
+
+def _shader_images(body: str):
+    images, optional = [], []
+    body = body.replace("{", "\n{\n").replace("}", "\n}\n")
+    for line in body.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        key = words[0].lower()
+        if key in ("map", "clampmap") and len(words) > 1:
+            if not words[1].startswith("$"):
+                images.append(words[1])
+        elif key == "animmap" and len(words) > 2:
+            images.extend(w for w in words[2:] if not w.startswith("$"))
+        elif key == "videomap" and len(words) > 1:
+            images.append("video/" + words[1])
+        elif key == "skyparms" and len(words) > 1:
+            for box in (words[1], words[3] if len(words) > 3 else "-"):
+                if box != "-":
+                    optional.extend(f"{box}_{side}" for side in SKY_SIDES)
+    return images, optional
+
+
+def parse_shader_script(text: str, script: str) -> list:
+    """Return the ShaderDefs in one .shader file, in file order."""
+    text = _COMMENTS.sub("", text)
+    shaders = []
+    depth = 0
+    name = None
+    start = block_start = 0
+    for m in _TOKENS.finditer(text):
+        token = m.group(0)
+        if token == "{":
+            if depth == 0:
+                block_start = m.end()
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth < 0:
+                raise ValueError(f"{script}: unbalanced '}}' at offset {m.start()}")
+            if depth == 0 and name is not None:
+                images, optional = _shader_images(text[block_start:m.start()])
+                shaders.append(ShaderDef(name, script, text[start:m.end()], images, optional))
+                name = None
+        elif depth == 0:
+            name, start = token, m.start()
+    return shaders
+
+
+def load_shaders(fs: AssetFS) -> dict:
+    """{lower name: ShaderDef}; the first definition in script order wins."""
+    table = {}
+    for script in fs.glob("scripts/", ".shader"):
+        try:
+            defs = parse_shader_script(fs.read(script).decode("latin-1"), script)
+        except ValueError as e:
+            print(f"WARNING: {e}", file=sys.stderr)
+            continue
+        for shader in defs:
+            table.setdefault(shader.name.lower(), shader)
+    return table
+
+
+# --- Reference scanning ---
+
+def bsp_shader_names(bsp) -> list:
+    """Shaders the renderer loads: those of draw surfaces, and fogs."""
+    shaders = bsp.lumps[LUMP_SHADERS]
+    surfaces = bsp.lumps[LUMP_SURFACES]
+    used = sorted({struct.unpack_from("<i", surfaces, i)[0]
+                   for i in range(0, len(surfaces) - 103, 104)})    # shaderNum is the first field
+    names = []
+    for index in used:
+        if 0 <= index < len(shaders) // 72:                # name[64], flags, contents
+            names.append(shaders[index * 72:index * 72 + 64].split(b"\0", 1)[0].decode("latin-1"))
+    fogs = bsp.lumps[LUMP_FOGS]
+    for i in range(0, len(fogs) - 71, 72):            # name[64], brushNum, visibleSide
+        names.append(fogs[i:i + 64].split(b"\0", 1)[0].decode("latin-1"))
+    return names
+
+
+def md3_shader_names(data: bytes) -> list:
+    """Per-surface shader names of an MD3 model."""
+    if len(data) < 108 or data[:4] != b"IDP3":
+        return []
+    num_surfaces, = struct.unpack_from("<i", data, 84)
+    offset, = struct.unpack_from("<i", data, 100)
+    names = []
+    for _ in range(num_surfaces):
+        if offset + 108 > len(data) or data[offset:offset + 4] != b"IDP3":
+            break
+        num_shaders, = struct.unpack_from("<i", data, offset + 76)
+        ofs_shaders, = struct.unpack_from("<i", data, offset + 92)
+        ofs_end, = struct.unpack_from("<i", data, offset + 104)
+        for s in range(num_shaders):
+            at = offset + ofs_shaders + s * 68
+            name = data[at:at + 64].split(b"\0", 1)[0].decode("latin-1")
+            if name:
+                names.append(name)
+        if ofs_end <= 0:
+            break
+        offset += ofs_end
+    return names
+
+
+def entity_references(entities: list):
+    """(models, sounds) named by entity keys."""
+    models, sounds = [], []
+    for ent in entities:
+        classname = ent.get("classname", "")
+        models.extend(ITEM_MODELS.get(classname, []))
+        for key in ("model", "model2"):
+            value = ent.get(key, "")
+            if value and not value.startswith("*"):
+                models.append(value)
+        noise = ent.get("noise", "")
+        if noise and not noise.startswith("*"):
+            sounds.append(noise)
+        if classname == "worldspawn":
+            sounds.extend(ent.get("music", "").split())
+    return models, sounds
+
+
+class Dependencies:
+    """Everything one map needs, resolved against an AssetFS."""
+
+    def __init__(self, fs: AssetFS, shaders: dict):
+        self.fs = fs
+        self.shaders = shaders
+        self.files = {}          # stored name -> reason
+        self.shader_defs = {}    # lower name -> ShaderDef
+        self.missing = {}        # requested name -> reason
+        self._seen_shaders = set()
+
+    def _add_file(self, name: str, reason: str):
+        self.files.setdefault(name, reason)
+
+    def add_image(self, name: str, reason: str, optional: bool = False):
+        found = self.fs.find_any(name, IMAGE_EXTENSIONS)
+        if found:
+            self._add_file(found, reason)
+        elif not optional:
+            self.missing.setdefault(name, reason)
+
+    def add_shader(self, name: str, reason: str):
+        base, ext = os.path.splitext(name)
+        key = (base if ext.lower() in IMAGE_EXTENSIONS else name).lower()
+        if not key or key == "noshader" or key in self._seen_shaders:
+            return
+        self._seen_shaders.add(key)
+        shader = self.shaders.get(key)
+        if shader is None:
+            self.add_image(name, reason)          # implicit texture
+            return
+        self.shader_defs[key] = shader
+        for image in shader.images:
+            self.add_image(image, f"shader {shader.name}")
+        for image in shader.optional_images:
+            self.add_image(image, f"sky {shader.name}", optional=True)
+
+    def add_model(self, name: str, reason: str):
+        found = self.fs.find(name)
+        if not found:
+            self.missing.setdefault(name, reason)
+            return
+        self._add_file(found, reason)
+        if found.lower().endswith(".md3"):
+            for shader in md3_shader_names(self.fs.read(found)):
+                self.add_shader(shader, f"model {found}")
+            # the game also tries <model>_1.md3 / _2.md3 for LOD
+            base = found[:-4]
+            for lod in ("_1.md3", "_2.md3"):
+                if self.fs.find(base + lod):
+                    self.add_model(base + lod, reason)
+
+    def add_sound(self, name: str, reason: str):
+        found = self.fs.find_any(name, SOUND_EXTENSIONS)
+        if found:
+            self._add_file(found, reason)
+        else:
+            self.missing.setdefault(name, reason)
+
+    def shader_script(self, map_name: str) -> str:
+        parts = [f"// Shaders used by {map_name} (generated by tools/pack_pk3.py)\n"]
+        for key in sorted(self.shader_defs):
+            shader = self.shader_defs[key]
+            parts.append(f"\n// from {shader.script}\n{shader.text.strip()}\n")
+        return "".join(parts)
+
+
+def collect(bsp_path: str, fs: AssetFS, shaders: dict) -> Dependencies:
+    bsp = read_bsp(bsp_path)
+    deps = Dependencies(fs, shaders)
+    for name in bsp_shader_names(bsp):
+        deps.add_shader(name, "bsp")
+    models, sounds = entity_references(parse_entities(bsp.entity_text()))
+    for model in models:
+        deps.add_model(model, "entity")
+    for sound in sounds:
+        deps.add_sound(sound, "entity")
+    return deps
+
+
+# --- Packing ---
+
+def _zip_entry(name: str) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+    info.external_attr = 0o644 << 16
+    info.create_system = 3
+    stored = os.path.splitext(name)[1].lower() in STORED_EXTENSIONS
+    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    return info
+
+
+def write_pk3(out_path: str, entries: dict) -> int:
+    """Write {name: bytes} deterministically; returns the pk3 size."""
+    tmp = out_path + ".tmp"
+    with zipfile.ZipFile(tmp, "w", compresslevel=9) as z:
+        for name in sorted(entries, key=str.lower):
+            z.writestr(_zip_entry(name), entries[name])
+    os.replace(tmp, out_path)
+    return os.path.getsize(out_path)
+
+
+def pack_map(bsp_path: str, fs: AssetFS, shaders: dict, out_dir: str, dry_run: bool):
+    map_name = os.path.splitext(os.path.basename(bsp_path))[0]
+    deps = collect(bsp_path, fs, shaders)
+
+    entries = {}
+    with open(bsp_path, "rb") as f:
+        entries[f"maps/{map_name}.bsp"] = f.read()
+    if deps.shader_defs:
+        entries[f"scripts/{map_name}.shader"] = deps.shader_script(map_name).encode("latin-1")
+    for name in deps.files:
+        entries[name] = fs.read(name)
+
+    out_path = os.path.join(out_dir, f"{map_name}.pk3")
+    size = None
+    if not dry_run:
+        os.makedirs(out_dir, exist_ok=True)
+        size = write_pk3(out_path, entries)
+    return deps, entries, out_path, size
+
+
+def dependency_index(bsp_path: str, deps: Dependencies, fs: AssetFS) -> dict:
+    return {
+        "bsp": bsp_path,
+        "shaders": {
+            shader.name: {"script": shader.script,
+                          "images": shader.images,
+                          "sky": shader.optional_images}
+            for shader in (deps.shader_defs[k] for k in sorted(deps.shader_defs))
+        },
+        "files": {name: {"from": fs.source_of(name), "reason": reason}
+                  for name, reason in sorted(deps.files.items())},
+        "missing": dict(sorted(deps.missing.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a minimal per-map pk3 from BSP references")
+    parser.add_argument("bsp", nargs="+", help="Compiled .bsp file(s)")
+    parser.add_argument("--path", action="append", default=None,
+                        help="Asset directory or pk3, in search order (repeatable; default: demoq3 + gamedata)")
+    parser.add_argument("--out-dir", default=None, help="Where to write <map>.pk3 (default: next to the BSP)")
+    parser.add_argument("--index", help="Write the dependency index (JSON) to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Resolve and report without writing pk3s")
+    parser.add_argument("--strict", action="store_true", help="Exit 1 if any referenced asset is missing")
+    args = parser.parse_args()
+
+    paths = args.path if args.path is not None else DEFAULT_PATHS
+    fs = AssetFS([os.path.expanduser(p) for p in paths])
+    shaders = load_shaders(fs)
+    baseline = sum(size for _, size in fs.sources)
+    print(f"Search path: {len(fs.files)} files, {len(shaders)} scripted shaders, "
+          f"{baseline / 1e6:.2f} MB across {len(fs.sources)} source(s)")
+
+    index = {}
+    failed = missing_total = 0
+    for bsp_path in args.bsp:
+        try:
+            deps, entries, out_path, size = pack_map(
+                bsp_path, fs, shaders, args.out_dir or os.path.dirname(bsp_path) or ".", args.dry_run)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {bsp_path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        raw = sum(len(data) for data in entries.values())
+        print(f"\n{bsp_path}: {len(deps.shader_defs)} scripted shaders, {len(deps.files)} asset files, "
+              f"{len(deps.missing)} missing")
+        if size is None:
+            print(f"  would write {out_path} ({len(entries)} entries, {raw / 1e6:.2f} MB uncompressed)")
+        else:
+            saved = baseline + os.path.getsize(bsp_path) - size
+            print(f"  wrote {out_path}: {size / 1e6:.2f} MB ({len(entries)} entries, "
+                  f"{raw / 1e6:.2f} MB uncompressed)")
+            print(f"  vs search path + bsp: {(baseline + os.path.getsize(bsp_path)) / 1e6:.2f} MB, "
+                  f"saved {saved / 1e6:.2f} MB")
+        for name, reason in sorted(deps.missing.items()):
+            print(f"  MISSING {name}  ({reason})")
+        missing_total += len(deps.missing)
+        index[bsp_path] = dependency_index(bsp_path, deps, fs)
+
+    if args.index:
+        with open(args.index, "w") as f:
+            json.dump(index, f, indent=1)
+            f.write("\n")
+        print(f"\nWrote dependency index to {args.index}")
+    fs.close()
+    if failed or (args.strict and missing_total):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
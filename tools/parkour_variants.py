@@ -0,0 +1,514 @@
+"""Randomized parkour courses for tools/generate_parkour_map.py --seed.
+
+A variant is a spawn room, a sampled sequence of sections joined by short
+corridors, and an end room. Each section kind has a sampler, a builder
+(brushes and lights) and a set of checks against an analytic movement
+model. Ledge rises and vault heights are drawn from the model's own limits,
+so every kind can appear at every difficulty. Gap, pit and tunnel ranges
+widen with difficulty and rely on the checks to reject what is out of reach:
+
+  wallrun   pit between two tall walls; length within one wall run
+            (speed * wallrun_duration) plus a double jump
+  gaps      pits between platforms at different heights; each gap within
+            the jump reach for its rise (double jump allowed), and the
+            ceiling above the double-jump apex plus standing height
+  slide     ramp down into a low tunnel and back up; tunnel clearance at
+            least crouch height but below standing height, ramp steps
+            no taller than step_height
+  ledges    climbing tower of alternating ledges; every rise within the
+            double-jump apex, and the gap across to the next ledge within
+            the reach for that rise
+  vaults    row of waist-height obstacles; each within the jump apex, with
+            room to land between them
+
+Reach is computed in closed form for Q3 movement (constant gravity, jump
+sets the vertical velocity, full run speed kept in the air). A double jump
+is taken when the downward speed u satisfies u^2 = E / 2 with
+E = v2^2 + 2g(h1 - rise), which maximizes air time; a player's bbox adds
+half_width beyond each lip. Checks use a fraction of the limits
+(0.75 at difficulty 0 up to 0.95 at difficulty 1), so easy courses leave
+more room for error. A variant with any failing check is rejected and
+resampled from the same random stream, so a seed always yields the same
+course.
+
+MOVEMENT mirrors the server movement settings; override entries with
+generate_parkour_map.py --set NAME=VALUE when they are retuned.
+"""
+
+import json
+import math
+import os
+import random
+import sys
+
+from generate_parkour_map import (
+    FLOOR_T, SECTION_GAP, TEX_CAULK, TEX_FLOOR, TEX_FLOOR2, TEX_OBSTACLE, TEX_ROOF,
+    TEX_WALL, TEX_WALL2, WALL_T, brush_box, corridor, entity, room_ceiling, room_floor, skybox,
+)
+
+MOVEMENT = {
+    "gravity": 800.0,               # g_gravity
+    "speed": 320.0,                 # g_speed, kept through jumps
+    "jump_velocity": 270.0,         # JUMP_VELOCITY in bg_pmove.c
+    "double_jump_velocity": 250.0,  # pm_doublejumpVelocity
+    "wallrun_duration": 1.0,        # pm_wallrunDuration, seconds
+    "step_height": 18.0,            # STEPSIZE
+    "half_width": 15.0,             # PLAYER_MAXS x
+    "stand_height": 56.0,           # PLAYER_MAXS z - PLAYER_MINS z
+    "crouch_height": 40.0,          # crouched maxs z (16) - mins z
+}
+
+KINDS = ["wallrun", "gaps", "slide", "ledges", "vaults"]
+PIT_Z = -192         # top of the pit floors
+SPAWN_LEN = 512
+END_LEN = 512
+ROOM_HALF_W = 256    # spawn/end rooms and corridors
+MAX_ATTEMPTS = 1000
+
+
+def _lerp(a, b, t):
+    return a + (b - a) * t
+
+
+def _snap(value, step, rounding=round):
+    return int(step * rounding(value / step))
+
+
+class Movement:
+    """Closed-form jump limits for the MOVEMENT parameters."""
+
+    def __init__(self, params: dict):
+        self.params = dict(params)
+        for name, value in self.params.items():
+            setattr(self, name, value)
+
+    def jump_apex(self) -> float:
+        return self.jump_velocity ** 2 / (2 * self.gravity)
+
+    def double_jump_apex(self) -> float:
+        return self.jump_apex() + self.double_jump_velocity ** 2 / (2 * self.gravity)
+
+    def airtime(self, rise: float, double: bool):
+        """Longest time in the air landing `rise` above takeoff; None if out of reach."""
+        g, v1, v2 = self.gravity, self.jump_velocity, self.double_jump_velocity
+        h1 = self.jump_apex()
+        if not double:
+            disc = v1 * v1 - 2 * g * rise
+            return (v1 + math.sqrt(disc)) / g if disc >= 0 else None
+        if rise > self.double_jump_apex():
+            return None
+        if rise > h1:
+            # Too high to fall first: double jump at the apex
+            return v1 / g + (v2 + math.sqrt(v2 * v2 - 2 * g * (rise - h1))) / g
+        energy = v2 * v2 + 2 * g * (h1 - rise)
+        # Not below the landing height when jumping again
+        u = min(math.sqrt(energy / 2), math.sqrt(2 * g * (h1 - rise)))
+        return (v1 + u + v2 + math.sqrt(energy - u * u)) / g
+
+    def reach(self, rise: float, double: bool = True) -> float:
+        """Widest gap, lip to lip, that can be crossed landing `rise` higher."""
+        t = self.airtime(rise, double)
+        return 0.0 if t is None else self.speed * t + 2 * self.half_width
+
+
+# ---------------------------------------------------------------------------
+# Section kinds: sample(rng, d, move, frac) -> params,
+# check(params, move, frac) -> checks,
+# build(params, y) -> (brushes, entities, length). A check is
+# (description, need, limit) and passes when need <= limit.
+# ---------------------------------------------------------------------------
+
+def sample_wallrun(rng, d, move, frac):
+    return {
+        "pit": _snap(rng.uniform(_lerp(256, 384, d), _lerp(448, 896, d)), 32),
+        "half_w": rng.choice([192, 256]),
+    }
+
+
+def check_wallrun(p, move, frac):
+    limit = move.speed * move.wallrun_duration + move.reach(0)
+    return [(f"wall run pit {p['pit']}", p["pit"], frac * limit)]
+
+
+def build_wallrun(p, y):
+    hw, pit = p["half_w"], p["pit"]
+    length = 128 + pit + 128
+    wall_h = 384
+    brushes = [
+        room_floor(-hw, y, hw, y + 128),
+        room_floor(-hw, y + length - 128, hw, y + length),
+        brush_box(-hw, y + 128, PIT_Z - FLOOR_T, hw, y + 128 + pit, PIT_Z,
+            {'top': TEX_FLOOR2, 'all': TEX_CAULK}),
+        brush_box(-hw - WALL_T, y, PIT_Z - FLOOR_T, -hw, y + length, wall_h, TEX_WALL2),
+        brush_box(hw, y, PIT_Z - FLOOR_T, hw + WALL_T, y + length, wall_h, TEX_WALL2),
+        room_ceiling(-hw, y, hw, y + length, wall_h),
+    ]
+    entities = [entity("light", origin=(0, y + 64, wall_h - 32), extra_keys={"light": "300"})]
+    return brushes, entities, length
+
+
+def sample_gaps(rng, d, move, frac):
+    count = rng.randint(2, 3 + round(2 * d))
+    gaps, rises, platforms = [], [], [128]
+    top = 0
+    for i in range(count):
+        gaps.append(_snap(rng.uniform(_lerp(96, 192, d), _lerp(224, 448, d)), 16))
+        if i == count - 1:
+            rise = -top  # the section exits at floor level
+        else:
+            rise = _snap(rng.uniform(-48, _lerp(24, 72, d)), 8)
+        rises.append(rise)
+        top += rise
+        platforms.append(128 if i == count - 1 else rng.choice([96, 128, 160, 192]))
+    return {
+        "gaps": gaps,
+        "rises": rises,
+        "platforms": platforms,
+        "ceiling": rng.choice([192, 224, 256, 320]),
+    }
+
+
+def check_gaps(p, move, frac):
+    checks = []
+    top = peak = 0
+    for i, (gap, rise) in enumerate(zip(p["gaps"], p["rises"])):
+        kind = "jump" if gap <= frac * move.reach(rise, double=False) else "double jump"
+        checks.append((f"gap {i + 1} {gap} rise {rise:+d} ({kind})", gap, frac * move.reach(rise)))
+        top += rise
+        peak = max(peak, top)
+    checks.append((f"headroom under ceiling {p['ceiling']}",
+                   peak + move.double_jump_apex() + move.stand_height, p["ceiling"]))
+    return checks
+
+
+def build_gaps(p, y):
+    hw = 256
+    length = sum(p["platforms"]) + sum(p["gaps"])
+    brushes = [brush_box(-hw, y, PIT_Z - FLOOR_T, hw, y + length, PIT_Z,
+        {'top': TEX_FLOOR2, 'all': TEX_CAULK})]
+    py, top = y, 0
+    rises = [0] + p["rises"]
+    gaps = p["gaps"] + [0]
+    for platform, rise, gap in zip(p["platforms"], rises, gaps):
+        top += rise
+        brushes.append(brush_box(-hw, py, PIT_Z, hw, py + platform, top,
+            {'top': TEX_FLOOR, 'sides': TEX_OBSTACLE, 'bottom': TEX_CAULK}))
+        py += platform + gap
+    brushes.append(brush_box(-hw - WALL_T, y, PIT_Z - FLOOR_T, -hw, y + length, p["ceiling"], TEX_WALL))
+    brushes.append(brush_box(hw, y, PIT_Z - FLOOR_T, hw + WALL_T, y + length, p["ceiling"], TEX_WALL))
+    brushes.append(room_ceiling(-hw, y, hw, y + length, p["ceiling"]))
+    entities = [entity("light", origin=(0, y + length // 2, p["ceiling"] - 56), extra_keys={"light": "400"})]
+    return brushes, entities, length
+
+
+def sample_slide(rng, d, move, frac):
+    return {
+        "drop": _snap(rng.uniform(32, _lerp(64, 128, d)), 8),
+        "steps": rng.randint(4, 10),
+        "tunnel": _snap(rng.uniform(_lerp(192, 256, d), _lerp(384, 768, d)), 16),
+        "clearance": _snap(rng.uniform(_lerp(44, 36, d), _lerp(56, 48, d)), 4),
+    }
+
+
+def check_slide(p, move, frac):
+    return [
+        (f"tunnel clearance {p['clearance']} fits crouched", move.crouch_height, p["clearance"]),
+        (f"tunnel clearance {p['clearance']} forces a crouch", p["clearance"], move.stand_height - 1),
+        (f"ramp step {p['drop'] / p['steps']:.1f}", p["drop"] / p["steps"], move.step_height),
+    ]
+
+
+def build_slide(p, y):
+    hw = 192
+    drop, steps = p["drop"], p["steps"]
+    ramp = steps * 16
+    length = 128 + ramp + p["tunnel"] + ramp + 128
+    tunnel_y1 = y + 128 + ramp
+    tunnel_y2 = tunnel_y1 + p["tunnel"]
+    stairs = {'top': TEX_FLOOR, 'all': TEX_CAULK}
+    brushes = [room_floor(-hw, y, hw, y + 128)]
+    for i in range(steps):
+        rz = -round(i * drop / steps)
+        brushes.append(brush_box(-hw, tunnel_y1 - ramp + i * 16, rz - WALL_T, hw, tunnel_y1 - ramp + (i + 1) * 16, rz,
+            stairs))
+    brushes.append(brush_box(-hw, tunnel_y1, -drop - WALL_T, hw, tunnel_y2, -drop, stairs))
+    low_ceil = -drop + p["clearance"]
+    brushes.append(brush_box(-hw, tunnel_y1, low_ceil, hw, tunnel_y2, low_ceil + WALL_T, TEX_ROOF))
+    for i in range(steps):
+        rz = -drop + round(i * drop / steps)
+        brushes.append(brush_box(-hw, tunnel_y2 + i * 16, rz - WALL_T, hw, tunnel_y2 + (i + 1) * 16, rz, stairs))
+    brushes.append(room_floor(-hw, y + length - 128, hw, y + length))
+    brushes.append(brush_box(-hw - WALL_T, y, -drop - FLOOR_T, -hw, y + length, 256, TEX_WALL))
+    brushes.append(brush_box(hw, y, -drop - FLOOR_T, hw + WALL_T, y + length, 256, TEX_WALL))
+    brushes.append(room_ceiling(-hw, y, hw, y + length, 256))
+    entities = [
+        entity("light", origin=(0, y + 64, 200), extra_keys={"light": "300"}),
+        entity("light", origin=(0, y + length - 64, 200), extra_keys={"light": "300"}),
+    ]
+    return brushes, entities, length
+
+
+def sample_ledges(rng, d, move, frac):
+    # Rises come from what the model can climb; difficulty only moves them closer to the limit
+    apex = move.double_jump_apex()
+    spacing = _snap(rng.uniform(0.5 * apex, frac * apex) - WALL_T, 8, math.floor)
+    across = min(128, frac * move.reach(spacing))
+    return {
+        "count": rng.randint(2, 3 + round(3 * d)),
+        "spacing": spacing,
+        "inner": _snap(rng.uniform(32, max(32, across / 2)), 8, math.floor),
+    }
+
+
+def check_ledges(p, move, frac):
+    spacing, across = p["spacing"], 2 * p["inner"]
+    return [
+        (f"first ledge rise {spacing + WALL_T}", spacing + WALL_T, frac * move.double_jump_apex()),
+        (f"ledge rise {spacing}", spacing, frac * move.double_jump_apex()),
+        (f"ledge gap {across} rise {spacing}", across, frac * move.reach(spacing)),
+    ]
+
+
+def build_ledges(p, y):
+    hw = 192
+    count, spacing, inner = p["count"], p["spacing"], p["inner"]
+    top_z = (count + 1) * spacing
+    tower_len = 64 + count * 96 + 128
+    tower_h = top_z + 128
+    ledge = {'top': TEX_FLOOR, 'all': TEX_OBSTACLE}
+    brushes = [room_floor(-hw, y, hw, y + tower_len)]
+    for i in range(count):
+        lz = (i + 1) * spacing
+        ly = y + 64 + i * 96
+        side = 1 if i % 2 == 0 else -1
+        x1, x2 = sorted((side * inner, side * (hw - 32)))
+        brushes.append(brush_box(x1, ly, lz, x2, ly + 96, lz + WALL_T, ledge))
+        # Back wall behind ledge
+        bx1, bx2 = sorted((side * (hw - 32), side * (hw - 16)))
+        brushes.append(brush_box(bx1, ly, lz - 64, bx2, ly + 96, lz + 64, TEX_WALL2))
+    brushes.append(brush_box(-hw, y + tower_len - 128, top_z, hw, y + tower_len, top_z + WALL_T,
+        {'top': TEX_FLOOR, 'all': TEX_CAULK}))
+    brushes.append(brush_box(-hw - WALL_T, y, 0, -hw, y + tower_len, tower_h, TEX_WALL))
+    brushes.append(brush_box(hw, y, 0, hw + WALL_T, y + tower_len, tower_h, TEX_WALL))
+    brushes.append(room_ceiling(-hw, y, hw, y + tower_len, tower_h))
+    entities = [entity("light", origin=(0, y + tower_len // 2, top_z + 64), extra_keys={"light": "400"})]
+
+    # Ramp back down to ground level
+    ry = y + tower_len
+    ramp_len, ramp_steps = 256, 16
+    for i in range(ramp_steps):
+        rz = top_z - i * (top_z / ramp_steps)
+        brushes.append(brush_box(-128, ry + i * 16, rz - WALL_T, 128, ry + (i + 1) * 16, rz,
+            {'top': TEX_FLOOR, 'all': TEX_CAULK}))
+    brushes.append(brush_box(-128 - WALL_T, ry, 0, -128, ry + ramp_len, tower_h, TEX_WALL))
+    brushes.append(brush_box(128, ry, 0, 128 + WALL_T, ry + ramp_len, tower_h, TEX_WALL))
+    brushes.append(room_ceiling(-128, ry, 128, ry + ramp_len, tower_h))
+    return brushes, entities, tower_len + ramp_len
+
+
+def sample_vaults(rng, d, move, frac):
+    # Taller than a step, within the jump apex
+    apex = frac * move.jump_apex()
+    height = rng.uniform(max(move.step_height + 4, 0.5 * apex), apex)
+    spacing = rng.uniform(max(2 * move.half_width, _lerp(128, 32, d)), _lerp(192, 128, d))
+    return {
+        "count": rng.randint(3, 3 + round(3 * d)),
+        "height": _snap(height, 4, math.floor),
+        "depth": rng.choice([16, 24, 32, 48]),
+        "spacing": _snap(spacing, 8, math.ceil),
+    }
+
+
+def check_vaults(p, move, frac):
+    return [
+        (f"obstacle height {p['height']}", p["height"], frac * move.jump_apex()),
+        (f"landing room {p['spacing']}", 2 * move.half_width, p["spacing"]),
+    ]
+
+
+def build_vaults(p, y):
+    hw = 192
+    pitch = p["depth"] + p["spacing"]
+    length = 128 + p["count"] * pitch - p["spacing"] + 128
+    brushes = [room_floor(-hw, y, hw, y + length)]
+    for i in range(p["count"]):
+        oy = y + 128 + i * pitch
+        brushes.append(brush_box(-hw // 2, oy, 0, hw // 2, oy + p["depth"], p["height"], TEX_OBSTACLE))
+    brushes.append(brush_box(-hw - WALL_T, y, 0, -hw, y + length, 256, TEX_WALL))
+    brushes.append(brush_box(hw, y, 0, hw + WALL_T, y + length, 256, TEX_WALL))
+    brushes.append(room_ceiling(-hw, y, hw, y + length, 256))
+    entities = [entity("light", origin=(0, y + length // 2, 200), extra_keys={"light": "400"})]
+    return brushes, entities, length
+
+
+SECTIONS = {
+    "wallrun": (sample_wallrun, check_wallrun, build_wallrun),
+    "gaps": (sample_gaps, check_gaps, build_gaps),
+    "slide": (sample_slide, check_slide, build_slide),
+    "ledges": (sample_ledges, check_ledges, build_ledges),
+    "vaults": (sample_vaults, check_vaults, build_vaults),
+}
+
+
+def reach_fraction(difficulty: float) -> float:
+    return _lerp(0.75, 0.95, difficulty)
+
+
+def sample_plan(rng: random.Random, difficulty: float, move: Movement) -> list:
+    """[(kind, params)] in course order; never the same kind twice in a row."""
+    plan = []
+    for _ in range(rng.randint(3, 5 + round(2 * difficulty))):
+        kind = rng.choice([k for k in KINDS if not plan or k != plan[-1][0]])
+        plan.append((kind, SECTIONS[kind][0](rng, difficulty, move, reach_fraction(difficulty))))
+    return plan
+
+
+def check_plan(plan: list, move: Movement, difficulty: float) -> list:
+    """[(section index, kind, checks)] with every check of every section."""
+    frac = reach_fraction(difficulty)
+    return [(i, kind, SECTIONS[kind][1](params, move, frac)) for i, (kind, params) in enumerate(plan)]
+
+
+def failures(checked: list) -> list:
+    return [(i, kind, what) for i, kind, checks in checked for what, need, limit in checks if need > limit]
+
+
+def generate_variant(seed: int, difficulty: float, move: Movement, stats: dict = None) -> dict:
+    """Sample plans from the seed until one passes every check.
+
+    stats, if given, counts rejections per section kind. Raises ValueError
+    when MAX_ATTEMPTS plans in a row fail (the movement model cannot reach
+    what this difficulty samples).
+    """
+    rng = random.Random(seed)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        plan = sample_plan(rng, difficulty, move)
+        checked = check_plan(plan, move, difficulty)
+        failed = failures(checked)
+        if not failed:
+            return {"seed": seed, "difficulty": difficulty, "attempts": attempt, "plan": plan, "checks": checked}
+        if stats is not None:
+            for kind in {kind for _, kind, _ in failed}:
+                stats[kind] = stats.get(kind, 0) + 1
+    raise ValueError(f"seed {seed}: no valid course in {MAX_ATTEMPTS} attempts at difficulty {difficulty:g}")
+
+
+def build_variant(variant: dict) -> str:
+    """Map text for a checked variant."""
+    hw = ROOM_HALF_W
+    brushes = [room_floor(-hw, 0, hw, SPAWN_LEN)]
+    # Spawn room, open to the north
+    brushes.append(brush_box(-hw - WALL_T, -WALL_T, 0, hw + WALL_T, 0, 256, TEX_WALL))
+    brushes.append(brush_box(-hw - WALL_T, 0, 0, -hw, SPAWN_LEN, 256, TEX_WALL))
+    brushes.append(brush_box(hw, 0, 0, hw + WALL_T, SPAWN_LEN, 256, TEX_WALL))
+    brushes.append(room_ceiling(-hw, 0, hw, SPAWN_LEN, 256))
+    entities = []
+    for i in range(4):
+        entities.append(entity("info_player_deathmatch",
+            origin=(-128 + (i % 2) * 256, 128 + (i // 2) * 256, 24), extra_keys={"angle": "90"}))
+    entities.append(entity("light", origin=(0, SPAWN_LEN // 2, 200), extra_keys={"light": "300"}))
+
+    y = SPAWN_LEN
+    for kind, params in variant["plan"]:
+        brushes.extend(corridor(-hw, y, hw, y + SECTION_GAP, z_ceil=256))
+        y += SECTION_GAP
+        section_brushes, section_entities, length = SECTIONS[kind][2](params, y)
+        brushes.extend(section_brushes)
+        entities.extend(section_entities)
+        y += length
+    brushes.extend(corridor(-hw, y, hw, y + SECTION_GAP, z_ceil=256))
+    y += SECTION_GAP
+
+    # End room, open to the south
+    brushes.append(room_floor(-hw, y, hw, y + END_LEN))
+    brushes.append(brush_box(-hw - WALL_T, y + END_LEN, 0, hw + WALL_T, y + END_LEN + WALL_T, 256, TEX_WALL))
+    brushes.append(brush_box(-hw - WALL_T, y, 0, -hw, y + END_LEN, 256, TEX_WALL))
+    brushes.append(brush_box(hw, y, 0, hw + WALL_T, y + END_LEN, 256, TEX_WALL))
+    brushes.append(room_ceiling(-hw, y, hw, y + END_LEN, 256))
+    entities.append(entity("info_player_deathmatch", origin=(0, y + 64, 24), extra_keys={"angle": "90"}))
+    entities.append(entity("light", origin=(0, y + END_LEN // 2, 200), extra_keys={"light": "300"}))
+    y += END_LEN
+
+    brushes.extend(skybox(-hw - 256, -256 - 256, hw + 256, y + 256, z_min=PIT_Z - 2 * FLOOR_T))
+    worldspawn = entity("worldspawn",
+        extra_keys={"message": f"Parkour Variant {variant['seed']} (difficulty {variant['difficulty']:g})",
+                    "music": ""},
+        brushes=brushes)
+    return "\n".join([worldspawn] + entities)
+
+
+def describe(variant: dict) -> dict:
+    """JSON-friendly summary: sections, parameters and the tightest check."""
+    sections = []
+    slack = math.inf
+    for (kind, params), (_, _, checks) in zip(variant["plan"], variant["checks"]):
+        sections.append({
+            "kind": kind,
+            "params": params,
+            "checks": [[what, round(need, 1), round(limit, 1)] for what, need, limit in checks],
+        })
+        slack = min([slack] + [limit - need for _, need, limit in checks])
+    return {
+        "seed": variant["seed"],
+        "difficulty": variant["difficulty"],
+        "attempts": variant["attempts"],
+        "min_slack": round(slack, 1),
+        "sections": sections,
+    }
+
+
+def variant_name(seed: int, difficulty: float) -> str:
+    return f"parkour_d{round(difficulty * 100):03d}_s{seed}"
+
+
+def write_variants(first_seed: int, count: int, difficulty: float, move: Movement, out_dir: str,
+                   validate: bool = False) -> int:
+    """Write `count` checked variants and merge them into out_dir/manifest.json; returns an exit status."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = {entry["file"]: entry for entry in json.load(f)["variants"]}
+    try:
+        from map_binary import write_for_map
+    except ImportError:
+        write_for_map = None
+        print("  Binary maps: skipped (needs numpy)")
+    if validate:
+        from validate_entities import check_file
+
+    rejected = {}
+    attempts = 0
+    status = 0
+    for seed in range(first_seed, first_seed + count):
+        try:
+            variant = generate_variant(seed, difficulty, move, rejected)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        attempts += variant["attempts"]
+        name = variant_name(seed, difficulty) + ".map"
+        out_path = os.path.join(out_dir, name)
+        with open(out_path, "w") as f:
+            f.write(build_variant(variant))
+        if write_for_map is not None:
+            write_for_map(out_path)
+        entry = describe(variant)
+        entry["file"] = name
+        entry["movement"] = move.params
+        manifest[name] = entry
+        print(f"  {name}: {' > '.join(kind for kind, _ in variant['plan'])}  "
+              f"(tightest slack {entry['min_slack']:g}, {variant['attempts']} attempt(s))")
+        if validate and check_file(out_path):
+            status = 1
+
+    with open(manifest_path, "w") as f:
+        json.dump({"variants": [manifest[k] for k in sorted(manifest)]}, f, indent=1)
+        f.write("\n")
+    print(f"Generated {count} variant(s) in {out_dir} at difficulty {difficulty:g}, "
+          f"{attempts - count} rejected")
+    if rejected:
+        print("  rejections by section: " + ", ".join(f"{k} {n}" for k, n in sorted(rejected.items())))
+    print(f"  Manifest: {manifest_path}")
+    return status
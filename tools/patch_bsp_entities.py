@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Patch the entity lump of a compiled BSP when only point entities changed.
+
+tools/compile_map.sh keeps a copy of every .map it compiles in
+maps/.compiled/. This tool compares a regenerated .map against that
+snapshot. When brushes, brush entities and compile-time entities (lights,
+misc_model, ...) are unchanged and only gameplay point entities (spawns,
+weapons, items) moved or changed, it rewrites just the BSP entity lump and
+the lump directory. BSP, VIS and LIGHT are skipped entirely.
+
+Usage:
+    python3 tools/patch_bsp_entities.py maps/qfcity1.map
+    python3 tools/patch_bsp_entities.py maps/qfcity1.map --dry-run
+
+Exit codes:
+    0  BSP patched, or nothing changed
+    2  a full compile is needed (reason printed)
+    1  error
+
+Requires: numpy
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from bsp_file import LUMP_ENTITIES, encode_entities, parse_entities, read_bsp, write_bsp
+from map_parser import load_map
+
+# Point entities q3map2 consumes at compile time and strips from the BSP.
+# Changing them changes geometry or lighting, so they cannot be patched.
+LIGHT_CLASSES = {"light", "lightJunior"}
+STRUCTURAL_POINT_CLASSES = {"misc_model", "_decal", "_skybox"}
+# Brush entities merged into the world by q3map2
+MERGED_BRUSH_CLASSES = {"worldspawn", "func_group"}
+# Worldspawn keys the game reads at runtime; anything else steers the compiler
+RUNTIME_WORLDSPAWN_KEYS = {"message", "music", "gravity", "enableDust", "enableBreath"}
+
+
+def snapshot_path(map_file: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(map_file)), ".compiled",
+                        os.path.basename(map_file))
+
+
+def _brush_signature(m, e: int):
+    """Everything about entity e's brushes that q3map2 compiles."""
+    brushes = m.entity_brushes(e)
+    if not len(brushes):
+        return None
+    s = slice(int(m.brush_plane_start[brushes.start]), int(m.brush_plane_start[brushes.stop]))
+    return (
+        m.plane_points[s].tobytes(),
+        tuple(m.textures[t] for t in m.plane_texture[s]),
+        m.plane_texparams[s].tobytes(),
+        m.plane_flags[s].tobytes(),
+        np.diff(m.brush_plane_start[brushes.start:brushes.stop + 1]).tobytes(),
+    )
+
+
+def split_entities(m) -> dict:
+    """Group a parsed map's entities by how q3map2 treats them.
+
+    Returns lists of key dicts under "worldspawn", "brush" (entities with
+    brushes, plus their signature), "light", "structural" and "game".
+    """
+    groups = {"worldspawn": {}, "brush": [], "light": [], "structural": [], "game": []}
+    for e, keys in enumerate(m.entities):
+        classname = keys.get("classname", "")
+        sig = _brush_signature(m, e)
+        if classname == "worldspawn":
+            groups["worldspawn"] = keys
+            groups["brush"].append((keys.get("classname"), sig))
+        elif sig is not None:
+            groups["brush"].append((dict(keys), sig))
+        elif classname in LIGHT_CLASSES:
+            groups["light"].append(keys)
+        elif classname in STRUCTURAL_POINT_CLASSES:
+            groups["structural"].append(keys)
+        else:
+            groups["game"].append(keys)
+    return groups
+
+
+def light_targets(groups: dict) -> set:
+    """targetnames aimed at by lights (spotlight targets affect LIGHT)."""
+    return {keys["target"] for keys in groups["light"] if "target" in keys}
+
+
+def classify_changes(old, new) -> dict:
+    """Compare two parsed maps by what a change would force q3map2 to redo.
+
+    Returns {"structural": [reasons], "lights": bool, "game": bool,
+    "worldspawn_runtime": bool}; an empty structural list with lights False
+    means the BSP entity lump can simply be rewritten.
+    """
+    a = split_entities(old)
+    b = split_entities(new)
+    reasons = []
+
+    if a["brush"] != b["brush"]:
+        reasons.append("brushes or brush entities changed")
+    if a["structural"] != b["structural"]:
+        reasons.append("misc_model/_decal/_skybox entities changed")
+
+    ws_a = {k: v for k, v in a["worldspawn"].items() if k not in RUNTIME_WORLDSPAWN_KEYS}
+    ws_b = {k: v for k, v in b["worldspawn"].items() if k not in RUNTIME_WORLDSPAWN_KEYS}
+    if ws_a != ws_b:
+        reasons.append("worldspawn compile keys changed")
+    runtime_ws = a["worldspawn"] != b["worldspawn"] and ws_a == ws_b
+
+    lights = a["light"] != b["light"]
+    # Moving a spotlight's target entity changes lighting too
+    targets = light_targets(a) | light_targets(b)
+    if targets:
+        tgt_a = [k for k in a["game"] if k.get("targetname") in targets]
+        tgt_b = [k for k in b["game"] if k.get("targetname") in targets]
+        lights = lights or tgt_a != tgt_b
+
+    return {
+        "structural": reasons,
+        "lights": lights,
+        "game": a["game"] != b["game"],
+        "worldspawn_runtime": runtime_ws,
+    }
+
+
+def build_entity_lump(new, lump_entities: list) -> list:
+    """New entity list for the BSP: compiled worldspawn and brush models from
+    the existing lump, point entities from the new map, in the new map's order.
+    """
+    world = dict(lump_entities[0])
+    new_ws = next((k for k in new.entities if k.get("classname") == "worldspawn"), {})
+    for key in RUNTIME_WORLDSPAWN_KEYS:
+        if key in new_ws:
+            world[key] = new_ws[key]
+        else:
+            world.pop(key, None)
+
+    models = [keys for keys in lump_entities[1:] if "model" in keys]
+    model_iter = iter(models)
+    out = [world]
+    for e, keys in enumerate(new.entities):
+        classname = keys.get("classname", "")
+        if classname in MERGED_BRUSH_CLASSES:
+            continue
+        if len(new.entity_brushes(e)):
+            out.append(next(model_iter))
+        elif classname in LIGHT_CLASSES or classname in STRUCTURAL_POINT_CLASSES:
+            continue
+        else:
+            out.append(dict(keys))
+    return out
+
+
+def rewrite_entity_lump(old, new, bsp_file: str, dry_run: bool = False):
+    """Replace the point entities in bsp_file's entity lump with new's.
+
+    `old` is the map the BSP was compiled from. Returns (exit code, message):
+    0 on success, 2 when the BSP does not line up with `old`, 1 on a
+    malformed lump.
+    """
+    bsp = read_bsp(bsp_file)
+    lump = parse_entities(bsp.entity_text())
+    if not lump or lump[0].get("classname") != "worldspawn":
+        return 1, f"{bsp_file}: entity lump does not start with worldspawn"
+
+    # The BSP must have been built from the snapshot, or its model list
+    # and our brush entities would not line up.
+    compiled_game = [k for k in lump[1:] if "model" not in k]
+    if compiled_game != split_entities(old)["game"]:
+        return 2, f"{bsp_file} does not match its compile snapshot; full compile needed"
+    n_models = sum(1 for k in lump[1:] if "model" in k)
+    n_brush_ents = sum(1 for e, k in enumerate(new.entities)
+                       if k.get("classname") not in MERGED_BRUSH_CLASSES and len(new.entity_brushes(e)))
+    if n_models != n_brush_ents:
+        return 2, f"{bsp_file}: {n_models} brush models but map has {n_brush_ents}; full compile needed"
+
+    entities = build_entity_lump(new, lump)
+    old_size = len(bsp.lumps[LUMP_ENTITIES])
+    bsp.lumps[LUMP_ENTITIES] = encode_entities(entities)
+    new_size = len(bsp.lumps[LUMP_ENTITIES])
+    before = len(split_entities(old)["game"])
+    after = len(split_entities(new)["game"])
+
+    if dry_run:
+        return 0, (f"Would patch {bsp_file}: {before} -> {after} point entities, "
+                   f"entity lump {old_size} -> {new_size} bytes")
+    total = write_bsp(bsp_file, bsp)
+    return 0, (f"Patched {bsp_file}: {before} -> {after} point entities, "
+               f"entity lump {old_size} -> {new_size} bytes, BSP {total} bytes")
+
+
+def patch(map_file: str, bsp_file: str, dry_run: bool = False) -> int:
+    """Try to patch bsp_file from map_file. Returns the process exit code."""
+    t0 = time.perf_counter()
+    snap = snapshot_path(map_file)
+    if not os.path.exists(snap):
+        print(f"No compile snapshot at {snap}; full compile needed")
+        return 2
+    if not os.path.exists(bsp_file):
+        print(f"No BSP at {bsp_file}; full compile needed")
+        return 2
+
+    old = load_map(snap)
+    new = load_map(map_file)
+    changes = classify_changes(old, new)
+    if changes["structural"]:
+        print("Full compile needed: " + "; ".join(changes["structural"]))
+        return 2
+    if changes["lights"]:
+        print("LIGHT pass needed: light entities changed")
+        return 2
+    if not changes["game"] and not changes["worldspawn_runtime"]:
+        print(f"{map_file}: no changes since last compile")
+        return 0
+
+    code, message = rewrite_entity_lump(old, new, bsp_file, dry_run)
+    if code != 0:
+        print(message, file=sys.stderr if code == 1 else sys.stdout)
+        return code
+    if not dry_run:
+        os.makedirs(os.path.dirname(snap), exist_ok=True)
+        shutil.copyfile(map_file, snap)
+        message += f" ({(time.perf_counter() - t0) * 1000:.0f} ms)"
+    print(message)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite a BSP entity lump for entity-only .map edits")
+    parser.add_argument("map_file", help="Regenerated .map file")
+    parser.add_argument("--bsp", help="BSP to patch (default: <map>.bsp)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change, write nothing")
+    args = parser.parse_args()
+
+    bsp_file = args.bsp or os.path.splitext(args.map_file)[0] + ".bsp"
+    try:
+        code = patch(args.map_file, bsp_file, args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        code = 1
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""Sample ioq3ded health over RCON into a time series, alongside its log.
+
+Every --interval seconds the sampler sends `status` over one persistent
+RCON socket (tools/rcon.py RconSession) and reads whatever the server
+appended to its log since the previous sample. `serverinfo` and each --cvar
+change rarely, so they are only queried every --info-every samples and
+right after a map change; rows in between carry their last values.
+Each sample is one row:
+
+  t              unix time of the sample
+  map            current map (serverinfo mapname)
+  players, bots  connected clients, and how many of them are bots
+  max_clients    sv_maxclients
+  ping_avg/max   ping of connected human clients
+  rcon_ms        slowest RCON round trip of the sample; the server only
+                 answers between frames, so this rises with frame time
+  <event>        log events of each kind since the previous sample
+  hitch_ms_max   longest hitch reported in that time
+  cvar_<name>    value of each --cvar
+
+Log events are matched line by line (EVENT_PATTERNS, extended with
+--event NAME=REGEX for lines the game module prints):
+
+  map_change     InitGame, i.e. a map load or map_restart
+  hitch          "Hitch warning: N msec frame time"
+  overflow       reliable/snapshot message overflows
+  titan_drop     titan pod calls and landings
+  connect, disconnect, kill
+
+ioq3 limits rcon per source address to a burst of 10 requests, refilled
+at one per second (SVC_RateLimitAddress(from, 10, 1000)), and requests
+beyond that are dropped without a reply. The sampler keeps a copy of that
+bucket and never sends past it, and it refuses settings whose average rate
+is over 1 request per second. Other tools on the same host (rcon.py,
+visual_test.sh) share the same budget, so the defaults use about 0.6/s.
+
+The dedicated server's log has no wall-clock time, so events are stamped
+when they are read: their resolution is the sample interval. Every event
+is also written with its line to the events file.
+
+Rows are kept in a fixed-size columnar ring and appended to CSV whenever
+it fills, every --flush seconds, and on exit. If a flush fails the ring
+keeps overwriting its oldest rows rather than growing. Between samples the
+sampler sleeps, so it can run for a whole playtest next to the server:
+
+Usage:
+    tools/server.sh start
+    python3 tools/perf_sampler.py                       # every 2s, until Ctrl-C
+    python3 tools/perf_sampler.py --interval 1.5 --info-every 20 --cvar sv_fps --cvar g_speed
+    python3 tools/perf_sampler.py --port 27970 --duration 600 --out /tmp/pool0
+    python3 tools/perf_sampler.py --event "embark=forceembark|Embark"
+
+Output (default --out /tmp/ioq3ded_perf):
+    <out>.samples.csv   one row per sample
+    <out>.events.csv    t,kind,value,line for every matched log line
+
+Requires: numpy
+"""
+
+import argparse
+import math
+import os
+import re
+import signal
+import sys
+import time
+
+import numpy as np
+
+from rcon import RconSession
+from server_pool import log_path
+
+DEFAULT_PORT = 27960
+DEFAULT_LOG = "/tmp/ioq3ded.log"  # tools/server.sh LOG_FILE
+DEFAULT_OUT = "/tmp/ioq3ded_perf"
+DEFAULT_CVARS = ["sv_fps"]
+RCON_BURST = 10      # SVC_RateLimitAddress(from, 10, 1000) in ioq3's sv_main.c
+RCON_PERIOD = 1.0    # seconds per request regained, i.e. 1 rcon/s sustained
+DEFAULT_INTERVAL = 2.0
+DEFAULT_INFO_EVERY = 10
+RING_CAPACITY = 600
+
+# (kind, regex); the first group, if any, is the event's value
+EVENT_PATTERNS = [
+    ("map_change", r"InitGame: .*\\mapname\\([^\\]*)"),
+    ("hitch", r"Hitch warning: (\d+) msec frame time"),
+    ("overflow", r"(?i)overflow"),
+    ("titan_drop", r"(?i)\btitan\b.*\b(?:call|drop|pod|land)"),
+    ("connect", r"ClientConnect: (\d+)"),
+    ("disconnect", r"ClientDisconnect: (\d+)"),
+    ("kill", r"\bKill: (\d+) \d+ \d+"),
+]
+
+# Fixed sample columns and their CSV format; None means text
+BASE_COLUMNS = [
+    ("t", "%.3f"),
+    ("map", None),
+    ("players", "%d"),
+    ("bots", "%d"),
+    ("max_clients", "%d"),
+    ("ping_avg", "%.1f"),
+    ("ping_max", "%d"),
+    ("rcon_ms", "%.1f"),
+]
+
+
+class SamplerError(Exception):
+    pass
+
+
+class RconBudget:
+    """Client-side copy of the server's per-address rcon bucket.
+
+    Unlike the server, the count never goes below zero, so the copy errs
+    on the side of sending less.
+    """
+
+    def __init__(self, burst: int = RCON_BURST, period: float = RCON_PERIOD):
+        self.burst = burst
+        self.period = period
+        self.used = 0
+        self.last = time.monotonic()
+
+    def available(self) -> int:
+        now = time.monotonic()
+        expired = int((now - self.last) / self.period)
+        if expired >= self.used:
+            self.used = 0
+            self.last = now
+        else:
+            self.used -= expired
+            self.last += expired * self.period
+        return self.burst - self.used
+
+    def take(self, count: int = 1) -> bool:
+        """Spend count requests if all of them fit now."""
+        if self.available() < count:
+            return False
+        self.used += count
+        return True
+
+
+class Ring:
+    """Fixed-capacity columnar buffer of rows; overwrites the oldest when full."""
+
+    def __init__(self, columns: list, capacity: int):
+        self.columns = columns
+        self.capacity = capacity
+        self.data = {name: np.full(capacity, np.nan) if fmt else np.full(capacity, "", dtype=object)
+                     for name, fmt in columns}
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+
+    def append(self, row: dict):
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.count -= 1
+            self.dropped += 1
+        index = (self.start + self.count) % self.capacity
+        for name, fmt in self.columns:
+            value = row.get(name)
+            if fmt:
+                self.data[name][index] = np.nan if value is None else value
+            else:
+                self.data[name][index] = "" if value is None else str(value)
+        self.count += 1
+
+    def full(self) -> bool:
+        return self.count == self.capacity
+
+    def rows(self):
+        order = (self.start + np.arange(self.count)) % self.capacity
+        return [self.data[name][order] for name, _ in self.columns]
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+
+def _csv_text(value: str) -> str:
+    if any(c in value for c in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _csv_cell(value, fmt) -> str:
+    if fmt is None:
+        return _csv_text(value)
+    if math.isnan(value):
+        return ""
+    return fmt % value
+
+
+def open_csv(path: str, header: list):
+    """Open path for appending, writing the header if new; it must match an existing one."""
+    line = ",".join(header) + "\n"
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path) as f:
+            if f.readline() != line:
+                raise SamplerError(f"{path} has different columns; use another --out")
+        return open(path, "a")
+    f = open(path, "w")
+    f.write(line)
+    return f
+
+
+def flush(ring: Ring, out) -> int:
+    """Append the ring's rows to out; returns the number written."""
+    if not ring.count:
+        return 0
+    fmts = [fmt for _, fmt in ring.columns]
+    columns = ring.rows()
+    lines = [",".join(_csv_cell(value, fmt) for value, fmt in zip(values, fmts))
+             for values in zip(*columns)]
+    out.write("\n".join(lines) + "\n")
+    out.flush()
+    written = ring.count
+    ring.clear()
+    return written
+
+
+class LogTail:
+    """New complete lines of a log file; follows truncation by server.sh start."""
+
+    def __init__(self, path: str, from_start: bool = False):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        if not from_start and os.path.exists(path):
+            self.offset = os.path.getsize(path)
+
+    def read(self) -> list:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:
+            self.offset = 0
+            self.partial = b""
+        if size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+
+
+def match_events(lines: list, patterns: list) -> list:
+    """(kind, value, line) for each line matching a pattern; first match wins."""
+    events = []
+    for line in lines:
+        for kind, regex in patterns:
+            m = regex.search(line)
+            if m:
+                events.append((kind, m.group(1) if m.groups() else "", line))
+                break
+    return events
+
+
+def parse_status(text: str) -> dict:
+    """Player counts and pings from an rcon `status` reply."""
+    lines = text.splitlines()
+    rows = []
+    for i, line in enumerate(lines):
+        if line.startswith("---"):
+            rows = [l.split() for l in lines[i + 1:] if l.strip()]
+            break
+    pings = []
+    bots = 0
+    for fields in rows:
+        if len(fields) < 7 or not fields[0].isdigit():
+            continue
+        if fields[-3] == "bot":
+            bots += 1
+        elif fields[2].isdigit():  # CNCT / ZMBI while connecting or dropping
+            pings.append(int(fields[2]))
+    players = len([f for f in rows if len(f) >= 7 and f[0].isdigit()])
+    return {
+        "players": players,
+        "bots": bots,
+        "ping_avg": sum(pings) / len(pings) if pings else None,
+        "ping_max": max(pings) if pings else None,
+    }
+
+
+def parse_serverinfo(text: str) -> dict:
+    """Key/value pairs from an rcon `serverinfo` reply."""
+    info = {}
+    for line in text.splitlines()[1:]:
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            info[parts[0]] = parts[1].strip()
+    return info
+
+
+_CVAR_RE = re.compile(r'"([^"]+)" is:"(.*?)(?:\^7)?"')
+
+
+def parse_cvar(text: str):
+    m = _CVAR_RE.search(text)
+    return m.group(2) if m else None
+
+
+class Sampler:
+    def __init__(self, session: RconSession, tail: LogTail, cvars: list, patterns: list, info_every: int):
+        self.session = session
+        self.budget = RconBudget()
+        self.info_every = info_every
+        self.info = {}       # last serverinfo/cvar values, carried into every row
+        self.info_due = True
+        self.tail = tail
+        self.cvars = cvars
+        self.patterns = patterns
+        self.kinds = [kind for kind, _ in patterns]
+        self.columns = (BASE_COLUMNS + [(kind, "%d") for kind in self.kinds] + [("hitch_ms_max", "%d")]
+                        + [("cvar_" + name, None) for name in cvars])
+        self.totals = {kind: 0 for kind in self.kinds}
+        self.slowest_ms = 0.0
+        self.unanswered = 0
+        self.throttled = 0
+        self.samples = 0
+
+    def _query(self, command: str, row: dict):
+        text, ms = self.session.command(command)
+        if ms is None:
+            return None
+        if text.startswith("Bad rconpassword") or text.startswith("No rconpassword"):
+            raise SamplerError(text.strip())
+        row["rcon_ms"] = max(row.get("rcon_ms") or 0.0, ms)
+        return text
+
+    def sample(self) -> tuple:
+        """One row, and the log events read for it."""
+        row = {"t": time.time()}
+        events = match_events(self.tail.read(), self.patterns)
+        if self.samples % self.info_every == 0 or any(kind == "map_change" for kind, _, _ in events):
+            self.info_due = True
+        self.samples += 1
+
+        if not self.budget.take():
+            self.throttled += 1
+            status = None
+        else:
+            status = self._query("status", row)
+            if status is None:
+                self.unanswered += 1
+        if status is not None:
+            row.update(parse_status(status))
+            # All of the slow queries or none, so a refresh is never half done
+            if self.info_due and self.budget.take(1 + len(self.cvars)):
+                self.info_due = False
+                info = self._query("serverinfo", row)
+                if info is not None:
+                    info = parse_serverinfo(info)
+                    self.info["map"] = info.get("mapname")
+                    if info.get("sv_maxclients", "").isdigit():
+                        self.info["max_clients"] = int(info["sv_maxclients"])
+                for name in self.cvars:
+                    reply = self._query(name, row)
+                    if reply is not None:
+                        self.info["cvar_" + name] = parse_cvar(reply)
+        row.update(self.info)
+        if row.get("rcon_ms"):
+            self.slowest_ms = max(self.slowest_ms, row["rcon_ms"])
+
+        for kind in self.kinds:
+            row[kind] = 0
+        for kind, value, _ in events:
+            row[kind] += 1
+            self.totals[kind] += 1
+            if kind == "hitch" and value.isdigit():
+                row["hitch_ms_max"] = max(row.get("hitch_ms_max") or 0, int(value))
+        return row, events
+
+
+def parse_event_option(spec: str) -> tuple:
+    name, sep, regex = spec.partition("=")
+    if not sep or not re.fullmatch(r"[a-z][a-z0-9_]*", name):
+        raise argparse.ArgumentTypeError(f"expected NAME=REGEX with a lowercase name: {spec!r}")
+    try:
+        return name, re.compile(regex)
+    except re.error as e:
+        raise argparse.ArgumentTypeError(f"bad regex in {spec!r}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample ioq3ded performance over RCON into CSV time series")
+    parser.add_argument("--host", default="127.0.0.1", help="Server host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Server port (default: {DEFAULT_PORT})")
+    parser.add_argument("--password", default=os.environ.get("QF_RCON", "dev"),
+                        help="RCON password (default: $QF_RCON or dev)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"Seconds between samples (default {DEFAULT_INTERVAL:g})")
+    parser.add_argument("--info-every", type=int, default=DEFAULT_INFO_EVERY,
+                        help=f"Query serverinfo and cvars every N samples (default {DEFAULT_INFO_EVERY})")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds (default: until Ctrl-C)")
+    parser.add_argument("--cvar", action="append", dest="cvars",
+                        help=f"Cvar to record, repeatable (default: {' '.join(DEFAULT_CVARS)})")
+    parser.add_argument("--event", action="append", type=parse_event_option, default=[],
+                        metavar="NAME=REGEX", help="Extra log event kind, repeatable")
+    parser.add_argument("--log", help=f"Server log to follow (default: {DEFAULT_LOG}, or the "
+                                      "server_pool.py log for other ports)")
+    parser.add_argument("--from-start", action="store_true", help="Also match lines already in the log")
+    parser.add_argument("--out", default=DEFAULT_OUT, help=f"Output path prefix (default: {DEFAULT_OUT})")
+    parser.add_argument("--flush", type=float, default=30.0, help="Seconds between CSV flushes (default 30)")
+    parser.add_argument("--timeout", type=float, default=0.5, help="RCON reply timeout in seconds (default 0.5)")
+    args = parser.parse_args()
+
+    cvars = args.cvars or DEFAULT_CVARS
+    if args.info_every < 1:
+        parser.error("--info-every must be at least 1")
+    per_sample = 1 + (1 + len(cvars)) / args.info_every
+    if per_sample / args.interval > 1 / RCON_PERIOD:
+        parser.error(f"{per_sample:.2f} rcon commands every {args.interval:g}s exceeds the server's sustained "
+                     f"limit of {1 / RCON_PERIOD:g}/s; raise --interval or --info-every, or drop cvars")
+    log = args.log or (DEFAULT_LOG if args.port == DEFAULT_PORT else log_path(args.port))
+    patterns = [(kind, re.compile(regex)) for kind, regex in EVENT_PATTERNS] + args.event
+
+    session = RconSession(args.host, args.port, args.password, args.timeout)
+    sampler = Sampler(session, LogTail(log, args.from_start), cvars, patterns, args.info_every)
+    ring = Ring(sampler.columns, RING_CAPACITY)
+    try:
+        samples_out = open_csv(args.out + ".samples.csv", [name for name, _ in sampler.columns])
+        events_out = open_csv(args.out + ".events.csv", ["t", "kind", "value", "line"])
+    except (OSError, SamplerError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    print(f"Sampling {args.host}:{args.port} every {args.interval:g}s, log {log} -> {args.out}.*.csv "
+          "(Ctrl-C to stop)", flush=True)
+    t_start = time.monotonic()
+    next_tick = t_start
+    last_flush = t_start
+    samples = 0
+    written = 0
+    try:
+        while not stop:
+            if args.duration is not None and time.monotonic() - t_start >= args.duration:
+                break
+            row, events = sampler.sample()
+            ring.append(row)
+            samples += 1
+            for kind, value, line in events:
+                events_out.write(f"{row['t']:.3f},{kind},{_csv_text(value)},{_csv_text(line)}\n")
+            now = time.monotonic()
+            if ring.full() or now - last_flush >= args.flush:
+                try:
+                    written += flush(ring, samples_out)
+                    events_out.flush()
+                except OSError as e:
+                    print(f"ERROR: flush failed, keeping the last {ring.capacity} samples: {e}",
+                          file=sys.stderr)
+                last_flush = now
+            # Fixed schedule; skip ticks rather than bunch up after a stall
+            next_tick += args.interval
+            if next_tick < now:
+                next_tick = now + args.interval - (now - next_tick) % args.interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    except SamplerError as e:
+        print(f"ERROR: {args.host}:{args.port}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        try:
+            written += flush(ring, samples_out)
+        finally:
+            samples_out.close()
+            events_out.close()
+            session.close()
+
+    print(f"\n{samples} samples ({written} written, {ring.dropped} dropped), "
+          f"{sampler.unanswered} unanswered, {sampler.throttled} held back by the rcon limit, "
+          f"slowest rcon {sampler.slowest_ms:.1f}ms")
+    counted = [f"{kind} {n}" for kind, n in sampler.totals.items() if n]
+    if counted:
+        print("  events: " + ", ".join(counted))
+
+
+if __name__ == "__main__":
+    main()
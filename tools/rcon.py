@@ -10,8 +10,73 @@ The server must have sv_rconPassword set (tools/server.sh sets it to 'dev').
 """
 
 import argparse
+import select
 import socket
 import sys
+import time
+
+OOB_PREFIX = b"\xff\xff\xff\xff"
+PRINT_PREFIX = OOB_PREFIX + b"print\n"
+
+
+class RconSession:
+    """RCON over one persistent UDP socket, for callers that poll repeatedly.
+
+    rcon() opens a socket per command and always waits out the full timeout.
+    A session keeps its socket and returns once the reply has gone quiet for
+    `gap` seconds, so a command costs one round trip plus the gap.
+
+    ioq3 rate-limits rcon per source address with a burst of 10 that
+    refills at one request per second (SVC_RateLimitAddress(from, 10, 1000)).
+    Over that it drops requests without replying, so a poller must average
+    at most 1 command per second, shared with everything else on the host.
+    """
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 1.0, gap: float = 0.05):
+        self.password = password
+        self.timeout = timeout
+        self.gap = gap
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.sock.setblocking(False)
+
+    def close(self):
+        self.sock.close()
+
+    def _recv(self, wait: float):
+        ready, _, _ = select.select([self.sock], [], [], wait)
+        if not ready:
+            return None
+        try:
+            return self.sock.recv(65535)
+        except (BlockingIOError, ConnectionRefusedError):
+            # Nothing listening on the port shows up as ICMP unreachable
+            return b""
+
+    def command(self, command: str) -> tuple:
+        """Send one command; returns (response text, ms to first reply or None)."""
+        # Drop late replies to an earlier command that timed out
+        while self._recv(0) is not None:
+            pass
+        packet = OOB_PREFIX + b"rcon " + self.password.encode() + b" " + command.encode() + b"\n"
+        t0 = time.perf_counter()
+        try:
+            self.sock.send(packet)
+        except ConnectionRefusedError:
+            return "", None
+        first = self._recv(self.timeout)
+        if not first:
+            return "", None
+        ms = (time.perf_counter() - t0) * 1000
+        chunks = [first]
+        while True:
+            data = self._recv(self.gap)
+            if data is None:
+                break
+            chunks.append(data)
+        # Long replies arrive as several packets, each with its own prefix
+        text = b"".join(c[len(PRINT_PREFIX):] if c.startswith(PRINT_PREFIX) else c for c in chunks)
+        return text.decode("utf-8", errors="replace"), ms
 
 
 def rcon(host: str, port: int, password: str, command: str, timeout: float = 2.0) -> str:
@@ -14,11 +14,25 @@ LOG_FILE="/tmp/ioq3ded.log"
 PID_FILE="/tmp/ioq3ded.pid"
 MAP="${QF_MAP:-qfcity1}"
 RCON_PASSWORD="${QF_RCON:-dev}"
+PORT=27960
+
+# PIDs of ioq3ded processes serving this port. tools/server_pool.py instances
+# also run demoq3 but set their own net_port, so they are left alone.
+server_pids() {
+    local pid args
+    for pid in $(pgrep -f "ioq3ded.*demoq3" 2>/dev/null); do
+        args=$(tr '\0' ' ' < "/proc/$pid/cmdline" 2>/dev/null) || continue
+        if [[ "$args" =~ net_port\ ([0-9]+) ]] && [ "${BASH_REMATCH[1]}" != "$PORT" ]; then
+            continue
+        fi
+        echo "$pid"
+    done
+}
 
 cmd_start() {
     # Check for duplicates — this is critical, duplicates cause network corruption
     local existing
-    existing=$(pgrep -f "ioq3ded.*demoq3" 2>/dev/null || true)
+    existing=$(server_pids | tr '\n' ' ')
     if [ -n "$existing" ]; then
         echo "ERROR: ioq3ded already running (PID: $existing)"
         echo "Use '$0 stop' first or '$0 restart'"
@@ -38,6 +52,7 @@ cmd_start() {
         +set sv_pure 0 \
         +set dedicated 1 \
         +set vm_game 0 \
+        +set net_port "$PORT" \
         +set rconPassword "$RCON_PASSWORD" \
         +map "$MAP" \
         > "$LOG_FILE" 2>&1 &
@@ -60,8 +75,12 @@ cmd_stop() {
         kill "$(cat "$PID_FILE")" 2>/dev/null || true
         rm -f "$PID_FILE"
     fi
-    # Also kill any strays
-    pkill -f "ioq3ded.*demoq3" 2>/dev/null || true
+    # Also kill any strays on this port
+    local pids
+    pids=$(server_pids)
+    if [ -n "$pids" ]; then
+        kill $pids 2>/dev/null || true
+    fi
     echo "Server stopped"
 }
 
@@ -73,12 +92,13 @@ cmd_restart() {
 
 cmd_status() {
     local pids
-    pids=$(pgrep -f "ioq3ded.*demoq3" 2>/dev/null || true)
+    pids=$(server_pids | tr '\n' ' ')
     if [ -n "$pids" ]; then
-        echo "Server RUNNING (PID: $pids)"
+        echo "Server RUNNING (PID: ${pids% })"
         echo "Log: $LOG_FILE"
     else
         echo "Server NOT RUNNING"
+        return 1
     fi
 }
 
@@ -95,7 +115,7 @@ case "${1:-}" in
     start)   cmd_start ;;
     stop)    cmd_stop ;;
     restart) cmd_restart ;;
-    status)  cmd_status ;;
+    status)  cmd_status || exit 1 ;;
     log)     cmd_log "${2:-50}" ;;
     *)
         echo "Usage: $0 {start|stop|restart|status|log [lines]}"
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Run several ioq3ded instances side by side on distinct ports.
+
+tools/server.sh manages exactly one server with fixed /tmp paths. This tool
+launches N servers on consecutive ports, each with its own log and PID file,
+and waits for them to answer the UDP getinfo query instead of sleeping.
+
+Usage:
+    python3 tools/server_pool.py start --count 4           # ports 27970-27973
+    python3 tools/server_pool.py status                    # one line per instance
+    python3 tools/server_pool.py supervise                 # restart crashed instances
+    python3 tools/server_pool.py stop
+
+Per-instance files:
+    /tmp/ioq3ded-<port>.pid
+    /tmp/ioq3ded-<port>.log
+    /tmp/ioq3ded-<port>.json    map and cheats it was launched with, reused
+                                by supervise when it restarts the instance
+
+The default base port (27970) stays clear of the single server that
+tools/server.sh runs on 27960. server.sh only manages the ioq3ded on its
+own net_port, so both can coexist.
+"""
+
+import argparse
+import glob
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+SERVER_DIR = os.path.join(PROJECT_DIR, "external", "ioq3", "build-native", "Release")
+SERVER_BIN = os.path.join(SERVER_DIR, "ioq3ded")
+RUN_DIR = "/tmp"
+BASE_PORT = 27970
+
+OOB_PREFIX = b"\xff\xff\xff\xff"
+
+
+def pid_path(port: int) -> str:
+    return os.path.join(RUN_DIR, f"ioq3ded-{port}.pid")
+
+
+def log_path(port: int) -> str:
+    return os.path.join(RUN_DIR, f"ioq3ded-{port}.log")
+
+
+def params_path(port: int) -> str:
+    return os.path.join(RUN_DIR, f"ioq3ded-{port}.json")
+
+
+def read_params(port: int) -> dict:
+    """Launch parameters recorded for port; empty if there are none."""
+    try:
+        with open(params_path(port)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def parse_info_string(info: str) -> dict:
+    """Parse a Q3 info string (\\key\\value\\key\\value) into a dict."""
+    parts = info.strip().lstrip("\\").split("\\")
+    return dict(zip(parts[0::2], parts[1::2]))
+
+
+def probe_many(host: str, ports: list, timeout: float = 0.5) -> dict:
+    """Send getinfo to every port at once; return {port: info dict} for responders.
+
+    One socket is used for all queries, so probing 32 servers costs a single
+    timeout window rather than 32 of them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    challenge = str(os.getpid())
+    results = {}
+    try:
+        for port in ports:
+            sock.sendto(OOB_PREFIX + b"getinfo " + challenge.encode() + b"\n", (host, port))
+
+        deadline = time.monotonic() + timeout
+        while len(results) < len(ports):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                break
+            try:
+                data, addr = sock.recvfrom(4096)
+            except (BlockingIOError, ConnectionRefusedError):
+                continue
+            prefix = OOB_PREFIX + b"infoResponse\n"
+            if not data.startswith(prefix):
+                continue
+            info = parse_info_string(data[len(prefix):].decode("utf-8", errors="replace"))
+            results[addr[1]] = info
+    finally:
+        sock.close()
+    return results
+
+
+def probe(host: str, port: int, timeout: float = 0.5):
+    """Return the getinfo dict for one server, or None if it did not answer."""
+    return probe_many(host, [port], timeout).get(port)
+
+
+def read_pid(port: int):
+    try:
+        with open(pid_path(port)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Reap our own zombie children so a crashed server does not look alive
+    try:
+        done, _ = os.waitpid(pid, os.WNOHANG)
+        if done == pid:
+            return False
+    except ChildProcessError:
+        pass
+    return True
+
+
+def known_ports() -> list:
+    """Ports that have a PID file in RUN_DIR, sorted."""
+    ports = []
+    for path in glob.glob(os.path.join(RUN_DIR, "ioq3ded-*.pid")):
+        name = os.path.basename(path)[len("ioq3ded-"):-len(".pid")]
+        if name.isdigit():
+            ports.append(int(name))
+    return sorted(ports)
+
+
+def launch(port: int, map_name: str, rcon_password: str, cheats: bool = False) -> int:
+    """Start one ioq3ded on the given port and record its PID. Does not wait."""
+    cmd = [
+        "./ioq3ded",
+        "+set", "com_basegame", "demoq3",
+        "+set", "sv_pure", "0",
+        "+set", "dedicated", "1",
+        "+set", "vm_game", "0",
+        "+set", "net_port", str(port),
+        "+set", "rconPassword", rcon_password,
+    ]
+    if cheats:
+        cmd += ["+set", "sv_cheats", "1"]
+    cmd += ["+map", map_name]
+
+    env = dict(os.environ)
+    env["DISPLAY"] = ""
+    with open(log_path(port), "w") as log:
+        proc = subprocess.Popen(cmd, cwd=SERVER_DIR, env=env, stdout=log,
+                                stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                start_new_session=True)
+    with open(pid_path(port), "w") as f:
+        f.write(f"{proc.pid}\n")
+    with open(params_path(port), "w") as f:
+        json.dump({"map": map_name, "cheats": cheats}, f)
+    return proc.pid
+
+
+def wait_ready(host: str, ports: list, timeout: float) -> dict:
+    """Poll getinfo until every port answers or timeout expires.
+
+    Returns {port: info} for the servers that came up.
+    """
+    ready = {}
+    deadline = time.monotonic() + timeout
+    pending = list(ports)
+    while pending and time.monotonic() < deadline:
+        answered = probe_many(host, pending, timeout=0.25)
+        ready.update(answered)
+        pending = [p for p in pending if p not in ready]
+        # Stop waiting on instances that already died
+        pending = [p for p in pending if pid_alive(read_pid(p))]
+    return ready
+
+
+def stop_port(port: int, grace: float = 3.0):
+    pid = read_pid(port)
+    # Remove the files first so supervise sees an intentional stop, not a crash
+    for path in (pid_path(port), params_path(port)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if pid_alive(pid):
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline and pid_alive(pid):
+            time.sleep(0.05)
+        if pid_alive(pid):
+            os.kill(pid, signal.SIGKILL)
+
+
+def instance_status(host: str, ports: list) -> list:
+    """Return one status dict per port: pid, alive, ready, map, clients."""
+    infos = probe_many(host, ports)
+    rows = []
+    for port in ports:
+        pid = read_pid(port)
+        info = infos.get(port)
+        rows.append({
+            "port": port,
+            "pid": pid,
+            "alive": pid_alive(pid),
+            "ready": info is not None,
+            "map": info.get("mapname", "") if info else "",
+            "clients": f"{info.get('clients', '?')}/{info.get('sv_maxclients', '?')}" if info else "",
+            "log": log_path(port),
+        })
+    return rows
+
+
+def print_status(rows: list):
+    if not rows:
+        print("No pool instances (no /tmp/ioq3ded-<port>.pid files)")
+        return
+    print(f"{'PORT':>6} {'PID':>8} {'STATE':<8} {'MAP':<12} {'CLIENTS':<8} LOG")
+    for r in rows:
+        if r["ready"]:
+            state = "READY"
+        elif r["alive"]:
+            state = "STARTING"
+        else:
+            state = "DEAD"
+        pid = r["pid"] if r["pid"] is not None else "-"
+        print(f"{r['port']:>6} {pid:>8} {state:<8} {r['map']:<12} {r['clients']:<8} {r['log']}")
+
+
+def cmd_start(args) -> int:
+    if not os.access(SERVER_BIN, os.X_OK):
+        print(f"ERROR: Server binary not found: {SERVER_BIN}", file=sys.stderr)
+        print("Run 'tools/build.sh native' first", file=sys.stderr)
+        return 1
+
+    ports = [args.base_port + i for i in range(args.count)]
+    busy = [p for p in ports if pid_alive(read_pid(p))]
+    if busy:
+        print(f"ERROR: instances already running on ports {busy}", file=sys.stderr)
+        print("Use 'stop' first", file=sys.stderr)
+        return 1
+
+    t0 = time.monotonic()
+    for port in ports:
+        launch(port, args.map, args.rcon, args.cheats)
+    ready = wait_ready(args.host, ports, args.timeout)
+    elapsed = time.monotonic() - t0
+
+    print_status(instance_status(args.host, ports))
+    print(f"{len(ready)}/{len(ports)} ready in {elapsed:.2f}s")
+    if len(ready) != len(ports):
+        for port in ports:
+            if port not in ready:
+                print(f"--- {log_path(port)} (tail) ---", file=sys.stderr)
+                with open(log_path(port), errors="replace") as f:
+                    sys.stderr.writelines(f.readlines()[-10:])
+        return 1
+    return 0
+
+
+def cmd_stop(args) -> int:
+    ports = known_ports()
+    for port in ports:
+        stop_port(port)
+    print(f"Stopped {len(ports)} instance(s)")
+    return 0
+
+
+def cmd_status(args) -> int:
+    rows = instance_status(args.host, known_ports())
+    print_status(rows)
+    return 0 if rows and all(r["ready"] for r in rows) else 1
+
+
+def cmd_supervise(args) -> int:
+    """Restart any pool instance whose process has died, until interrupted.
+
+    The PID files are rescanned every pass, so instances started later are
+    picked up. An instance whose PID file is gone was stopped on purpose
+    and is left alone.
+    """
+    ports = known_ports()
+    if not ports:
+        print("No pool instances to supervise", file=sys.stderr)
+        return 1
+    print(f"Supervising ports {ports} (Ctrl-C to stop)")
+    restarts = {}
+    try:
+        while True:
+            for port in known_ports():
+                pid = read_pid(port)
+                if pid is None or pid_alive(pid):
+                    continue
+                restarts[port] = restarts.get(port, 0) + 1
+                ts = time.strftime("%H:%M:%S")
+                print(f"[{ts}] port {port} died, restarting (#{restarts[port]})")
+                # Keep the crash log around for post-mortem
+                if os.path.exists(log_path(port)):
+                    os.replace(log_path(port), log_path(port) + ".crash")
+                # Relaunch as it was started, not with this command's --map/--cheats
+                params = read_params(port)
+                launch(port, params.get("map", args.map), args.rcon, params.get("cheats", args.cheats))
+                if wait_ready(args.host, [port], args.timeout):
+                    print(f"[{ts}] port {port} ready")
+                else:
+                    print(f"[{ts}] port {port} did not come up, see {log_path(port)}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-instance ioq3ded manager")
+    parser.add_argument("command", choices=["start", "stop", "status", "supervise"])
+    parser.add_argument("--count", type=int, default=2, help="Instances to start (default: 2)")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT,
+                        help=f"First UDP port (default: {BASE_PORT})")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to probe (default: 127.0.0.1)")
+    parser.add_argument("--map", default=os.environ.get("QF_MAP", "qfcity1"),
+                        help="Map to load (default: $QF_MAP or qfcity1)")
+    parser.add_argument("--rcon", default=os.environ.get("QF_RCON", "dev"),
+                        help="RCON password (default: $QF_RCON or dev)")
+    parser.add_argument("--cheats", action="store_true", help="Start with sv_cheats 1")
+    parser.add_argument("--timeout", type=float, default=15.0,
+                        help="Seconds to wait for getinfo readiness (default: 15)")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Supervise poll interval in seconds (default: 1)")
+    args = parser.parse_args()
+
+    handlers = {
+        "start": cmd_start,
+        "stop": cmd_stop,
+        "status": cmd_status,
+        "supervise": cmd_supervise,
+    }
+    sys.exit(handlers[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
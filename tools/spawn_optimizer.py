@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Pick deathmatch spawn points for a generated map and write them back.
+
+Candidates are grid points on walkable floors (see light_preview.py) where
+the player hull fits. A spawn set is scored on:
+
+  separation   mean distance from each spawn to its nearest other spawn,
+               plus the smallest pairwise distance
+  exposure     share of titan viewpoints (open street points with room
+               for a titan, at titan eye height, within TITAN_RANGE) that
+               can see the spawn; lower is better
+  weapons      distance to the nearest weapon: too close invites spawn
+               camping, too far leaves a fresh spawn unarmed
+
+Line of sight uses batched segment-vs-box slab tests against the solid
+brush bounds (light_preview.Occluders), one viewpoint at a time against
+every candidate. The set is seeded greedily and then improved by swapping
+one spawn at a time for the best candidate, each swap scored for all
+candidates at once.
+
+Usage:
+    python3 tools/spawn_optimizer.py maps/qfcity1.map                 # report only
+    python3 tools/spawn_optimizer.py maps/qfcity1.map --write         # replace spawns in place
+    python3 tools/spawn_optimizer.py maps/qfcity1.map --count 24 --out /tmp/city.map
+
+Requires: numpy
+"""
+
+import argparse
+import math
+import re
+import sys
+import time
+
+import numpy as np
+
+from light_preview import Occluders, floor_samples
+from map_parser import load_map
+from validate_entities import PLAYER_MAXS, PLAYER_MINS, PlacementChecker
+
+SPAWN_CLASS = "info_player_deathmatch"
+SPAWN_HEIGHT = 24.0          # origin above the floor, as the generators place spawns
+PLAYER_EYE = 26.0            # view height above the origin
+TITAN_HALF_WIDTH = 64.0
+TITAN_HEIGHT = 256.0
+TITAN_EYE = 192.0
+TITAN_RANGE = 3000.0
+WEAPON_NEAR = 256.0          # closer than this counts as camping the pickup
+WEAPON_FAR = 1536.0          # beyond this the spawn is effectively unarmed
+
+W_SEPARATION = 1.0
+W_EXPOSURE = 0.6
+W_WEAPONS = 0.4
+
+
+def hull_clear(checker: PlacementChecker, origins: np.ndarray, mins, maxs) -> np.ndarray:
+    """bool (n,): the box fits at each origin without entering solid.
+
+    Brush bounds are checked for all origins at once (sorted by x, one
+    slice per brush); only origins whose box overlaps some brush's bounds
+    get the exact per-plane test.
+    """
+    mins = np.asarray(mins, dtype=np.float64)
+    maxs = np.asarray(maxs, dtype=np.float64)
+    m = checker.m
+    order = np.argsort(origins[:, 0], kind="stable")
+    xs = origins[order, 0]
+    touching = np.zeros(len(origins), dtype=bool)
+    for b in checker.solid:
+        lo, hi = m.brush_mins[b], m.brush_maxs[b]
+        start, stop = np.searchsorted(xs, [lo[0] - maxs[0], hi[0] - mins[0]])
+        if start == stop:
+            continue
+        idx = order[start:stop]
+        o = origins[idx]
+        hit = np.all((o + mins < hi) & (o + maxs > lo), axis=1)
+        touching[idx[hit]] = True
+    clear = ~touching
+    for i in np.nonzero(touching)[0]:
+        clear[i] = not checker.box_in_solid(origins[i], mins, maxs)
+    return clear
+
+
+def main_floor(floors: np.ndarray) -> np.ndarray:
+    """The samples at the floor height holding the most samples (street level)."""
+    heights, counts = np.unique(np.round(floors[:, 2]), return_counts=True)
+    return floors[np.round(floors[:, 2]) == heights[np.argmax(counts)]]
+
+
+def spawn_candidates(m, checker: PlacementChecker, cell: float, all_floors: bool = False) -> np.ndarray:
+    """Spawn origins (n, 3) on walkable floors where the player hull fits.
+
+    Only the main floor level is used unless all_floors is set: raised
+    floors in generated buildings are often not reachable on foot.
+    """
+    floors = floor_samples(m, checker.solid, cell)
+    if not len(floors):
+        return np.zeros((0, 3))
+    if not all_floors:
+        floors = main_floor(floors)
+    origins = floors.copy()
+    origins[:, 2] += SPAWN_HEIGHT - 1.0  # floor_samples lifts points 1 unit
+    hull_mins = PLAYER_MINS + [0, 0, 1]  # spawns are lifted off the floor in-game
+    inside = np.all((origins >= checker.world_mins) & (origins <= checker.world_maxs), axis=1)
+    origins = origins[inside]
+    return origins[hull_clear(checker, origins, hull_mins, PLAYER_MAXS)]
+
+
+def titan_viewpoints(m, checker: PlacementChecker, spacing: float, limit: int, seed: int) -> np.ndarray:
+    """Eye positions (n, 3) on open ground with room for a titan hull."""
+    floors = floor_samples(m, checker.solid, spacing)
+    if not len(floors):
+        return np.zeros((0, 3))
+    mins = np.array([-TITAN_HALF_WIDTH, -TITAN_HALF_WIDTH, 1.0])
+    maxs = np.array([TITAN_HALF_WIDTH, TITAN_HALF_WIDTH, TITAN_HEIGHT])
+    ground = main_floor(floors)
+    eyes = ground[hull_clear(checker, ground, mins, maxs)] + [0, 0, TITAN_EYE]
+    if len(eyes) > limit:
+        rng = np.random.default_rng(seed)
+        eyes = eyes[np.sort(rng.choice(len(eyes), limit, replace=False))]
+    return eyes
+
+
+def exposure(candidates: np.ndarray, eyes: np.ndarray, checker: PlacementChecker) -> np.ndarray:
+    """Fraction (n,) of in-range titan viewpoints with line of sight to each candidate."""
+    if not len(eyes):
+        return np.zeros(len(candidates))
+    heads = candidates + [0, 0, PLAYER_EYE]
+    occluders = Occluders(checker.m.brush_mins[checker.solid], checker.m.brush_maxs[checker.solid], heads)
+    seen = np.zeros(len(candidates))
+    in_range = np.zeros(len(candidates))
+    for eye in eyes:
+        near = np.linalg.norm(heads - eye, axis=1) <= TITAN_RANGE
+        in_range += near
+        seen += near & ~occluders.blocked(eye, near)
+    return seen / np.maximum(in_range, 1)
+
+
+def weapon_score(candidates: np.ndarray, weapons: np.ndarray) -> np.ndarray:
+    """0..1 per candidate: 1 between WEAPON_NEAR and WEAPON_FAR from the nearest weapon."""
+    if not len(weapons):
+        return np.ones(len(candidates))
+    d = np.linalg.norm(candidates[:, None, :2] - weapons[None, :, :2], axis=2).min(axis=1)
+    near = np.clip(d / WEAPON_NEAR, 0, 1)
+    far = np.clip(1 - (d - WEAPON_FAR) / WEAPON_FAR, 0, 1)
+    return np.minimum(near, far)
+
+
+class SpawnScorer:
+    """Scores spawn sets drawn from a fixed candidate list.
+
+    Distances are horizontal distance plus height difference (straight 3D
+    distance would rate stacked floors as closer than they play). They are
+    computed per call, never as an n x n matrix, so large maps stay small.
+    """
+
+    def __init__(self, candidates: np.ndarray, unary: np.ndarray, scale: float):
+        self.candidates = candidates
+        self.unary = unary
+        self.scale = scale
+
+    def dist(self, rows, cols=None) -> np.ndarray:
+        a = self.candidates if rows is None else self.candidates[rows]
+        b = self.candidates if cols is None else self.candidates[cols]
+        a = np.atleast_2d(a)
+        b = np.atleast_2d(b)
+        return (np.linalg.norm(a[:, None, :2] - b[None, :, :2], axis=2)
+                + np.abs(a[:, None, 2] - b[None, :, 2]))
+
+    def score(self, chosen) -> float:
+        chosen = np.asarray(chosen)
+        d = self.dist(chosen, chosen)
+        np.fill_diagonal(d, np.inf)
+        nn = d.min(axis=1)
+        separation = (nn.mean() + d.min()) / self.scale
+        return W_SEPARATION * separation + self.unary[chosen].mean()
+
+    def swap_scores(self, chosen, slot: int) -> np.ndarray:
+        """Score (n_candidates,) of the set with chosen[slot] replaced by each candidate."""
+        others = np.delete(np.asarray(chosen), slot)
+        k = len(chosen)
+        d_others = self.dist(others, others)
+        np.fill_diagonal(d_others, np.inf)
+        nn_others = d_others.min(axis=1)                      # (k-1,)
+        to_others = self.dist(None, others)                   # (n, k-1)
+        nn_new_others = np.minimum(nn_others[None, :], to_others)
+        nn_new = to_others.min(axis=1)
+        mean_nn = (nn_new_others.sum(axis=1) + nn_new) / k
+        min_pair = np.minimum(d_others.min() if k > 2 else np.inf, nn_new)
+        separation = (mean_nn + min_pair) / self.scale
+        unary = (self.unary[others].sum() + self.unary) / k
+        result = W_SEPARATION * separation + unary
+        result[others] = -np.inf  # no duplicates
+        return result
+
+
+def optimize(scorer: SpawnScorer, count: int, max_rounds: int = 50):
+    """Greedy farthest-point seed, then best-swap local search."""
+    n = len(scorer.candidates)
+    count = min(count, n)
+    chosen = [int(np.argmax(scorer.unary))]
+    nearest = scorer.dist(None, [chosen[0]])[:, 0]
+    while len(chosen) < count:
+        gain = nearest / scorer.scale * W_SEPARATION + scorer.unary
+        gain[chosen] = -np.inf
+        c = int(np.argmax(gain))
+        chosen.append(c)
+        nearest = np.minimum(nearest, scorer.dist(None, [c])[:, 0])
+
+    best = scorer.score(chosen)
+    for _ in range(max_rounds):
+        improved = False
+        for slot in range(count):
+            scores = scorer.swap_scores(chosen, slot)
+            c = int(np.argmax(scores))
+            if scores[c] > best + 1e-9:
+                chosen[slot] = c
+                best = scorer.score(chosen)
+                improved = True
+        if not improved:
+            break
+    return chosen, best
+
+
+def spawn_angles(spawns: np.ndarray, center: np.ndarray) -> list:
+    """Face each spawn toward the middle of the map (Q3 yaw in degrees)."""
+    return [int(round(math.degrees(math.atan2(center[1] - s[1], center[0] - s[0])))) % 360
+            for s in spawns]
+
+
+_ENTITY_RE = re.compile(r"^\{\n.*?^\}\n?", re.S | re.M)
+
+
+def replace_spawns(text: str, spawns: np.ndarray, angles: list) -> str:
+    """Drop every SPAWN_CLASS entity block and append the new spawns.
+
+    Works on the generator's output layout: top-level entity braces on their
+    own lines, brushes indented.
+    """
+    def keep(match):
+        block = match.group(0)
+        return "" if f'"classname" "{SPAWN_CLASS}"' in block.split("\n", 2)[1] else block
+
+    text = _ENTITY_RE.sub(keep, text).rstrip("\n")
+    blocks = []
+    for (x, y, z), angle in zip(spawns, angles):
+        blocks.append("{\n"
+                      f'\t"classname" "{SPAWN_CLASS}"\n'
+                      f'\t"origin" "{x:.0f} {y:.0f} {z:.0f}"\n'
+                      f'\t"angle" "{angle}"\n'
+                      "}")
+    return text + "\n" + "\n".join(blocks)
+
+
+def describe(label: str, idx, scorer: SpawnScorer, expo: np.ndarray, weap: np.ndarray) -> str:
+    idx = np.asarray(idx)
+    d = scorer.dist(idx, idx)
+    np.fill_diagonal(d, np.inf)
+    return (f"  {label:<9s} score {scorer.score(idx):6.3f}  min gap {d.min():6.0f}  "
+            f"mean nearest {d.min(axis=1).mean():6.0f}  exposure {expo[idx].mean():5.2f}  "
+            f"weapon score {weap[idx].mean():4.2f}")
+
+
+def optimize_file(map_file: str, count: int = None, cell: float = 128.0, viewpoints: int = 300,
+                  seed: int = 42, all_floors: bool = False, out: str = None) -> int:
+    """Optimize the spawns of one .map, print a report and optionally write
+    the result to `out` (which may be map_file itself). Returns an exit code."""
+    t0 = time.perf_counter()
+    m = load_map(map_file)
+    checker = PlacementChecker(m)
+    existing = np.array([m.entity_origins[e] for e in m.point_entities()
+                         if m.classname(e) == SPAWN_CLASS]).reshape(-1, 3)
+    weapons = np.array([m.entity_origins[e] for e in m.point_entities()
+                        if m.classname(e).startswith("weapon_")]).reshape(-1, 3)
+    count = count or len(existing) or 16
+
+    candidates = spawn_candidates(m, checker, cell, all_floors)
+    if len(candidates) < count:
+        print(f"ERROR: only {len(candidates)} spawn candidates for {count} spawns", file=sys.stderr)
+        return 1
+    eyes = titan_viewpoints(m, checker, cell * 4, viewpoints, seed)
+    expo = exposure(candidates, eyes, checker)
+    weap = weapon_score(candidates, weapons)
+    t_prep = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    extent = checker.world_maxs[:2] - checker.world_mins[:2]
+    scale = float(np.linalg.norm(extent)) / math.sqrt(count)
+    scorer = SpawnScorer(candidates, W_WEAPONS * weap - W_EXPOSURE * expo, scale)
+    chosen, _ = optimize(scorer, count)
+    t_opt = time.perf_counter() - t0
+
+    print(f"{map_file}: {len(candidates)} candidates, {len(eyes)} titan viewpoints, "
+          f"{len(weapons)} weapons, {count} spawns")
+    if len(existing):
+        # Score the current spawns by their nearest candidates
+        near = [int(np.argmin(np.linalg.norm(candidates - s, axis=1))) for s in existing]
+        print(describe("current", near, scorer, expo, weap))
+    print(describe("optimized", chosen, scorer, expo, weap))
+    spawns = candidates[chosen]
+    center = (checker.world_mins + checker.world_maxs) / 2
+    angles = spawn_angles(spawns, center)
+    for (x, y, z), angle in zip(spawns, angles):
+        print(f"    ({x:.0f} {y:.0f} {z:.0f}) angle {angle}")
+    print(f"  [prepare {t_prep:.2f}s, optimize {t_opt:.2f}s]")
+
+    if out:
+        with open(map_file) as f:
+            text = f.read()
+        with open(out, "w") as f:
+            f.write(replace_spawns(text, spawns, angles))
+        print(f"Wrote {len(spawns)} spawns to {out}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize deathmatch spawn placement in a .map")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--count", type=int, help="Spawns to place (default: as many as the map has, or 16)")
+    parser.add_argument("--cell", type=float, default=128.0, help="Candidate grid spacing (default 128)")
+    parser.add_argument("--viewpoints", type=int, default=300, help="Max titan viewpoints (default 300)")
+    parser.add_argument("--seed", type=int, default=42, help="Viewpoint subsampling seed")
+    parser.add_argument("--all-floors", action="store_true",
+                        help="Allow raised floors, not just the main floor level")
+    parser.add_argument("--write", action="store_true", help="Rewrite the map's spawns in place")
+    parser.add_argument("--out", help="Write the map with new spawns here instead")
+    args = parser.parse_args()
+
+    out = args.out or (args.map_file if args.write else None)
+    sys.exit(optimize_file(args.map_file, args.count, args.cell, args.viewpoints, args.seed,
+                           args.all_floors, out))
+
+
+if __name__ == "__main__":
+    main()
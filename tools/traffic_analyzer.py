@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""Offline Q3 network traffic analyzer: bandwidth per client and per snapshot.
+
+Reads either a pcap capture of the server's UDP port or the packet log
+printed by proxy.js, decodes the netchan header of every packet and reports,
+per client:
+  - packets and payload bytes in each direction, average and peak kbit/s
+  - server messages split into fragments (fragmentation rate)
+  - bytes per snapshot message (mean / p50 / p95 / max)
+  - sequence gaps (dropped packets) and out-of-band traffic by command
+
+Netchan header (qcommon/net_chan.c), little-endian:
+    int32  sequence          bit 31 = fragment; -1 marks an out-of-band packet
+    uint16 qport             client->server only
+    int32  checksum          protocol 71 only (ioq3 default; 68 omits it)
+    uint16 fragmentStart     fragmented packets only
+    uint16 fragmentLength    < FRAGMENT_SIZE on the last fragment
+
+Full-payload captures (pcap) also classify reassembled server messages as
+snapshot / gamestate / commands by decoding the start of the Huffman stream
+with demo_parser.MessageReader. The proxy log only keeps 20 bytes of each
+packet, so there every in-band server message counts as a snapshot.
+
+Input is streamed record by record; only per-client counters, one size per
+snapshot and per-window byte totals are kept.
+
+Usage:
+    python3 tools/traffic_analyzer.py capture.pcap
+    python3 tools/traffic_analyzer.py /tmp/proxy.log --window 5
+    python3 tools/traffic_analyzer.py capture.pcap --csv bandwidth.csv
+    tcpdump -i lo -w capture.pcap udp port 27960      # making a capture
+
+Requires: numpy
+"""
+
+import argparse
+import collections
+import gzip
+import re
+import struct
+import sys
+
+import numpy as np
+
+from demo_parser import (DemoError, MessageReader, SVC_EOF, SVC_GAMESTATE, SVC_NOP,
+                         SVC_SERVERCOMMAND, SVC_SNAPSHOT)
+
+FRAGMENT_BIT = 1 << 31
+FRAGMENT_SIZE = 1400 - 100      # MAX_PACKETLEN - 100
+UDP_IP_OVERHEAD = 28            # IPv4 + UDP headers, for wire-rate estimates
+DEFAULT_SERVER_PORT = 27960
+
+Packet = collections.namedtuple("Packet", "time client to_server length data")
+
+
+class CaptureError(Exception):
+    """Unreadable or unsupported capture file."""
+
+
+# --- Capture readers ---
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+
+def _link_payload(linktype: int, frame: bytes):
+    """Strip the link-layer header and return the IP packet (None if not IP)."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype = struct.unpack_from(">H", frame, 12)[0]
+        offset = 14
+        while ethertype in (0x8100, 0x88A8) and len(frame) >= offset + 4:  # VLAN tags
+            ethertype = struct.unpack_from(">H", frame, offset + 2)[0]
+            offset += 4
+        return frame[offset:] if ethertype in (0x0800, 0x86DD) else None
+    if linktype == LINKTYPE_LINUX_SLL:
+        return frame[16:]
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return frame[20:]
+    if linktype == LINKTYPE_NULL:
+        return frame[4:]
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return frame
+    raise CaptureError(f"unsupported pcap link type {linktype}")
+
+
+def _udp_datagram(ip: bytes):
+    """Return (src, sport, dst, dport, payload) for a UDP packet, else None."""
+    if not ip:
+        return None
+    version = ip[0] >> 4
+    if version == 4:
+        if len(ip) < 20:
+            return None
+        ihl = (ip[0] & 0x0F) * 4
+        flags_frag = struct.unpack_from(">H", ip, 6)[0]
+        if ip[9] != 17 or flags_frag & 0x1FFF:
+            return None  # not UDP, or a non-first IP fragment
+        src = ".".join(map(str, ip[12:16]))
+        dst = ".".join(map(str, ip[16:20]))
+        udp = ip[ihl:]
+    elif version == 6:
+        if len(ip) < 40 or ip[6] != 17:
+            return None
+        src = ip[8:24].hex()
+        dst = ip[24:40].hex()
+        udp = ip[40:]
+    else:
+        return None
+    if len(udp) < 8:
+        return None
+    sport, dport, length = struct.unpack_from(">HHH", udp, 0)
+    return src, sport, dst, dport, udp[8:length] if length >= 8 else udp[8:]
+
+
+def read_pcap(f, server_port: int):
+    """Yield Packets from a classic pcap stream, one record at a time."""
+    header = f.read(24)
+    if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+        raise CaptureError("not a pcap file")
+    endian, tick = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    while True:
+        raw = f.read(16)
+        if len(raw) < 16:
+            return
+        sec, frac, caplen, _ = record.unpack(raw)
+        frame = f.read(caplen)
+        if len(frame) < caplen:
+            return  # capture cut off mid-record
+        ip = _link_payload(linktype, frame)
+        dgram = _udp_datagram(ip) if ip is not None else None
+        if dgram is None:
+            continue
+        src, sport, dst, dport, payload = dgram
+        if dport == server_port:
+            client, to_server = f"{src}:{sport}", True
+        elif sport == server_port:
+            client, to_server = f"{dst}:{dport}", False
+        else:
+            continue
+        yield Packet(sec + frac * tick, client, to_server, len(payload), payload)
+
+
+PROXY_PACKET = re.compile(
+    r"^\[(WS->UDP|UDP->WS)\](?: client (\d+))?(?: t=([\d.]+))? (\d+) bytes, first 20: ([0-9a-f]*)")
+PROXY_CONNECT = re.compile(r"^New browser client connected from (\S+)(?: \(client (\d+)\))?")
+
+
+def read_proxy_log(f):
+    """Yield Packets from proxy.js output.
+
+    Older logs carry neither client ids nor timestamps: packets are then
+    attributed to the most recent connection and time is left as None.
+    """
+    session = 0
+    for line in f:
+        m = PROXY_PACKET.match(line)
+        if m:
+            client = f"ws#{m.group(2) or session}"
+            t = float(m.group(3)) if m.group(3) else None
+            data = bytes.fromhex(m.group(5))
+            yield Packet(t, client, m.group(1) == "WS->UDP", int(m.group(4)), data)
+            continue
+        m = PROXY_CONNECT.match(line)
+        if m:
+            session += 1
+
+
+def open_capture(path: str, server_port: int):
+    """Return (file, packet iterator, has_full_payloads)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    f = opener(path, "rb")
+    magic = f.read(4)
+    f.seek(0)
+    if magic == PCAPNG_MAGIC:
+        f.close()
+        raise CaptureError("pcapng is not supported; convert with: editcap -F pcap in.pcapng out.pcap")
+    if magic in PCAP_MAGIC:
+        return f, read_pcap(f, server_port), True
+    f.close()
+    text = opener(path, "rt", errors="replace")
+    return text, read_proxy_log(text), False
+
+
+# --- Netchan decoding ---
+
+Header = collections.namedtuple("Header", "sequence fragmented start frag_length size")
+
+
+def parse_header(data: bytes, to_server: bool, protocol: int):
+    """Decode the netchan header. Returns Header, or None if too short.
+
+    size is the header length in bytes. Out-of-band packets are reported
+    with sequence -1.
+    """
+    if len(data) < 4:
+        return None
+    sequence = struct.unpack_from("<i", data, 0)[0]
+    if sequence == -1:
+        return Header(-1, False, 0, 0, 4)
+    fragmented = bool(sequence & FRAGMENT_BIT)
+    sequence &= ~FRAGMENT_BIT & 0xFFFFFFFF
+    offset = 4
+    if to_server:
+        offset += 2         # qport
+    if protocol >= 71:
+        offset += 4         # challenge checksum
+    start = frag_length = 0
+    if fragmented:
+        if len(data) < offset + 4:
+            return None
+        start, frag_length = struct.unpack_from("<HH", data, offset)
+        offset += 4
+    return Header(sequence, fragmented, start, frag_length, offset)
+
+
+def oob_command(data: bytes) -> str:
+    word = data[4:40].split(None, 1)
+    return word[0].decode("ascii", "replace")[:24] if word else "?"
+
+
+def classify_server_message(payload: bytes) -> str:
+    """'snapshot', 'gamestate', 'commands' or 'unknown' for a server message."""
+    try:
+        msg = MessageReader(payload)
+        msg.read_long()  # reliableAcknowledge
+        while True:
+            cmd = msg.read_byte()
+            if cmd == SVC_SERVERCOMMAND:
+                msg.read_long()
+                msg.read_string()
+            elif cmd == SVC_NOP:
+                continue
+            elif cmd == SVC_SNAPSHOT:
+                return "snapshot"
+            elif cmd == SVC_GAMESTATE:
+                return "gamestate"
+            elif cmd == SVC_EOF:
+                return "commands"
+            else:
+                return "unknown"
+    except DemoError:
+        return "unknown"
+
+
+class Direction:
+    """Sequence tracking and fragment reassembly for one side of a netchan."""
+
+    __slots__ = ("packets", "bytes", "last_sequence", "dropped", "reordered",
+                 "frag_sequence", "frag_received", "frag_data", "frag_count")
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.last_sequence = None
+        self.dropped = 0
+        self.reordered = 0
+        self.frag_sequence = -1
+        self.frag_received = 0
+        self.frag_data = []
+        self.frag_count = 0
+
+    def track(self, sequence: int):
+        if self.last_sequence is not None:
+            if sequence > self.last_sequence + 1:
+                self.dropped += sequence - self.last_sequence - 1
+            elif sequence <= self.last_sequence:
+                self.reordered += 1
+                return
+        self.last_sequence = sequence
+
+    def add_fragment(self, header: Header, length: int, data: bytes):
+        """Feed one fragment; returns (size, payload, fragments) when complete.
+
+        Mirrors Netchan_Process: a fragment for a new sequence restarts the
+        buffer, and a gap in fragmentStart drops the whole message.
+        """
+        if header.sequence != self.frag_sequence:
+            self.frag_sequence = header.sequence
+            self.frag_received = 0
+            self.frag_data = []
+            self.frag_count = 0
+        if header.start != self.frag_received:
+            return None
+        self.frag_received += header.frag_length
+        self.frag_count += 1
+        self.frag_data.append(data[header.size:header.size + header.frag_length])
+        if header.frag_length == FRAGMENT_SIZE:
+            return None
+        self.frag_sequence = -1
+        return self.frag_received, b"".join(self.frag_data), self.frag_count
+
+
+class ClientStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.up = Direction()
+        self.down = Direction()
+        self.first_time = None
+        self.last_time = None
+        self.oob = collections.Counter()
+        self.messages = collections.Counter()       # server message kinds
+        self.server_messages = 0
+        self.fragmented_messages = 0
+        self.fragments = 0
+        self.snapshot_sizes = []
+        self.windows = collections.defaultdict(lambda: [0, 0, 0])  # down, up, snapshots
+
+    def add(self, pkt: Packet, protocol: int, window: float, t0: float, full_payload: bool):
+        if pkt.time is not None:
+            if self.first_time is None:
+                self.first_time = pkt.time
+            self.last_time = pkt.time
+        side = self.up if pkt.to_server else self.down
+        side.packets += 1
+        side.bytes += pkt.length
+        slot = self.windows[int((pkt.time - t0) // window)] if pkt.time is not None else None
+        if slot is not None:
+            slot[1 if pkt.to_server else 0] += pkt.length
+
+        header = parse_header(pkt.data, pkt.to_server, protocol)
+        if header is None:
+            return
+        if header.sequence == -1:
+            self.oob[("->" if pkt.to_server else "<-") + oob_command(pkt.data)] += 1
+            return
+        if header.fragmented:
+            done = side.add_fragment(header, pkt.length, pkt.data)
+            if done is None:
+                return
+            size, payload, count = done
+            side.track(header.sequence)
+            if not pkt.to_server:
+                self.fragmented_messages += 1
+                self.fragments += count
+        else:
+            side.track(header.sequence)
+            size = pkt.length - header.size
+            payload = pkt.data[header.size:]
+        if pkt.to_server:
+            return
+
+        self.server_messages += 1
+        kind = classify_server_message(payload) if full_payload else "snapshot"
+        self.messages[kind] += 1
+        if kind == "snapshot":
+            self.snapshot_sizes.append(size)
+            if slot is not None:
+                slot[2] += 1
+
+    def duration(self) -> float:
+        if self.first_time is None:
+            return 0.0
+        return self.last_time - self.first_time
+
+    def summary(self, window: float) -> dict:
+        sizes = np.array(self.snapshot_sizes, dtype=np.int64)
+        dur = self.duration()
+        down_rates = [w[0] * 8 / window / 1000 for w in self.windows.values()]
+        up_rates = [w[1] * 8 / window / 1000 for w in self.windows.values()]
+        return {
+            "client": self.name,
+            "duration_s": dur,
+            "packets_down": self.down.packets,
+            "packets_up": self.up.packets,
+            "bytes_down": self.down.bytes,
+            "bytes_up": self.up.bytes,
+            "kbps_down": self.down.bytes * 8 / dur / 1000 if dur > 0 else None,
+            "kbps_up": self.up.bytes * 8 / dur / 1000 if dur > 0 else None,
+            "peak_kbps_down": max(down_rates) if down_rates else None,
+            "peak_kbps_up": max(up_rates) if up_rates else None,
+            "wire_kbps_down": ((self.down.bytes + UDP_IP_OVERHEAD * self.down.packets) * 8 / dur / 1000
+                               if dur > 0 else None),
+            "snapshots": len(sizes),
+            "snap_mean": float(sizes.mean()) if len(sizes) else 0.0,
+            "snap_p50": float(np.percentile(sizes, 50)) if len(sizes) else 0.0,
+            "snap_p95": float(np.percentile(sizes, 95)) if len(sizes) else 0.0,
+            "snap_max": int(sizes.max()) if len(sizes) else 0,
+            "server_messages": self.server_messages,
+            "fragmented": self.fragmented_messages,
+            "fragments": self.fragments,
+            "frag_rate": self.fragmented_messages / self.server_messages if self.server_messages else 0.0,
+            "dropped_down": self.down.dropped,
+            "dropped_up": self.up.dropped,
+            "reordered": self.down.reordered + self.up.reordered,
+        }
+
+
+def analyze(packets, protocol: int, window: float, full_payload: bool) -> dict:
+    """Consume a Packet stream; returns {client: ClientStats} and the start time."""
+    clients = {}
+    t0 = None
+    for pkt in packets:
+        if t0 is None and pkt.time is not None:
+            t0 = pkt.time
+        stats = clients.get(pkt.client)
+        if stats is None:
+            stats = clients[pkt.client] = ClientStats(pkt.client)
+        stats.add(pkt, protocol, window, t0 if t0 is not None else 0.0, full_payload)
+    return clients, t0
+
+
+def _fmt(value, spec: str) -> str:
+    if value is None:
+        return "-".rjust(int(spec.split(".")[0]))
+    return format(value, spec)
+
+
+def print_report(clients: dict, window: float, timeline: bool):
+    print(f"{'client':<22s} {'dur s':>7s} {'pkts dn':>8s} {'pkts up':>8s} {'KB dn':>9s} {'KB up':>8s} "
+          f"{'kbit/s dn':>9s} {'peak':>7s} {'kbit/s up':>9s} {'snaps':>7s} {'B/snap':>7s} "
+          f"{'p95':>6s} {'max':>6s} {'frag%':>6s} {'drop':>5s}")
+    for stats in sorted(clients.values(), key=lambda s: -s.down.bytes):
+        s = stats.summary(window)
+        print(f"{s['client']:<22s} {s['duration_s']:7.1f} {s['packets_down']:8d} {s['packets_up']:8d} "
+              f"{s['bytes_down'] / 1024:9.1f} {s['bytes_up'] / 1024:8.1f} "
+              f"{_fmt(s['kbps_down'], '9.1f')} {_fmt(s['peak_kbps_down'], '7.1f')} {_fmt(s['kbps_up'], '9.1f')} "
+              f"{s['snapshots']:7d} {s['snap_mean']:7.0f} {s['snap_p95']:6.0f} {s['snap_max']:6d} "
+              f"{s['frag_rate'] * 100:6.2f} {s['dropped_down'] + s['dropped_up']:5d}")
+        other = {k: v for k, v in stats.messages.items() if k != "snapshot"}
+        if other:
+            print("    server messages: " + ", ".join(f"{k} {v}" for k, v in sorted(other.items())))
+        if stats.oob:
+            print("    out-of-band: " + ", ".join(f"{k} {v}" for k, v in stats.oob.most_common(8)))
+        if timeline and stats.windows:
+            print(f"    {'t':>6s} {'kbit/s dn':>10s} {'kbit/s up':>10s} {'snaps':>6s}")
+            for index in sorted(stats.windows):
+                down, up, snaps = stats.windows[index]
+                print(f"    {index * window:6.0f} {down * 8 / window / 1000:10.1f} "
+                      f"{up * 8 / window / 1000:10.1f} {snaps:6d}")
+
+
+def write_csv(path: str, clients: dict, window: float):
+    with open(path, "w") as f:
+        f.write("client,t_s,kbps_down,kbps_up,snapshots\n")
+        for stats in clients.values():
+            for index in sorted(stats.windows):
+                down, up, snaps = stats.windows[index]
+                f.write(f"{stats.name},{index * window:g},{down * 8 / window / 1000:.2f},"
+                        f"{up * 8 / window / 1000:.2f},{snaps}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-client Q3 bandwidth from a pcap or proxy.js log")
+    parser.add_argument("capture", help="pcap file (optionally .gz) or proxy.js log")
+    parser.add_argument("--server-port", type=int, default=DEFAULT_SERVER_PORT,
+                        help=f"Server UDP port in pcap captures (default {DEFAULT_SERVER_PORT})")
+    parser.add_argument("--protocol", type=int, choices=(68, 71), default=71,
+                        help="Netchan protocol: 71 (ioq3, default) or 68 (legacy, no checksum)")
+    parser.add_argument("--window", type=float, default=1.0, help="Bandwidth window in seconds (default 1)")
+    parser.add_argument("--timeline", action="store_true", help="Print per-window bandwidth for each client")
+    parser.add_argument("--csv", help="Write per-window bandwidth to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        handle, packets, full_payload = open_capture(args.capture, args.server_port)
+    except (OSError, CaptureError) as e:
+        print(f"ERROR: {args.capture}: {e}", file=sys.stderr)
+        sys.exit(1)
+    with handle:
+        try:
+            clients, t0 = analyze(packets, args.protocol, args.window, full_payload)
+        except CaptureError as e:
+            print(f"ERROR: {args.capture}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if not clients:
+        print(f"No Q3 traffic found in {args.capture}")
+        sys.exit(1)
+    if t0 is None:
+        print("(log has no timestamps: rates unavailable; restart proxy.js to get them)")
+    print_report(clients, args.window, args.timeline)
+    if args.csv:
+        write_csv(args.csv, clients, args.window)
+        print(f"\nWrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
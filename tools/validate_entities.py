@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Check point-entity placement against the brush geometry of a .map.
+
+Every point entity is tested for:
+  - out of bounds: origin outside the world brushes' bounding box, with a
+                   player's height of headroom above the top solid
+  - embedded:      origin (lights) or collision hull (spawns, items) inside
+                   a solid brush
+  - floating:      hull bottom well above the nearest ground below it
+
+Spawns use the Q3 player hull (-15 -15 -24, 15 15 32). Items use the
+15-unit item box the game traces with in FinishSpawningItem; an item whose
+box starts in solid is removed by the game ("startsolid"), and a floating
+item drops, so its drop distance is reported.
+
+Usage:
+    python3 tools/validate_entities.py maps/qfcity1.map
+    python3 tools/validate_entities.py maps/qfcity1.map --quiet   # errors only
+
+Exit code is 1 when any error is found.
+
+Requires: numpy
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from map_parser import BrushIndex, load_map
+
+PLAYER_MINS = np.array([-15.0, -15.0, -24.0])
+PLAYER_MAXS = np.array([15.0, 15.0, 32.0])
+ITEM_MINS = np.array([-15.0, -15.0, -15.0])
+ITEM_MAXS = np.array([15.0, 15.0, 15.0])
+
+# Largest gap under a spawn hull before it counts as floating. Spawns are
+# lifted 9 units by the game and may sit slightly above the floor in Radiant.
+SPAWN_FLOAT_TOLERANCE = 32.0
+# Items always drop to the floor; drops beyond this are reported.
+ITEM_FLOAT_TOLERANCE = 64.0
+
+# Brushes made only of these shaders do not block movement
+NONSOLID_TEXTURES = {
+    "common/hint", "common/skip", "common/trigger", "common/areaportal",
+    "common/clusterportal", "common/origin", "common/lightgrid", "common/hintskip",
+}
+# Brush entities whose brushes are part of the solid world
+SOLID_CLASSES = {"worldspawn", "func_group", "func_static", "func_door",
+                 "func_plat", "func_bobbing", "func_pendulum", "func_train"}
+
+
+def entity_hull(classname: str):
+    """("spawn"|"item", mins, maxs, float tolerance), or None for point-only checks."""
+    if classname.startswith("info_player") or classname in ("team_CTF_redplayer",
+                                                            "team_CTF_blueplayer"):
+        return "spawn", PLAYER_MINS, PLAYER_MAXS, SPAWN_FLOAT_TOLERANCE
+    if classname.startswith(("weapon_", "ammo_", "item_", "holdable_")):
+        return "item", ITEM_MINS, ITEM_MAXS, ITEM_FLOAT_TOLERANCE
+    return None
+
+
+def solid_brushes(m) -> np.ndarray:
+    """Indices of brushes that block players."""
+    solid_tex = np.array([t not in NONSOLID_TEXTURES for t in m.textures], dtype=bool)
+    plane_solid = solid_tex[m.plane_texture] if m.plane_count else np.zeros(0, dtype=bool)
+    starts = m.brush_plane_start[:-1]
+    any_solid = np.logical_or.reduceat(plane_solid, starts) if m.brush_count else np.zeros(0, dtype=bool)
+    ent_solid = np.array([m.classname(e) in SOLID_CLASSES for e in range(len(m.entities))], dtype=bool)
+    keep = any_solid & ent_solid[m.brush_entity]
+    return np.nonzero(keep)[0]
+
+
+class PlacementChecker:
+    """Spatial queries against the solid brushes of one parsed map."""
+
+    def __init__(self, m):
+        self.m = m
+        self.solid = solid_brushes(m)
+        self.index = BrushIndex(m.brush_mins[self.solid], m.brush_maxs[self.solid])
+        if len(self.solid):
+            self.world_mins = np.nanmin(m.brush_mins[self.solid], axis=0)
+            self.world_maxs = np.nanmax(m.brush_maxs[self.solid], axis=0)
+            # Entities stand on the top solid, so leave a player's height of headroom
+            self.world_maxs[2] += PLAYER_MAXS[2] - PLAYER_MINS[2]
+        else:
+            self.world_mins = np.full(3, -np.inf)
+            self.world_maxs = np.full(3, np.inf)
+
+    def _brush(self, local: int) -> int:
+        return int(self.solid[local])
+
+    def out_of_bounds(self, origin) -> bool:
+        return bool(np.any(origin < self.world_mins) or np.any(origin > self.world_maxs))
+
+    def box_in_solid(self, origin, mins, maxs) -> list:
+        """Brushes the box (origin + mins, origin + maxs) penetrates.
+
+        Same test as the engine's box trace: each brush plane is pushed out
+        by the box corner that leads along its normal, and the origin must be
+        behind all of them. Touching a face does not count.
+        """
+        m = self.m
+        hits = []
+        for local in self.index.query_box(origin + mins, origin + maxs):
+            b = self._brush(local)
+            s = m.brush_planes(b)
+            n = m.plane_normals[s]
+            offset = np.where(n > 0, maxs, mins)
+            expanded = m.plane_dists[s] - np.einsum("ij,ij->i", n, offset)
+            if np.all(n @ origin - expanded < -0.01):
+                hits.append(b)
+        return hits
+
+    def point_in_solid(self, origin) -> list:
+        m = self.m
+        pt = origin[None, :]
+        return [self._brush(local) for local in self.index.query_point(origin)
+                if m.points_inside(self._brush(local), pt, epsilon=0.01)[0]]
+
+    def ground_gap(self, origin, mins, maxs) -> float:
+        """Vertical distance from the box bottom down to the highest brush top under it.
+
+        Uses brush bounds, which is exact for the axial brushes our
+        generators emit and conservative for sloped ones. Returns inf when
+        there is nothing underneath.
+        """
+        bottom = origin[2] + mins[2]
+        lo = np.array([origin[0] + mins[0], origin[1] + mins[1], self.world_mins[2] - 1])
+        hi = np.array([origin[0] + maxs[0], origin[1] + maxs[1], bottom + 0.5])
+        below = self.index.query_box(lo, hi)
+        if not len(below):
+            return float("inf")
+        tops = self.m.brush_maxs[self.solid[below], 2]
+        tops = tops[tops <= bottom + 0.5]
+        if not len(tops):
+            return float("inf")
+        return float(bottom - tops.max())
+
+
+def validate(m, checker=None) -> list:
+    """Check every point entity; returns a list of issue dicts.
+
+    Each issue has: severity ("error"/"warning"), entity, classname, origin,
+    kind ("out_of_bounds"/"embedded"/"floating"), message.
+    """
+    checker = checker or PlacementChecker(m)
+    issues = []
+
+    def report(severity, e, kind, message):
+        issues.append({
+            "severity": severity,
+            "entity": e,
+            "classname": m.classname(e),
+            "origin": tuple(float(v) for v in m.entity_origins[e]),
+            "kind": kind,
+            "message": message,
+        })
+
+    for e in m.point_entities():
+        origin = m.entity_origins[e]
+        classname = m.classname(e)
+        if checker.out_of_bounds(origin):
+            report("error", e, "out_of_bounds", "origin outside world bounds")
+            continue
+
+        hull = entity_hull(classname)
+        if hull is None:
+            hits = checker.point_in_solid(origin)
+            if hits:
+                report("error", e, "embedded", f"origin inside brush {hits[0]}")
+            continue
+
+        kind, mins, maxs, tolerance = hull
+        hits = checker.box_in_solid(origin, mins, maxs)
+        if hits:
+            report("error", e, "embedded",
+                   f"hull intersects brush {hits[0]}" + (f" (+{len(hits) - 1} more)" if len(hits) > 1 else ""))
+            continue
+
+        gap = checker.ground_gap(origin, mins, maxs)
+        if gap == float("inf"):
+            report("error", e, "floating", "no ground below")
+        elif gap > tolerance:
+            if kind == "item":
+                report("warning", e, "floating", f"drops {gap:.0f} units to the floor")
+            else:
+                report("error", e, "floating", f"{gap:.0f} units above the floor")
+    return issues
+
+
+def check_file(map_file: str, quiet: bool = False) -> int:
+    """Load, validate and print a report for one .map; returns the error count."""
+    t0 = time.perf_counter()
+    m = load_map(map_file)
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    issues = validate(m)
+    t_check = time.perf_counter() - t0
+
+    errors = [i for i in issues if i["severity"] == "error"]
+    for issue in issues:
+        if quiet and issue["severity"] != "error":
+            continue
+        x, y, z = issue["origin"]
+        print(f"{issue['severity'].upper():7s} {issue['kind']:<13s} ent {issue['entity']:4d} "
+              f"{issue['classname']:<24s} ({x:.0f} {y:.0f} {z:.0f})  {issue['message']}")
+
+    print(f"{map_file}: {len(m.point_entities())} point entities checked against "
+          f"{m.brush_count} brushes, {len(errors)} error(s), "
+          f"{len(issues) - len(errors)} warning(s) "
+          f"[load {t_load:.3f}s, check {t_check:.3f}s]")
+    return len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate entity placement in a .map")
+    parser.add_argument("map_file", help="Path to .map file")
+    parser.add_argument("--quiet", action="store_true", help="Only print errors")
+    args = parser.parse_args()
+
+    if check_file(args.map_file, args.quiet):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 #!/bin/bash
 # tools/visual_test.sh - Visual test runner for QuakeFall
-# Records gameplay tests as GIF/MP4 for regression validation.
+# Records gameplay tests as GIF/MP4 and/or a client demo for regression
+# validation. The demo is parsed by tools/demo_parser.py into per-frame
+# origin/velocity/pm_flags arrays, and EXPECT lines in the .test file are
+# checked against it (e.g. "EXPECT max_rise > 40").
+#
+# Tests containing NETEM lines run the client through tools/netem_relay.py,
+# and each NETEM line reconfigures it mid-test (e.g. "NETEM delay 100ms loss 2%",
+# "NETEM down jitter 30ms", "NETEM off"). Relay statistics go to the log.
 #
 # Usage:
 #   tools/visual_test.sh run tests/titan_flow.test    # Run single test
 #   tools/visual_test.sh run-all                       # Run all tests/*.test
 #   tools/visual_test.sh list                          # List available tests
+#   QF_CAPTURE=demo tools/visual_test.sh run-all       # Demo only, no ffmpeg
 #
-# Requires: ffmpeg, xdotool, Xvfb
+# Requires: xdotool, Xvfb; ffmpeg for video capture; numpy for EXPECT checks
 
 set -e
 
@@ -18,11 +26,26 @@ CLIENT_BIN="$CLIENT_DIR/ioquake3"
 RCON="python3 $SCRIPT_DIR/rcon.py"
 TESTS_DIR="$PROJECT_DIR/tests"
 RECORDINGS_DIR="$TESTS_DIR/recordings"
+ENCODE_COST_FILE="$RECORDINGS_DIR/encode_cost.tsv"
 WIDTH=800
 HEIGHT=600
 FPS=15
 GIF_FPS=10
 GIF_WIDTH=400
+# Tests expected to run longer than this skip the GIF branch (MP4 only).
+# The GIF branch buffers frames until the palette is known, so this also
+# bounds ffmpeg memory.
+GIF_MAX_SECONDS="${QF_GIF_MAX_SECONDS:-60}"
+RECORD_GIF=1
+# video | demo | both
+CAPTURE="${QF_CAPTURE:-both}"
+# Where the client writes "record <name>" output (fs_homepath/demoq3/demos)
+DEMO_SRC_DIR="${QF_DEMO_DIR:-$HOME/.q3a/demoq3/demos}"
+DEMO_FILE=""
+NETEM="python3 $SCRIPT_DIR/netem_relay.py"
+NETEM_PORT="${QF_NETEM_PORT:-27965}"
+NETEM_PID=""
+CONNECT_ADDR="127.0.0.1"
 CLIENT_PID=""
 FFMPEG_PID=""
 XVFB_PID=""
@@ -49,6 +72,7 @@ kill_wait() {
 cleanup() {
     kill_wait "$FFMPEG_PID"
     kill_wait "$CLIENT_PID"
+    kill_wait "$NETEM_PID"
     kill_wait "$XVFB_PID"
     pkill -f "zenity.*ioquake3" 2>/dev/null || true
 }
@@ -127,7 +151,7 @@ phase_setup() {
     mkdir -p "$RECORDINGS_DIR"
 
     # Ensure server is running (with sv_cheats for test cvars like cg_thirdPersonRange)
-    if ! pgrep -f "ioq3ded.*demoq3" > /dev/null 2>&1; then
+    if ! "$SCRIPT_DIR/server.sh" status > /dev/null 2>&1; then
         log "Starting server with sv_cheats 1..."
         # Start server directly with cheats enabled (server.sh doesn't support this)
         local server_dir="$PROJECT_DIR/external/ioq3/build-native/Release"
@@ -140,6 +164,7 @@ phase_setup() {
             +set dedicated 1 \
             +set vm_game 0 \
             +set sv_cheats 1 \
+            +set net_port 27960 \
             +set rconPassword "$rcon_pass" \
             +map "$map" \
             > /tmp/ioq3ded.log 2>&1 &
@@ -161,6 +186,36 @@ phase_setup() {
     sleep 0.5
 }
 
+# --- Phase 1b: Network impairment relay (tests with NETEM lines) ---
+# Starts unimpaired so connect/spawn behave as usual; NETEM directives then
+# set the conditions for the part of the test they cover.
+phase_start_netem() {
+    log "Phase 1b: Starting netem relay on port $NETEM_PORT"
+    $NETEM run --listen "$NETEM_PORT" --server 127.0.0.1:27960 \
+        > /tmp/visual_test_netem.log 2>&1 &
+    NETEM_PID=$!
+    sleep 0.5
+    if ! kill -0 "$NETEM_PID" 2>/dev/null; then
+        echo "ERROR: netem relay failed to start"
+        cat /tmp/visual_test_netem.log
+        exit 1
+    fi
+    CONNECT_ADDR="127.0.0.1:$NETEM_PORT"
+}
+
+phase_stop_netem() {
+    local stats
+    stats=$($NETEM stats --listen "$NETEM_PORT" 2>/dev/null || echo "(no response)")
+    echo "$stats" | sed 's/^/  /'
+    local ts
+    ts="$(date '+%H:%M:%S')"
+    echo "$stats" | sed "s/^/[$ts] NETEM stats: /" >> "$CURRENT_LOG"
+    $NETEM stop --listen "$NETEM_PORT" > /dev/null 2>&1 || true
+    kill_wait "$NETEM_PID"
+    NETEM_PID=""
+    CONNECT_ADDR="127.0.0.1"
+}
+
 # --- Phase 2: Launch client ---
 phase_launch_client() {
     log "Phase 2: Launching client on $TEST_DISPLAY"
@@ -176,7 +231,7 @@ phase_launch_client() {
         +set r_customheight "$HEIGHT" \
         +set com_speeds 0 \
         +set cg_draw2d 1 \
-        +connect 127.0.0.1 \
+        +connect "$CONNECT_ADDR" \
         > /tmp/visual_test_client.log 2>&1 &
     CLIENT_PID=$!
 
@@ -236,24 +291,120 @@ phase_wait_spawn() {
     exit 1
 }
 
+# Estimate how long a .test file runs: sum of WAITs plus ~1s per client
+# console round-trip (client_cmd sleeps 0.7s, VIEW adds 0.5s)
+estimate_test_seconds() {
+    local test_file="$1"
+    awk '
+        $1 == "WAIT" { total += $2 }
+        $1 == "CONSOLE" || $1 == "CVAR" || $1 == "VIEW" { total += 1 }
+        END { printf "%d\n", total + 0.5 }
+    ' "$test_file"
+}
+
+capture_video() {
+    [ "$CAPTURE" = "video" ] || [ "$CAPTURE" = "both" ]
+}
+
+capture_demo() {
+    [ "$CAPTURE" = "demo" ] || [ "$CAPTURE" = "both" ]
+}
+
+# --- Phase 5a: Start demo recording ---
+# Started before ffmpeg so the console flash of the record command stays out
+# of the video.
+phase_start_demo() {
+    local test_name="$1"
+    DEMO_FILE=""
+    rm -f "$DEMO_SRC_DIR/${test_name}".dm_* "$RECORDINGS_DIR/${test_name}".dm_*
+    log "Phase 5a: Starting demo recording ($test_name)"
+    client_cmd "record $test_name"
+    echo "[$(date '+%H:%M:%S')] DEMO: started $test_name" >> "$CURRENT_LOG"
+}
+
+# --- Phase 7a: Stop demo recording + check EXPECT lines ---
+phase_stop_demo() {
+    local test_name="$1"
+    local test_file="$2"
+
+    log "Phase 7a: Stopping demo recording"
+    client_cmd "stoprecord"
+    sleep 0.5
+
+    local src
+    src=$(ls -t "$DEMO_SRC_DIR/${test_name}".dm_* 2>/dev/null | head -1 || true)
+    if [ -z "$src" ]; then
+        echo "ERROR: Demo not found: $DEMO_SRC_DIR/${test_name}.dm_* (set QF_DEMO_DIR?)"
+        return 1
+    fi
+    DEMO_FILE="$RECORDINGS_DIR/$(basename "$src")"
+    cp "$src" "$DEMO_FILE"
+
+    local expect_args=()
+    local expr
+    while IFS= read -r expr; do
+        expect_args+=(--expect "$expr")
+    done < <(sed -n 's/^[[:space:]]*EXPECT[[:space:]]\+//p' "$test_file")
+
+    local out status=0
+    out=$(python3 "$SCRIPT_DIR/demo_parser.py" "$DEMO_FILE" \
+        --npz "$RECORDINGS_DIR/${test_name}.npz" "${expect_args[@]}" 2>&1) || status=$?
+    echo "$out" | sed 's/^/  /'
+    local ts
+    ts="$(date '+%H:%M:%S')"
+    echo "$out" | sed "s/^/[$ts] TRAJECTORY: /" >> "$CURRENT_LOG"
+    if [ "$status" -ne 0 ]; then
+        log "Trajectory check failed (exit $status)"
+        return 1
+    fi
+}
+
 # --- Phase 5: Start recording ---
+# One ffmpeg graph produces both outputs: the capture is split into an
+# H.264 MP4 branch and a GIF branch (fps cap → scale → palettegen, with the
+# palette fed straight back into paletteuse). No second decode of the MP4.
 phase_start_recording() {
     local test_name="$1"
+    local test_file="$2"
     MP4_FILE="$RECORDINGS_DIR/${test_name}.mp4"
+    local gif_file="$RECORDINGS_DIR/${test_name}.gif"
 
-    log "Phase 5: Starting recording → $MP4_FILE"
-
-    ffmpeg \
-        -f x11grab \
-        -video_size "${WIDTH}x${HEIGHT}" \
-        -framerate "$FPS" \
-        -i "${TEST_DISPLAY}+0,0" \
-        -c:v libx264 \
-        -preset ultrafast \
-        -pix_fmt yuv420p \
-        -y "$MP4_FILE" \
-        > /tmp/visual_test_ffmpeg.log 2>&1 &
+    local est
+    est=$(estimate_test_seconds "$test_file")
+    if [ "$est" -gt "$GIF_MAX_SECONDS" ]; then
+        RECORD_GIF=0
+        log "Phase 5: Starting recording → $MP4_FILE (GIF skipped: ~${est}s > ${GIF_MAX_SECONDS}s)"
+    else
+        RECORD_GIF=1
+        log "Phase 5: Starting recording → $MP4_FILE + $gif_file (~${est}s)"
+    fi
+    rm -f "$gif_file"
+
+    if [ "$RECORD_GIF" -eq 1 ]; then
+        ffmpeg -benchmark \
+            -f x11grab \
+            -video_size "${WIDTH}x${HEIGHT}" \
+            -framerate "$FPS" \
+            -i "${TEST_DISPLAY}+0,0" \
+            -filter_complex "[0:v]split=2[mp4][g];[g]fps=$GIF_FPS,scale=${GIF_WIDTH}:-1:flags=lanczos,split=2[ga][gb];[ga]palettegen=stats_mode=diff[pal];[gb][pal]paletteuse=dither=bayer:bayer_scale=3[gif]" \
+            -map "[mp4]" -c:v libx264 -preset ultrafast -pix_fmt yuv420p -y "$MP4_FILE" \
+            -map "[gif]" -y "$gif_file" \
+            > /tmp/visual_test_ffmpeg.log 2>&1 &
+    else
+        ffmpeg -benchmark \
+            -f x11grab \
+            -video_size "${WIDTH}x${HEIGHT}" \
+            -framerate "$FPS" \
+            -i "${TEST_DISPLAY}+0,0" \
+            -c:v libx264 \
+            -preset ultrafast \
+            -pix_fmt yuv420p \
+            -y "$MP4_FILE" \
+            > /tmp/visual_test_ffmpeg.log 2>&1 &
+    fi
     FFMPEG_PID=$!
+    # Video t=0 reference for tools/frame_diff.py (NOTE offsets are relative to this)
+    echo "[$(date '+%H:%M:%S')] RECORD: started $MP4_FILE" >> "$CURRENT_LOG"
 
     sleep 1
     if ! kill -0 "$FFMPEG_PID" 2>/dev/null; then
@@ -302,6 +453,16 @@ phase_execute_test() {
             NOTE)
                 log_note "$args"
                 ;;
+            EXPECT)
+                # Checked against the demo once the test finishes
+                ;;
+            NETEM)
+                log "  NETEM: $args"
+                local netem_out
+                netem_out=$($NETEM set --listen "$NETEM_PORT" $args 2>&1 || true)
+                echo "  → $netem_out"
+                echo "[$(date '+%H:%M:%S')] NETEM: $args → $netem_out" >> "$CURRENT_LOG"
+                ;;
             CVAR)
                 # Client-side cvar — sent via client console (not RCON)
                 local cvar_name="${args%% *}"
@@ -338,51 +499,74 @@ phase_execute_test() {
     done < "$test_file"
 }
 
-# --- Phase 7: Stop recording + GIF ---
+# --- Phase 7: Stop recording + encode report ---
 phase_stop_recording() {
     local test_name="$1"
     local gif_file="$RECORDINGS_DIR/${test_name}.gif"
 
     log "Phase 7: Stopping recording"
 
-    # Gracefully stop ffmpeg (SIGINT for clean file close)
+    # Gracefully stop ffmpeg (SIGINT for clean file close). The GIF branch
+    # only starts writing once the palette is complete, so give it longer.
+    local finalize_start finalize_end
+    finalize_start=$(date +%s.%N)
     if [ -n "$FFMPEG_PID" ] && kill -0 "$FFMPEG_PID" 2>/dev/null; then
         kill -INT "$FFMPEG_PID" 2>/dev/null || true
-        # Wait up to 5s for ffmpeg to finalize the file
+        local max_polls=10
+        if [ "$RECORD_GIF" -eq 1 ]; then
+            max_polls=120
+        fi
         local i=0
-        while [ $i -lt 10 ] && kill -0 "$FFMPEG_PID" 2>/dev/null; do
+        while [ $i -lt $max_polls ] && kill -0 "$FFMPEG_PID" 2>/dev/null; do
             sleep 0.5
             i=$((i + 1))
         done
         kill -9 "$FFMPEG_PID" 2>/dev/null || true
     fi
     FFMPEG_PID=""
+    finalize_end=$(date +%s.%N)
 
     if [ ! -f "$MP4_FILE" ]; then
         echo "ERROR: Recording file not found: $MP4_FILE"
         return 1
     fi
 
-    log "Generating GIF → $gif_file"
-    local palette="/tmp/visual_test_palette.png"
-
-    # Two-pass palette-optimized GIF
-    ffmpeg -i "$MP4_FILE" \
-        -vf "fps=$GIF_FPS,scale=${GIF_WIDTH}:-1:flags=lanczos,palettegen" \
-        -y "$palette" \
-        > /dev/null 2>&1
-
-    ffmpeg -i "$MP4_FILE" -i "$palette" \
-        -lavfi "fps=$GIF_FPS,scale=${GIF_WIDTH}:-1:flags=lanczos[x];[x][1:v]paletteuse" \
-        -y "$gif_file" \
-        > /dev/null 2>&1
+    # ffmpeg -benchmark prints: bench: utime=1.234s stime=0.056s rtime=30.1s
+    local bench cpu_s finalize_s
+    bench=$(grep -m1 '^bench: utime=' /tmp/visual_test_ffmpeg.log || true)
+    cpu_s=$(echo "$bench" | awk '{
+        u = $2; s = $3
+        sub(/utime=/, "", u); sub(/s$/, "", u)
+        sub(/stime=/, "", s); sub(/s$/, "", s)
+        printf "%.2f", u + s
+    }')
+    [ -z "$cpu_s" ] && cpu_s="?"
+    finalize_s=$(awk -v a="$finalize_start" -v b="$finalize_end" 'BEGIN { printf "%.2f", b - a }')
+
+    local mp4_bytes gif_bytes=0 mp4_size gif_desc="skipped"
+    mp4_bytes=$(stat -c %s "$MP4_FILE")
+    mp4_size=$(du -h "$MP4_FILE" | cut -f1)
+    if [ "$RECORD_GIF" -eq 1 ]; then
+        if [ -f "$gif_file" ]; then
+            gif_bytes=$(stat -c %s "$gif_file")
+            gif_desc="$gif_file ($(du -h "$gif_file" | cut -f1))"
+        else
+            gif_desc="MISSING (see /tmp/visual_test_ffmpeg.log)"
+        fi
+    fi
+    log "Output: $MP4_FILE ($mp4_size), GIF: $gif_desc"
+    log "Encode cost: ${cpu_s}s CPU, ${finalize_s}s finalize after stop"
 
-    rm -f "$palette"
+    local ts
+    ts="$(date '+%H:%M:%S')"
+    echo "[$ts] ENCODE: cpu=${cpu_s}s finalize=${finalize_s}s gif=$RECORD_GIF mp4_bytes=$mp4_bytes gif_bytes=$gif_bytes" >> "$CURRENT_LOG"
 
-    local mp4_size gif_size
-    mp4_size=$(du -h "$MP4_FILE" | cut -f1)
-    gif_size=$(du -h "$gif_file" | cut -f1)
-    log "Output: $MP4_FILE ($mp4_size), $gif_file ($gif_size)"
+    # Suite-wide cost table, one row per test run
+    if [ ! -f "$ENCODE_COST_FILE" ]; then
+        printf "date\ttest\tgif\tcpu_s\tfinalize_s\tmp4_bytes\tgif_bytes\n" > "$ENCODE_COST_FILE"
+    fi
+    printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\n" "$(date '+%Y-%m-%d %H:%M:%S')" "$test_name" \
+        "$RECORD_GIF" "$cpu_s" "$finalize_s" "$mp4_bytes" "$gif_bytes" >> "$ENCODE_COST_FILE"
 }
 
 # --- Phase 8: Cleanup ---
@@ -437,12 +621,29 @@ run_test() {
     fi
 
     phase_setup
+    if grep -q '^[[:space:]]*NETEM ' "$test_file"; then
+        phase_start_netem
+    fi
     phase_launch_client
     phase_connect
     phase_wait_spawn
-    phase_start_recording "$test_name"
+    if capture_demo; then
+        phase_start_demo "$test_name"
+    fi
+    if capture_video; then
+        phase_start_recording "$test_name" "$test_file"
+    fi
     phase_execute_test "$test_file"
-    phase_stop_recording "$test_name"
+    local result=0
+    if capture_video; then
+        phase_stop_recording "$test_name" || result=1
+    fi
+    if capture_demo; then
+        phase_stop_demo "$test_name" "$test_file" || result=1
+    fi
+    if [ -n "$NETEM_PID" ]; then
+        phase_stop_netem
+    fi
     phase_cleanup
 
     ts="$(date '+%Y-%m-%d %H:%M:%S')"
@@ -451,10 +652,19 @@ run_test() {
 
     log "=========================================="
     log "DONE: $test_name"
-    log "  GIF: $RECORDINGS_DIR/${test_name}.gif"
-    log "  MP4: $RECORDINGS_DIR/${test_name}.mp4"
+    if capture_video; then
+        if [ "$RECORD_GIF" -eq 1 ]; then
+            log "  GIF: $RECORDINGS_DIR/${test_name}.gif"
+        fi
+        log "  MP4: $RECORDINGS_DIR/${test_name}.mp4"
+    fi
+    if [ -n "$DEMO_FILE" ]; then
+        log "  Demo: $DEMO_FILE"
+        log "  Trajectory: $RECORDINGS_DIR/${test_name}.npz"
+    fi
     log "  Log: $RECORDINGS_DIR/${test_name}.log"
     log "=========================================="
+    return $result
 }
 
 # --- Main: run all tests ---
@@ -516,7 +726,13 @@ case "${1:-}" in
         echo "  run-all       Run all tests/*.test files"
         echo "  list          List available tests"
         echo ""
-        echo "Requires: ffmpeg, xdotool, Xvfb"
+        echo "Environment:"
+        echo "  QF_GIF_MAX_SECONDS=60  Skip GIF for tests estimated longer than this"
+        echo "  QF_CAPTURE=both        video | demo | both (demo enables EXPECT checks)"
+        echo "  QF_DEMO_DIR=...        Client demo directory (default ~/.q3a/demoq3/demos)"
+        echo "  QF_NETEM_PORT=27965    Relay port for tests with NETEM lines"
+        echo ""
+        echo "Requires: xdotool, Xvfb; ffmpeg (video); numpy (demo)"
         exit 1
         ;;
 esac